@@ -0,0 +1,42 @@
+import os
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import create_engine
+
+# Engine factory (same DB_* settings as backend/db.py, duplicated for independence)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./backend_dev.db") # Default to dev
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+def make_engine(url: str = DATABASE_URL) -> Engine:
+    options = {
+        "echo": DB_ECHO,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "query_cache_size": DB_STATEMENT_CACHE_SIZE,
+    }
+    if DB_PGBOUNCER:
+        # The pooler owns the connections; psycopg2 never prepares server-side.
+        options["poolclass"] = NullPool
+    elif not (url.startswith("sqlite") and ":memory:" in url):
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    return create_engine(url, **options)
+
+def pool_metrics(engine: Engine) -> dict:
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    if hasattr(pool, "checkedout"):
+        stats.update(size=pool.size(), in_use=pool.checkedout(), idle=pool.checkedin())
+    return stats
@@ -1,60 +1,233 @@
-from fastapi import FastAPI, Body
+from fastapi import FastAPI, Body, HTTPException, Query, Response
 from dapr.ext.fastapi import DaprApp
-from sqlmodel import SQLModel, Field, Session, create_engine
-from typing import Optional
-from datetime import datetime, timezone
+from sqlmodel import SQLModel
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+import asyncio
 import os
 import logging
 import json
 
+from db import make_engine, pool_metrics
+from storage import AuditStore
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# DB Setup (Duplicate from backend/models.py for independence)
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./backend_dev.db") # Default to dev
-engine = create_engine(DATABASE_URL)
+# DB Setup (pool settings from DB_* env, see db.py)
+engine = make_engine()
+
+# Ingestion tuning: a buffer is written as one multi-row INSERT when it
+# reaches AUDIT_BATCH_SIZE rows or AUDIT_FLUSH_INTERVAL_MS after its first row.
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", "50"))
+AUDIT_BULK_SUBSCRIBE = os.getenv("AUDIT_BULK_SUBSCRIBE", "false").lower() == "true"
 
-class AuditLog(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
+# Maintenance (compression of cold partitions, retention) runs this often.
+AUDIT_MAINTENANCE_INTERVAL_S = int(os.getenv("AUDIT_MAINTENANCE_INTERVAL_S", "3600"))
+
+# Rows live in monthly partitions managed by AuditStore (see storage.py);
+# this model is the API shape of one row.
+class AuditLog(SQLModel):
+    id: int
+    event_id: Optional[str] = None
     entity_type: str
     entity_id: str
     action: str
     user_id: str
-    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    details: Optional[str] = None
+    timestamp: datetime
+    details: Optional[str] = None # JSON string
+
+store = AuditStore(engine)
+
+def audit_row(event: dict) -> dict:
+    """Maps a task-events CloudEvent (or raw event) to an AuditLog row."""
+    data = event.get("data", {})
+    if isinstance(data, str):
+        data = json.loads(data)
+    return {
+        # Prefer the producer's id, which survives re-publishing; fall back to the CloudEvent id.
+        "event_id": data.get("event_id") or event.get("id"),
+        "entity_type": "Task",
+        "entity_id": str(data.get("task_id", "unknown")),
+        "action": data.get("event_type", "UNKNOWN").upper(),
+        "user_id": data.get("user_id", "system"),
+        "timestamp": datetime.fromisoformat(data.get("timestamp")) if data.get("timestamp") else datetime.now(timezone.utc),
+        "details": json.dumps(data.get("data", {})),
+    }
+
+def write_audit_rows(rows: List[dict]) -> int:
+    """
+    Writes rows with multi-row INSERTs and one commit.
+    Rows whose event_id is already stored are skipped (ON CONFLICT DO NOTHING),
+    so redelivered events do not create duplicates.
+    """
+    # Drop duplicates within the batch itself before they reach the DB.
+    unique: Dict[object, dict] = {}
+    for i, row in enumerate(rows):
+        unique.setdefault(row["event_id"] or ("no-id", i), row)
+    return store.write(list(unique.values()))
+
+class AuditBatcher:
+    """
+    Group-commit buffer for audit rows.
+
+    Each subscriber call adds its rows and waits until the batch holding them
+    is committed, so Dapr only gets SUCCESS for durable rows (and redelivers
+    on failure), while concurrent deliveries share one INSERT and one commit.
+    """
+
+    def __init__(self, batch_size: int = AUDIT_BATCH_SIZE, flush_interval: float = AUDIT_FLUSH_INTERVAL_MS / 1000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[Tuple[List[dict], asyncio.Future]] = []
+        self._pending_rows = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set = set()
+
+    async def add(self, rows: List[dict]):
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        self._pending.append((rows, done))
+        self._pending_rows += len(rows)
+
+        if self._pending_rows >= self.batch_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_interval, self._start_flush)
+        await done
+
+    async def drain(self):
+        """Flushes anything buffered and waits for in-flight writes (shutdown)."""
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_rows = self._pending, [], 0
+        task = asyncio.ensure_future(self._flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[List[dict], asyncio.Future]]):
+        rows = [row for rows, _ in batch for row in rows]
+        try:
+            inserted = await asyncio.to_thread(write_audit_rows, rows)
+            logger.info(f"Audit batch saved: {inserted} new of {len(rows)} rows")
+        except Exception as e:
+            logger.error(f"Failed to save audit batch of {len(rows)}: {e}")
+            for _, done in batch:
+                if not done.done():
+                    done.set_exception(e)
+            return
+        for _, done in batch:
+            if not done.done():
+                done.set_result(None)
+
+batcher = AuditBatcher()
 
 app = FastAPI()
 dapr_app = DaprApp(app)
 
+async def maintenance_loop():
+    while True:
+        try:
+            await asyncio.to_thread(store.run_maintenance)
+        except Exception as e:
+            logger.error(f"Audit maintenance failed: {e}")
+        await asyncio.sleep(AUDIT_MAINTENANCE_INTERVAL_S)
+
+maintenance_task: Optional[asyncio.Task] = None
+
 @app.on_event("startup")
-def on_startup():
-    SQLModel.metadata.create_all(engine)
+async def on_startup():
+    global maintenance_task
+    store.ensure_schema()
+    maintenance_task = asyncio.create_task(maintenance_loop())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if maintenance_task:
+        maintenance_task.cancel()
+    await batcher.drain()
+
+@app.get("/audit", response_model=List[AuditLog])
+def query_audit(
+    response: Response,
+    start: Optional[datetime] = Query(None, description="Inclusive lower bound (default: end - 30 days)"),
+    end: Optional[datetime] = Query(None, description="Exclusive upper bound (default: now)"),
+    entity_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    action: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+):
+    """
+    Audit entries in a time range, newest first.
+    Only the monthly partitions overlapping [start, end) are read.
+    """
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=30)
+    try:
+        rows, next_cursor = store.query(start, end, entity_id, user_id, action, limit, cursor)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+@app.get("/metrics/db")
+def db_metrics():
+    return pool_metrics(engine)
 
 @dapr_app.subscribe(pubsub='kafka-pubsub', topic='task-events')
-def audit_subscriber(event = Body()):
-    logger.info(f"Audit log received: {event}")
-    
-    # Extract data from CloudEvent or raw
-    data = event.get("data", {})
-    
+async def audit_subscriber(event = Body()):
+    # Bulk subscribe delivers {"entries": [{"entryId", "event", ...}]}
+    # and expects a status per entry.
+    if "entries" in event:
+        entries = event["entries"]
+        statuses = {}
+        rows = []
+        for entry in entries:
+            try:
+                rows.append(audit_row(entry.get("event", {})))
+                statuses[entry["entryId"]] = "SUCCESS"
+            except Exception as e:
+                # Malformed entries will never parse; don't ask for redelivery.
+                logger.error(f"Dropping malformed audit entry {entry.get('entryId')}: {e}")
+                statuses[entry["entryId"]] = "DROP"
+        try:
+            if rows:
+                await batcher.add(rows)
+        except Exception:
+            statuses = {entry_id: "RETRY" if s == "SUCCESS" else s for entry_id, s in statuses.items()}
+        return {"statuses": [{"entryId": k, "status": v} for k, v in statuses.items()]}
+
+    logger.debug(f"Audit log received: {event}")
     try:
-        with Session(engine) as session:
-            audit = AuditLog(
-                entity_type="Task",
-                entity_id=str(data.get("task_id", "unknown")),
-                action=data.get("event_type", "UNKNOWN").upper(),
-                user_id=data.get("user_id", "system"),
-                timestamp=datetime.fromisoformat(data.get("timestamp")) if data.get("timestamp") else datetime.now(timezone.utc),
-                details=json.dumps(data.get("data", {}))
-            )
-            session.add(audit)
-            session.commit()
-            logger.info(f"Audit log saved: {audit.id}")
+        await batcher.add([audit_row(event)])
     except Exception as e:
         logger.error(f"Failed to save audit log: {e}")
+        return {"status": "RETRY"}
 
     return {"status": "SUCCESS"}
 
+if AUDIT_BULK_SUBSCRIBE:
+    # DaprApp has no bulk subscribe option, so enable it on the subscription
+    # entry it serves from /dapr/subscribe.
+    for subscription in dapr_app._get_subscriptions():
+        if subscription["topic"] == "task-events":
+            subscription["bulkSubscribe"] = {
+                "enabled": True,
+                "maxMessagesCount": AUDIT_BATCH_SIZE,
+                "maxAwaitDurationMs": AUDIT_FLUSH_INTERVAL_MS,
+            }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=6001)
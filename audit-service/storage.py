@@ -0,0 +1,492 @@
+"""
+Time-partitioned audit log storage.
+
+Rows are bucketed by calendar month (UTC) of their timestamp:
+- Postgres: `auditlog` is a native RANGE-partitioned table with one
+  `auditlog_pYYYYMM` partition per month.
+- SQLite: there is no parent table; each month is its own `auditlog_pYYYYMM`
+  table with the same columns and indexes.
+
+Every partition is listed in the `auditpartition` registry. Reads walk only
+the partitions overlapping the requested time range, newest first, so a
+query never touches months it cannot match.
+
+Maintenance (run_maintenance) compresses `details` in cold partitions into
+`details_z` and, past the retention window, rolls a partition up into
+`auditrollup` counts before dropping it.
+"""
+import base64
+import json
+import logging
+import os
+import threading
+import zlib
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    BigInteger, Column, DateTime, Index, Integer, LargeBinary, MetaData, String,
+    Table, Text, UniqueConstraint, bindparam, delete, func, inspect, insert,
+    literal, text, true, tuple_, update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Field, Session, SQLModel, select
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "auditlog"
+LEGACY_TABLE = "auditlog_legacy"
+
+AUDIT_COMPRESSION = os.getenv("AUDIT_COMPRESSION", "zlib") # zlib, zstd (needs `zstandard`) or none
+AUDIT_COMPRESS_AFTER_MONTHS = int(os.getenv("AUDIT_COMPRESS_AFTER_MONTHS", "1"))
+AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "12"))
+
+# Rows rewritten per statement when compressing a partition.
+COMPRESS_CHUNK_SIZE = 1000
+
+class AuditPartition(SQLModel, table=True):
+    month: str = Field(primary_key=True) # YYYY-MM
+    table_name: str
+    compressed: bool = Field(default=False)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class AuditRollup(SQLModel, table=True):
+    # Per-month counts kept after a partition is dropped by retention.
+    id: Optional[int] = Field(default=None, primary_key=True)
+    month: str = Field(index=True) # YYYY-MM
+    user_id: str
+    action: str
+    count: int
+
+# --- Month helpers ---
+
+def as_utc(ts: datetime) -> datetime:
+    """Aware UTC datetime; naive values (as SQLite returns them) are taken as UTC."""
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+def month_of(ts: datetime) -> date:
+    ts = as_utc(ts)
+    return date(ts.year, ts.month, 1)
+
+def month_start(month: date) -> datetime:
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+def months_between(start: datetime, end: datetime) -> List[date]:
+    """Months overlapping [start, end), oldest first."""
+    months, current, last = [], month_of(start), month_of(end)
+    while current <= last:
+        months.append(current)
+        current = add_months(current, 1)
+    return months
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_p{month.year:04d}{month.month:02d}"
+
+def month_key(month: date) -> str:
+    return f"{month.year:04d}-{month.month:02d}"
+
+# --- details compression ---
+
+def compress_details(details: Optional[str]) -> Optional[bytes]:
+    """Compresses a JSON string; the first byte records the codec."""
+    if details is None:
+        return None
+    raw = details.encode()
+    if AUDIT_COMPRESSION == "zstd" and ZSTD_AVAILABLE:
+        return b"s" + zstandard.ZstdCompressor().compress(raw)
+    return b"z" + zlib.compress(raw, 6)
+
+def decompress_details(blob: Optional[bytes]) -> Optional[str]:
+    if blob is None:
+        return None
+    codec, payload = blob[:1], blob[1:]
+    if codec == b"s":
+        return zstandard.ZstdDecompressor().decompress(payload).decode()
+    return zlib.decompress(payload).decode()
+
+# --- Cursor (keyset on timestamp DESC, id DESC) ---
+
+def encode_cursor(ts: datetime, row_id: int) -> str:
+    raw = json.dumps([ts.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    ts, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    return datetime.fromisoformat(ts), int(row_id)
+
+class AuditStore:
+    def __init__(self, engine):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        self.metadata = MetaData()
+        self._tables: Dict[str, Table] = {}
+        self._partitions: Dict[date, str] = {}
+        self._partition_lock = threading.Lock()
+
+    # --- Schema ---
+
+    def _columns(self) -> list:
+        if self.dialect == "postgresql":
+            # Partitioned tables need the partition key in every unique
+            # constraint, primary key included.
+            return [
+                Column("id", BigInteger, primary_key=True, autoincrement=True),
+                Column("timestamp", DateTime(timezone=True), primary_key=True),
+            ]
+        return [
+            Column("id", Integer, primary_key=True),
+            Column("timestamp", DateTime(timezone=True), nullable=False),
+        ]
+
+    def _table(self, name: str, **kwargs) -> Table:
+        """Table object for the parent (Postgres) or a month table (SQLite)."""
+        if name in self._tables:
+            return self._tables[name]
+        unique_cols = ("event_id", "timestamp") if self.dialect == "postgresql" else ("event_id",)
+        table = Table(
+            name,
+            self.metadata,
+            *self._columns(),
+            Column("event_id", String),
+            Column("entity_type", String, nullable=False),
+            Column("entity_id", String, nullable=False),
+            Column("action", String, nullable=False),
+            Column("user_id", String, nullable=False),
+            Column("details", Text),
+            Column("details_z", LargeBinary), # details after compression
+            UniqueConstraint(*unique_cols, name=f"uq_{name}_event_id"),
+            Index(f"ix_{name}_entity_ts", "entity_id", "timestamp"),
+            Index(f"ix_{name}_user_ts", "user_id", "timestamp"),
+            **kwargs,
+        )
+        self._tables[name] = table
+        return table
+
+    def ensure_schema(self):
+        SQLModel.metadata.create_all(self.engine, tables=[AuditPartition.__table__, AuditRollup.__table__])
+
+        existing = set(inspect(self.engine).get_table_names())
+        legacy = None
+        if PARENT_TABLE in existing and not self._is_partitioned_parent():
+            # A plain audit table from before partitioning: move it aside
+            # and copy its rows into partitions below.
+            self._rename_legacy()
+            legacy = LEGACY_TABLE
+        elif LEGACY_TABLE in existing:
+            legacy = LEGACY_TABLE # An interrupted migration
+
+        if self.dialect == "postgresql":
+            parent = self._table(PARENT_TABLE, postgresql_partition_by="RANGE (timestamp)")
+            parent.create(self.engine, checkfirst=True)
+
+        self.refresh_partitions()
+
+        if legacy:
+            self._migrate_legacy(legacy)
+
+    def _is_partitioned_parent(self) -> bool:
+        if self.dialect != "postgresql":
+            return False
+        with self.engine.connect() as conn:
+            relkind = conn.execute(
+                text("SELECT relkind FROM pg_class WHERE relname = :name AND relkind IN ('r', 'p')"),
+                {"name": PARENT_TABLE},
+            ).scalar()
+        return relkind == "p"
+
+    def _rename_legacy(self):
+        with self.engine.begin() as conn:
+            if self.dialect == "postgresql":
+                # The primary key and id sequence keep their names across a
+                # table rename and would collide with the new parent's.
+                pkey = conn.execute(text(
+                    "SELECT conname FROM pg_constraint "
+                    "WHERE conrelid = CAST(:t AS regclass) AND contype = 'p'"
+                ), {"t": PARENT_TABLE}).scalar()
+                seq = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": PARENT_TABLE}).scalar()
+                if pkey:
+                    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME CONSTRAINT {pkey} TO {LEGACY_TABLE}_pkey"))
+                if seq:
+                    conn.execute(text(f"ALTER SEQUENCE {seq} RENAME TO {LEGACY_TABLE}_id_seq"))
+            conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {LEGACY_TABLE}"))
+
+    def _migrate_legacy(self, legacy: str):
+        month_expr = "to_char(timestamp, 'YYYY-MM')" if self.dialect == "postgresql" else "strftime('%Y-%m', timestamp)"
+        with self.engine.connect() as conn:
+            keys = conn.execute(text(f"SELECT DISTINCT {month_expr} FROM {legacy}")).scalars().all()
+
+        columns = "id, timestamp, event_id, entity_type, entity_id, action, user_id, details"
+        legacy_columns = {c["name"] for c in inspect(self.engine).get_columns(legacy)}
+        source = columns if "event_id" in legacy_columns else columns.replace("event_id", "NULL")
+        # Ignore rows already copied by an interrupted earlier run.
+        insert_into = "INSERT OR IGNORE INTO" if self.dialect == "sqlite" else "INSERT INTO"
+        on_conflict = " ON CONFLICT DO NOTHING" if self.dialect == "postgresql" else ""
+
+        for key in sorted(keys):
+            year, month_num = key.split("-")
+            month = date(int(year), int(month_num), 1)
+            target = self.ensure_partition(month)
+            with self.engine.begin() as conn:
+                conn.execute(
+                    text(
+                        f"{insert_into} {target} ({columns}) SELECT {source} FROM {legacy} "
+                        f"WHERE timestamp >= :lo AND timestamp < :hi{on_conflict}"
+                    ),
+                    {"lo": self._bound(month), "hi": self._bound(add_months(month, 1))},
+                )
+        with self.engine.begin() as conn:
+            if self.dialect == "postgresql":
+                # Ids were copied verbatim; move the parent's sequence past them.
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{PARENT_TABLE}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {PARENT_TABLE}), false)"
+                ))
+            conn.execute(text(f"DROP TABLE {legacy}"))
+        logger.info(f"Migrated legacy audit table into {len(self._partitions)} partitions")
+
+    def _bound(self, month: date):
+        if self.dialect == "postgresql":
+            return month_start(month)
+        # SQLite stores naive UTC text; compare against the same format.
+        return datetime(month.year, month.month, 1).strftime("%Y-%m-%d %H:%M:%S")
+
+    def ensure_partition(self, month: date) -> str:
+        """Creates the partition for `month` if needed; returns its table name."""
+        if month in self._partitions:
+            return self._partitions[month]
+        with self._partition_lock:
+            if month in self._partitions:
+                return self._partitions[month]
+            return self._create_partition(month)
+
+    def _create_partition(self, month: date) -> str:
+        name = partition_name(month)
+        if self.dialect == "postgresql":
+            lo, hi = month_start(month), month_start(add_months(month, 1))
+            with self.engine.begin() as conn:
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+                    f"FOR VALUES FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')"
+                ))
+        else:
+            self._table(name).create(self.engine, checkfirst=True)
+
+        with Session(self.engine) as session:
+            if not session.get(AuditPartition, month_key(month)):
+                session.add(AuditPartition(month=month_key(month), table_name=name))
+                try:
+                    session.commit()
+                except IntegrityError:
+                    pass # Another replica registered it first
+        self._partitions[month] = name
+        return name
+
+    def refresh_partitions(self) -> Dict[date, str]:
+        """
+        Re-reads the partition registry. Other replicas create (and, through
+        retention, drop) partitions too, so the in-memory map can be stale.
+        """
+        # Under the lock, so a partition this process is registering is not lost.
+        with self._partition_lock, Session(self.engine) as session:
+            partitions = {}
+            for key, table_name in session.exec(select(AuditPartition.month, AuditPartition.table_name)).all():
+                year, month = key.split("-")
+                partitions[date(int(year), int(month), 1)] = table_name
+            self._partitions = partitions
+        return dict(partitions)
+
+    def partitions(self) -> Dict[date, str]:
+        return dict(self._partitions)
+
+    # --- Writes ---
+
+    def write(self, rows: List[dict]) -> int:
+        """
+        Inserts rows with one multi-row INSERT per target table and a single
+        commit. Rows whose event_id is already stored are skipped.
+        """
+        by_month: Dict[date, List[dict]] = {}
+        for row in rows:
+            row["timestamp"] = as_utc(row["timestamp"])
+            by_month.setdefault(month_of(row["timestamp"]), []).append(row)
+        for month in by_month:
+            self.ensure_partition(month)
+
+        inserted = 0
+        with self.engine.begin() as conn:
+            if self.dialect == "postgresql":
+                # The parent routes each row to its partition.
+                stmt = postgresql.insert(self._table(PARENT_TABLE)).values(rows)
+                stmt = stmt.on_conflict_do_nothing(index_elements=["event_id", "timestamp"])
+                inserted = conn.execute(stmt).rowcount
+            else:
+                for month, month_rows in by_month.items():
+                    table = self._table(self._partitions[month])
+                    if self.dialect == "sqlite":
+                        stmt = sqlite.insert(table).values(month_rows).on_conflict_do_nothing(index_elements=["event_id"])
+                    else:
+                        stmt = insert(table).values(month_rows)
+                    inserted += conn.execute(stmt).rowcount
+        return inserted
+
+    # --- Reads ---
+
+    def query(
+        self,
+        start: datetime,
+        end: datetime,
+        entity_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        action: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Returns rows in [start, end), newest first, plus the next cursor.
+        Only partitions overlapping the range are read, newest first, and
+        the walk stops as soon as the page is full.
+        """
+        start, end = as_utc(start), as_utc(end)
+        after = None
+        newest = end
+        if cursor:
+            after_ts, after_id = decode_cursor(cursor)
+            after = (as_utc(after_ts), after_id)
+            # Partitions newer than the cursor position were already read.
+            newest = min(end, after[0])
+
+        months = months_between(start, newest)
+        if any(month not in self._partitions for month in months):
+            # Possibly created by another replica since we last looked.
+            self.refresh_partitions()
+
+        results: List[dict] = []
+        for month in reversed(months):
+            if month not in self._partitions:
+                continue
+            table, in_month = self._scope(month)
+            stmt = select(table).where(in_month, table.c.timestamp >= start, table.c.timestamp < end)
+            if after:
+                stmt = stmt.where(
+                    tuple_(table.c.timestamp, table.c.id)
+                    < tuple_(literal(after[0], table.c.timestamp.type), after[1])
+                )
+            if entity_id:
+                stmt = stmt.where(table.c.entity_id == entity_id)
+            if user_id:
+                stmt = stmt.where(table.c.user_id == user_id)
+            if action:
+                stmt = stmt.where(table.c.action == action.upper())
+            stmt = stmt.order_by(table.c.timestamp.desc(), table.c.id.desc()).limit(limit + 1 - len(results))
+
+            with self.engine.connect() as conn:
+                results.extend(dict(r._mapping) for r in conn.execute(stmt))
+            if len(results) > limit:
+                break
+
+        next_cursor = None
+        if len(results) > limit:
+            results = results[:limit]
+            next_cursor = encode_cursor(results[-1]["timestamp"], results[-1]["id"])
+
+        for row in results:
+            blob = row.pop("details_z")
+            if row["details"] is None and blob is not None:
+                row["details"] = decompress_details(blob)
+        return results, next_cursor
+
+    def _scope(self, month: date):
+        """
+        (table, condition) selecting one month's rows. On Postgres this is
+        the parent with a range the planner prunes to a single partition;
+        on SQLite it is the month's own table.
+        """
+        if self.dialect == "postgresql":
+            table = self._table(PARENT_TABLE, postgresql_partition_by="RANGE (timestamp)")
+            lo, hi = month_start(month), month_start(add_months(month, 1))
+            return table, (table.c.timestamp >= lo) & (table.c.timestamp < hi)
+        return self._table(self._partitions[month]), true()
+
+    # --- Maintenance ---
+
+    def compress_partition(self, month: date) -> int:
+        """Moves `details` into compressed `details_z` for every row of a partition."""
+        table, in_month = self._scope(month)
+        last_id, compressed = 0, 0
+        while True:
+            with self.engine.begin() as conn:
+                rows = conn.execute(
+                    select(table.c.id, table.c.details)
+                    .where(in_month, table.c.id > last_id, table.c.details.is_not(None))
+                    .order_by(table.c.id)
+                    .limit(COMPRESS_CHUNK_SIZE)
+                ).all()
+                if not rows:
+                    break
+                conn.execute(
+                    update(table)
+                    .where(in_month, table.c.id == bindparam("row_id"))
+                    .values(details=None, details_z=bindparam("blob")),
+                    [{"row_id": r.id, "blob": compress_details(r.details)} for r in rows],
+                )
+            last_id = rows[-1].id
+            compressed += len(rows)
+
+        with Session(self.engine) as session:
+            p = session.get(AuditPartition, month_key(month))
+            p.compressed = True
+            session.add(p)
+            session.commit()
+        return compressed
+
+    def drop_partition(self, month: date):
+        """Rolls a partition up into AuditRollup counts, then drops it."""
+        name = self._partitions[month]
+        table, in_month = self._scope(month)
+        with self.engine.begin() as conn:
+            counts = conn.execute(
+                select(table.c.user_id, table.c.action, func.count())
+                .where(in_month)
+                .group_by(table.c.user_id, table.c.action)
+            ).all()
+            if counts:
+                conn.execute(insert(AuditRollup.__table__), [
+                    {"month": month_key(month), "user_id": u, "action": a, "count": n}
+                    for u, a, n in counts
+                ])
+            # Dropping a Postgres partition detaches it from the parent too.
+            conn.execute(text(f"DROP TABLE {name}"))
+            conn.execute(delete(AuditPartition.__table__).where(AuditPartition.__table__.c.month == month_key(month)))
+        self._partitions.pop(month, None)
+
+    def run_maintenance(self, today: Optional[date] = None):
+        current = month_of(datetime.combine(today or date.today(), datetime.min.time()))
+        retain_from = add_months(current, -AUDIT_RETENTION_MONTHS)
+        compress_before = add_months(current, -AUDIT_COMPRESS_AFTER_MONTHS)
+
+        # The registry, not this process's map: other replicas add partitions too.
+        partitions = self.refresh_partitions()
+        with Session(self.engine) as session:
+            compressed = {p.month for p in session.exec(select(AuditPartition)).all() if p.compressed}
+
+        for month in sorted(partitions):
+            if month < retain_from:
+                self.drop_partition(month)
+                logger.info(f"Rolled up and dropped audit partition {month_key(month)}")
+            elif month < compress_before and AUDIT_COMPRESSION != "none" and month_key(month) not in compressed:
+                n = self.compress_partition(month)
+                logger.info(f"Compressed {n} rows in audit partition {month_key(month)}")
@@ -1,111 +1,58 @@
 import os
 import json
-from datetime import datetime, timezone
-from typing import List, Optional, Dict, Any
-from sqlmodel import Session, select
-from openai import OpenAI
-from db import engine
-from models import Conversation, Message, Task
-from mcp.server.fastmcp import FastMCP
-
-# Import tools directly to execute them
-# In a real distributed MCP setup, we would use an MCP Client to call them over network.
-# But here we are in the same process, so we can wrap them or call them.
-# However, to strictly follow "MCP Server" architecture, we should probably treat them as tools.
-# For simplicity in this "Monolith" Phase III, we will just use the function definitions.
-from mcp.server import add_task, list_tasks, complete_task, delete_task, update_task # Wait, imports might be tricky if not exported
-# Actually, let's just import the mcp object and access tools if possible, or import functions.
-from backend.mcp.server import add_task, list_tasks, complete_task, delete_task, update_task
+import asyncio
+from datetime import date
+from typing import List, Optional
+from openai import OpenAI, AsyncOpenAI
+from db import new_session
+from models import Conversation, Message
+from ai.context import build_context, save_summary, summarize, summary_backlog
+from backend.ai.prompt_cache import response_cache
+from backend.ai.tools import intent_cache, tool_registry
+from backend.mcp.server import UnitOfWork, bind_unit_of_work
 
 client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+# Used by run_agent_async so LLM round trips don't block the event loop
+async_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
-# Define Tool Schemas for OpenAI
-# Normally MCP SDK can generate these, but let's hardcode for the "Basic Level" to be sure.
-TOOLS = [
-    {
-        "type": "function",
-        "function": {
-            "name": "add_task",
-            "description": "Create a new task",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "user_id": {"type": "string"},
-                    "title": {"type": "string"},
-                    "description": {"type": "string"}
-                },
-                "required": ["user_id", "title"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "list_tasks",
-            "description": "List tasks for the user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "user_id": {"type": "string"},
-                    "status": {"type": "string", "enum": ["all", "pending", "completed"]}
-                },
-                "required": ["user_id"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "complete_task",
-            "description": "Mark a task as completed",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "user_id": {"type": "string"},
-                    "task_id": {"type": "integer"}
-                },
-                "required": ["user_id", "task_id"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "delete_task",
-            "description": "Delete a task",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "user_id": {"type": "string"},
-                    "task_id": {"type": "integer"}
-                },
-                "required": ["user_id", "task_id"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "update_task",
-            "description": "Update a task",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "user_id": {"type": "string"},
-                    "task_id": {"type": "integer"},
-                    "title": {"type": "string"},
-                    "description": {"type": "string"}
-                },
-                "required": ["user_id", "task_id"]
-            }
-        }
-    }
-]
+MODEL = "gpt-4o" # Or gpt-3.5-turbo
+
+# OpenAI schemas of the MCP tools, generated once from their FastMCP definitions (see ai/tools.py)
+TOOLS = tool_registry.schemas
 
 def get_session():
-    return Session(engine)
+    return new_session()
 
-def run_agent(user_id: str, message: str, conversation_id: Optional[int] = None):
+# Static instructions first and the date (to the day) last, so the prompt
+# prefix - tool schemas, then this text - is byte-identical across turns and
+# users, and provider-side prompt caching can reuse it.
+SYSTEM_PROMPT = "You are a helpful Todo Assistant. You manage tasks for the user using the available tools."
+
+def system_prompt() -> str:
+    return f"{SYSTEM_PROMPT} Today is {date.today().isoformat()}."
+
+def complete(user_id: str, **request):
+    """client.chat.completions.create through the local response cache (ai/prompt_cache.py)."""
+    key = response_cache.key(user_id, request["model"], request["messages"], request.get("tools"))
+    response = response_cache.get(key)
+    if response is None:
+        turn_metrics.completions += 1
+        response = client.chat.completions.create(**request)
+        response_cache.put(key, response)
+    return response
+
+async def acomplete(user_id: str, **request):
+    """complete() for async_client."""
+    key = response_cache.key(user_id, request["model"], request["messages"], request.get("tools"))
+    response = response_cache.get(key)
+    if response is None:
+        turn_metrics.completions += 1
+        response = await async_client.chat.completions.create(**request)
+        response_cache.put(key, response)
+    return response
+
+def start_turn(user_id: str, message: str, conversation_id: Optional[int] = None):
+    """Steps 1-3: get/create the conversation, store the user message, build the prompt."""
     with get_session() as session:
         # 1. Get or Create Conversation
         if conversation_id:
@@ -133,78 +80,187 @@ def run_agent(user_id: str, message: str, conversation_id: Optional[int] = None)
         session.commit()
         
         # 3. Build Context (History)
-        # Fetch last N messages to keep context window manageable
-        # For this hackathon, let's fetch all (or last 20)
-        history_stmt = select(Message).where(Message.conversation_id == conversation.id).order_by(Message.created_at)
-        history_msgs = session.exec(history_stmt).all()
-        
-        messages = [{"role": "system", "content": "You are a helpful Todo Assistant. You manage tasks for the user using the available tools. Always check the current date/time if needed. Today is " + datetime.now().isoformat()}]
-        for m in history_msgs:
-            messages.append({"role": m.role, "content": m.content})
-            
-        # 4. Call OpenAI
-        response = client.chat.completions.create(
-            model="gpt-4o", # Or gpt-3.5-turbo
-            messages=messages,
-            tools=TOOLS,
-            tool_choice="auto"
-        )
-        
-        assistant_message = response.choices[0].message
-        
-        # 5. Handle Tool Calls
-        if assistant_message.tool_calls:
-            # Append assistant message with tool calls to history (virtual, for the next turn)
-            messages.append(assistant_message)
-            
-            for tool_call in assistant_message.tool_calls:
-                function_name = tool_call.function.name
-                arguments = json.loads(tool_call.function.arguments)
-                
-                # Execute Tool
-                result_content = ""
-                if function_name == "add_task":
-                    result_content = add_task(**arguments)
-                elif function_name == "list_tasks":
-                    result_content = list_tasks(**arguments)
-                elif function_name == "complete_task":
-                    result_content = complete_task(**arguments)
-                elif function_name == "delete_task":
-                    result_content = delete_task(**arguments)
-                elif function_name == "update_task":
-                    result_content = update_task(**arguments)
-                else:
-                    result_content = f"Error: Tool {function_name} not found."
-                
-                # Append Tool Output
-                messages.append({
-                    "tool_call_id": tool_call.id,
-                    "role": "tool",
-                    "name": function_name,
-                    "content": str(result_content)
-                })
-            
-            # 6. Get Final Response after Tool Execution
-            second_response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages
-            )
-            final_content = second_response.choices[0].message.content
-        else:
-            final_content = assistant_message.content
-            
+        # Rolling summary + last N messages within a token budget (see ai/context.py)
+        messages = build_context(session, conversation, system_prompt())
+        return conversation.id, messages
+
+def finish_turn(user_id: str, conversation_id: int, final_content: str):
+    """Steps 7-8: store the assistant response and update the rolling summary."""
+    with get_session() as session:
         # 7. Store Assistant Response
         asst_msg = Message(
-            conversation_id=conversation.id,
+            conversation_id=conversation_id,
             user_id=user_id,
             role="assistant",
             content=final_content
         )
         session.add(asst_msg)
         session.commit()
-        
+
+        # 8. Fold messages that left the window into the rolling summary
+        conversation = session.get(Conversation, conversation_id)
+        overflow = summary_backlog(session, conversation)
+        previous = conversation.summary
+    if not overflow:
+        return
+    # The summary completion runs with no session (and no pooled connection) held.
+    summary = summarize(client, previous, overflow)
+    if summary is not None:
+        with get_session() as session:
+            save_summary(session, session.get(Conversation, conversation_id), summary, overflow[-1].id)
+
+class TurnMetrics:
+    """LLM round trips per agent turn (run_agent, run_agent_async and the stream)."""
+
+    def __init__(self):
+        self.turns = 0
+        self.completions = 0
+        self.terminal_replies = 0 # turns answered with tool results, no second completion
+
+    def metrics(self) -> dict:
         return {
-            "conversation_id": conversation.id,
-            "response": final_content,
-            "tool_calls": [t.function.name for t in assistant_message.tool_calls] if assistant_message.tool_calls else []
+            "turns": self.turns,
+            "completions": self.completions,
+            "completions_per_turn": round(self.completions / self.turns, 2) if self.turns else None,
+            "terminal_replies": self.terminal_replies,
+            "intent_cache": intent_cache.metrics(),
         }
+
+turn_metrics = TurnMetrics()
+
+def execute_tool(function_name: str, arguments: dict) -> str:
+    """Runs one tool call (in its own session unless a unit of work is bound, see run_tool_calls)."""
+    return tool_registry.execute(function_name, arguments)
+
+def run_tool_calls(calls: List[dict]) -> List[str]:
+    """
+    Runs the tool calls of one assistant message, in order, on one session:
+    their writes commit together, once ("complete tasks 1-10" is one commit,
+    not ten). If that commit fails, nothing is saved and every result says so.
+    """
+    with UnitOfWork() as work, bind_unit_of_work(work):
+        results = [execute_tool(c["function"]["name"], json.loads(c["function"]["arguments"] or "{}")) for c in calls]
+        if not work.commit():
+            results = ["Error: the changes could not be saved; nothing was changed." for _ in calls]
+    return results
+
+def tool_calls_of(assistant_message) -> List[dict]:
+    """The message's tool calls as plain dicts (what the API accepts back and the intent cache stores)."""
+    return [
+        {"id": t.id, "type": "function", "function": {"name": t.function.name, "arguments": t.function.arguments}}
+        for t in assistant_message.tool_calls or []
+    ]
+
+def tool_message(tool_call: dict, result_content: str) -> dict:
+    return {
+        "tool_call_id": tool_call["id"],
+        "role": "tool",
+        "name": tool_call["function"]["name"],
+        "content": result_content
+    }
+
+def finish_tools(user_id: str, message: str, messages: list, calls: List[dict], results: List[str], cached: bool) -> Optional[str]:
+    """
+    Appends the tool results to the prompt and remembers the calls for this
+    wording. Returns the reply if the results make the second completion
+    unnecessary (all terminal tools), else None.
+    """
+    for tool_call, result_content in zip(calls, results):
+        messages.append(tool_message(tool_call, result_content))
+    if not cached and not any(r.startswith("Error") for r in results):
+        intent_cache.put(user_id, message, calls)
+    reply = tool_registry.terminal_reply([c["function"]["name"] for c in calls], results)
+    if reply is not None:
+        turn_metrics.terminal_replies += 1
+    return reply
+
+def turn_result(conversation_id: int, final_content: str, calls: List[dict]) -> dict:
+    return {
+        "conversation_id": conversation_id,
+        "response": final_content,
+        "tool_calls": [c["function"]["name"] for c in calls]
+    }
+
+def run_agent(user_id: str, message: str, conversation_id: Optional[int] = None):
+    conversation_id, messages = start_turn(user_id, message, conversation_id)
+    turn_metrics.turns += 1
+
+    # 4. Call OpenAI, unless this user asked exactly this before
+    content = None
+    calls = intent_cache.get(user_id, message)
+    cached = calls is not None
+    if not cached:
+        response = complete(
+            user_id,
+            model=MODEL,
+            messages=messages,
+            tools=TOOLS,
+            tool_choice="auto"
+        )
+        assistant_message = response.choices[0].message
+        content = assistant_message.content
+        calls = tool_calls_of(assistant_message)
+
+    # 5. Handle Tool Calls
+    if calls:
+        # Append assistant message with tool calls to history (virtual, for the next turn)
+        messages.append({"role": "assistant", "content": content, "tool_calls": calls})
+        results = run_tool_calls(calls)
+        final_content = finish_tools(user_id, message, messages, calls, results, cached)
+
+        # 6. Get Final Response after Tool Execution (unless the tool results are the answer)
+        if final_content is None:
+            second_response = complete(
+                user_id,
+                model=MODEL,
+                messages=messages
+            )
+            final_content = second_response.choices[0].message.content
+    else:
+        final_content = content
+
+    finish_turn(user_id, conversation_id, final_content)
+    return turn_result(conversation_id, final_content, calls)
+
+async def run_agent_async(user_id: str, message: str, conversation_id: Optional[int] = None):
+    """
+    Same turn as run_agent, without blocking the event loop:
+    LLM calls go through AsyncOpenAI, DB work and tools run in the default
+    thread pool. The tool calls of one assistant message share one session and
+    commit once (run_tool_calls).
+    """
+    conversation_id, messages = await asyncio.to_thread(start_turn, user_id, message, conversation_id)
+    turn_metrics.turns += 1
+
+    content = None
+    calls = intent_cache.get(user_id, message)
+    cached = calls is not None
+    if not cached:
+        response = await acomplete(
+            user_id,
+            model=MODEL,
+            messages=messages,
+            tools=TOOLS,
+            tool_choice="auto"
+        )
+        assistant_message = response.choices[0].message
+        content = assistant_message.content
+        calls = tool_calls_of(assistant_message)
+
+    if calls:
+        messages.append({"role": "assistant", "content": content, "tool_calls": calls})
+        results = await asyncio.to_thread(run_tool_calls, calls)
+        final_content = finish_tools(user_id, message, messages, calls, results, cached)
+
+        if final_content is None:
+            second_response = await acomplete(
+                user_id,
+                model=MODEL,
+                messages=messages
+            )
+            final_content = second_response.choices[0].message.content
+    else:
+        final_content = content
+
+    await asyncio.to_thread(finish_turn, user_id, conversation_id, final_content)
+    return turn_result(conversation_id, final_content, calls)
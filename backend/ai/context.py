@@ -0,0 +1,119 @@
+import os
+import logging
+from typing import Any, Dict, List, Optional
+from sqlmodel import Session, select
+from models import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+# Context window: the prompt holds the rolling summary plus the most recent
+# messages, so its size (and the history query) stays bounded no matter how
+# long the conversation gets.
+CONTEXT_MAX_MESSAGES = int(os.environ.get("CONTEXT_MAX_MESSAGES", "20"))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "3000"))
+# Messages that slid out of the window are folded into the summary once this
+# many have piled up, so the summarizer runs every few turns, not every turn.
+SUMMARY_EVERY = int(os.environ.get("SUMMARY_EVERY", "10"))
+SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL", "gpt-4o-mini")
+SUMMARY_MAX_CHARS = 2000
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and a Todo Assistant. "
+    "Update the summary with the new messages. Keep task titles, ids, dates and user preferences; "
+    "drop small talk. Answer with the updated summary only, in under 150 words."
+)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception: # tiktoken is optional; fall back to a character estimate
+    _encoding = None
+
+def text_tokens(text: str) -> int:
+    """Token count of a piece of text."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4
+
+def count_tokens(text: str) -> int:
+    """Token count of one chat message (content + ~4 tokens of role framing)."""
+    return text_tokens(text) + 4
+
+def recent_messages(session: Session, conversation: Conversation) -> List[Message]:
+    """
+    Latest messages not yet folded into the summary, oldest first.
+    One LIMIT query on the (conversation_id, created_at, id) index.
+    """
+    stmt = (
+        select(Message)
+        .where(Message.conversation_id == conversation.id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(CONTEXT_MAX_MESSAGES + SUMMARY_EVERY)
+    )
+    if conversation.summarized_until_id:
+        stmt = stmt.where(Message.id > conversation.summarized_until_id)
+    rows = session.exec(stmt).all()
+    rows.reverse()
+    return rows
+
+def build_context(session: Session, conversation: Conversation, system_prompt: str) -> List[Dict[str, Any]]:
+    """
+    Prompt messages for the next completion: system prompt, rolling summary,
+    then as many recent messages as fit in CONTEXT_TOKEN_BUDGET.
+    The newest message is always kept.
+    """
+    header = [{"role": "system", "content": system_prompt}]
+    if conversation.summary:
+        header.append({"role": "system", "content": "Summary of the earlier conversation: " + conversation.summary})
+    budget = CONTEXT_TOKEN_BUDGET - sum(count_tokens(m["content"]) for m in header)
+
+    window = recent_messages(session, conversation)[-CONTEXT_MAX_MESSAGES:]
+    kept = []
+    for m in reversed(window):
+        cost = count_tokens(m.content)
+        if kept and cost > budget:
+            break
+        budget -= cost
+        kept.append({"role": m.role, "content": m.content})
+    kept.reverse()
+    return header + kept
+
+def summary_backlog(session: Session, conversation: Conversation) -> List[Message]:
+    """
+    Messages that have left the context window and are due to be folded into
+    the summary: SUMMARY_EVERY or more of them, else an empty list.
+    Messages older than the last fetch window of a conversation that predates
+    summaries are skipped rather than summarized.
+    """
+    pending = recent_messages(session, conversation)
+    overflow = pending[:-CONTEXT_MAX_MESSAGES]
+    return overflow if len(overflow) >= SUMMARY_EVERY else []
+
+def summarize(client, summary: Optional[str], overflow: List[Message]) -> Optional[str]:
+    """
+    One small completion folding `overflow` into `summary`. Takes no session:
+    callers release their connection before this LLM round trip.
+    Returns None on failure.
+    """
+    transcript = "\n".join(f"{m.role}: {m.content}" for m in overflow)
+    try:
+        response = client.chat.completions.create(
+            model=SUMMARY_MODEL,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+            ],
+        )
+        return (response.choices[0].message.content or "").strip()
+    except Exception as e:
+        # The window still bounds the prompt; try again on a later turn.
+        logger.warning(f"Summary update failed for conversation {overflow[-1].conversation_id}: {e}")
+        return None
+
+def save_summary(session: Session, conversation: Conversation, summary: str, summarized_until_id: int):
+    conversation.summary = summary[:SUMMARY_MAX_CHARS]
+    conversation.summarized_until_id = summarized_until_id
+    session.add(conversation)
+    session.commit()
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+# Completions cached by prompt. The key covers the model, the tool schemas
+# and every message of the request, whitespace-normalized, for one user; a
+# hit returns the stored completion without calling the LLM. The system
+# prompt only changes once a day (see agent.system_prompt), so the same
+# question with the same history (e.g. opening a new conversation) hits.
+#
+# Off by default (AGENT_RESPONSE_CACHE_SIZE=0): a hit returns the same answer
+# the model gave before instead of a fresh sample.
+RESPONSE_CACHE_SIZE = int(os.environ.get("AGENT_RESPONSE_CACHE_SIZE", "0"))
+RESPONSE_CACHE_TTL_S = int(os.environ.get("AGENT_RESPONSE_CACHE_TTL_S", "3600"))
+
+def normalize_message(message: Any) -> dict:
+    """A prompt message as a plain dict with its text whitespace-collapsed."""
+    if hasattr(message, "model_dump"):
+        message = message.model_dump(exclude_none=True)
+    normalized = dict(message)
+    if isinstance(normalized.get("content"), str):
+        normalized["content"] = " ".join(normalized["content"].split())
+    return normalized
+
+def usage_of(response) -> dict:
+    """Prompt, provider-cached prompt and completion tokens of a completion (0 if not reported)."""
+    usage = getattr(response, "usage", None)
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt": getattr(usage, "prompt_tokens", 0) or 0,
+        "cached_prompt": getattr(details, "cached_tokens", 0) or 0,
+        "completion": getattr(usage, "completion_tokens", 0) or 0,
+    }
+
+class ResponseCache:
+    """Bounded LRU of completions with per-entry expiry, plus token accounting for /metrics/chat."""
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE, ttl: int = RESPONSE_CACHE_TTL_S):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0 # prompt + completion tokens of the calls hits replaced
+        self.prompt_tokens = 0 # sent to the provider
+        self.cached_prompt_tokens = 0 # of those, served from the provider's prompt cache
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(user_id: str, model: str, messages: List[Any], tools: Optional[List[dict]] = None) -> str:
+        payload = json.dumps(
+            {"user": user_id, "model": model, "tools": tools, "messages": [normalize_message(m) for m in messages]},
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str):
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            usage = usage_of(entry[0])
+            self.tokens_saved += usage["prompt"] + usage["completion"]
+            return entry[0]
+
+    def put(self, key: str, response):
+        """Stores a completion fetched from the provider and counts its prompt tokens."""
+        usage = usage_of(response)
+        with self._lock:
+            self.prompt_tokens += usage["prompt"]
+            self.cached_prompt_tokens += usage["cached_prompt"]
+            if self.max_size <= 0:
+                return
+            self._entries[key] = (response, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "tokens_saved": self.tokens_saved,
+            "prompt_tokens": self.prompt_tokens,
+            "provider_cached_prompt_tokens": self.cached_prompt_tokens,
+        }
+
+response_cache = ResponseCache()
@@ -0,0 +1,156 @@
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional
+from backend.ai.agent import MODEL, TOOLS, async_client, finish_tools, finish_turn, run_tool_calls, start_turn, turn_metrics
+from backend.ai.tools import intent_cache
+
+logger = logging.getLogger(__name__)
+
+# Server-sent events for POST /api/{user_id}/chat/stream.
+#
+#   event: conversation  {"conversation_id"}            sent once the user message is stored
+#   event: token         {"content"}                    assistant text as it is generated
+#   event: tool_call     {"name"}                       as soon as the model names a tool
+#   event: tool_result   {"name", "content"}            after the tool ran
+#   event: done          {"conversation_id", "response", "tool_calls"}
+#   event: error         {"detail"}
+#
+# The final assistant Message is persisted before "done" is sent.
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class StreamMetrics:
+    """
+    Time-to-first-byte of streamed chats: from request start to the first
+    model output sent to the client (a token or a tool_call event).
+    Keeps the last `window` samples for percentiles.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.started = 0
+        self.completed = 0
+        self.errors = 0
+        self._ttfb_ms = deque(maxlen=window)
+        self._total_ms = deque(maxlen=window)
+
+    def record(self, ttfb: Optional[float], total: float):
+        self.completed += 1
+        if ttfb is not None:
+            self._ttfb_ms.append(ttfb * 1000)
+        self._total_ms.append(total * 1000)
+
+    @staticmethod
+    def _percentiles(samples) -> Dict[str, Optional[float]]:
+        if not samples:
+            return {"p50": None, "p95": None}
+        ordered = sorted(samples)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+        return {"p50": pick(0.50), "p95": pick(0.95)}
+
+    def metrics(self) -> dict:
+        return {
+            "started": self.started,
+            "completed": self.completed,
+            "errors": self.errors,
+            "ttfb_ms": self._percentiles(self._ttfb_ms),
+            "total_ms": self._percentiles(self._total_ms),
+        }
+
+stream_metrics = StreamMetrics()
+
+async def stream_chat(user_id: str, message: str, conversation_id: Optional[int] = None) -> AsyncIterator[str]:
+    """One agent turn (same steps as run_agent_async) streamed as SSE."""
+    started = time.perf_counter()
+    first_byte: Optional[float] = None
+    stream_metrics.started += 1
+
+    def mark_first_byte():
+        nonlocal first_byte
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+
+    try:
+        conversation_id, messages = await asyncio.to_thread(start_turn, user_id, message, conversation_id)
+        yield sse("conversation", {"conversation_id": conversation_id})
+
+        turn_metrics.turns += 1
+        content: List[str] = []
+        calls: Dict[int, dict] = {}
+        cached_calls = intent_cache.get(user_id, message)
+        if cached_calls is not None:
+            for i, c in enumerate(cached_calls):
+                calls[i] = {"id": c["id"], "name": c["function"]["name"], "arguments": c["function"]["arguments"]}
+                mark_first_byte()
+                yield sse("tool_call", {"name": c["function"]["name"]})
+        else:
+            turn_metrics.completions += 1
+            stream = await async_client.chat.completions.create(
+                model=MODEL, messages=messages, tools=TOOLS, tool_choice="auto", stream=True
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    mark_first_byte()
+                    content.append(delta.content)
+                    yield sse("token", {"content": delta.content})
+                # Tool calls arrive in pieces keyed by index: id and name first, then argument fragments.
+                # The name is complete once its arguments start, so each call is announced then, once.
+                for part in delta.tool_calls or []:
+                    call = calls.setdefault(part.index, {"id": None, "name": "", "arguments": "", "announced": False})
+                    if part.id:
+                        call["id"] = part.id
+                    if part.function and part.function.name:
+                        call["name"] += part.function.name
+                    if part.function and part.function.arguments:
+                        call["arguments"] += part.function.arguments
+                        if not call["announced"]:
+                            call["announced"] = True
+                            mark_first_byte()
+                            yield sse("tool_call", {"name": call["name"]})
+            # Calls that never sent arguments.
+            for i in sorted(calls):
+                if not calls[i]["announced"]:
+                    mark_first_byte()
+                    yield sse("tool_call", {"name": calls[i]["name"]})
+
+        tool_names = []
+        if calls:
+            ordered = [
+                {"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"]}}
+                for c in (calls[i] for i in sorted(calls))
+            ]
+            tool_names = [c["function"]["name"] for c in ordered]
+            messages.append({"role": "assistant", "content": "".join(content) or None, "tool_calls": ordered})
+            results = await asyncio.to_thread(run_tool_calls, ordered)
+            for name, result_content in zip(tool_names, results):
+                yield sse("tool_result", {"name": name, "content": result_content})
+            reply = finish_tools(user_id, message, messages, ordered, results, cached_calls is not None)
+
+            if reply is not None:
+                # Terminal tools: their results are the answer, no second completion.
+                content = [reply]
+                yield sse("token", {"content": reply})
+            else:
+                content = []
+                turn_metrics.completions += 1
+                stream = await async_client.chat.completions.create(model=MODEL, messages=messages, stream=True)
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        mark_first_byte()
+                        content.append(chunk.choices[0].delta.content)
+                        yield sse("token", {"content": chunk.choices[0].delta.content})
+
+        final_content = "".join(content)
+        await asyncio.to_thread(finish_turn, user_id, conversation_id, final_content)
+        stream_metrics.record(first_byte, time.perf_counter() - started)
+        yield sse("done", {"conversation_id": conversation_id, "response": final_content, "tool_calls": tool_names})
+    except Exception as e:
+        stream_metrics.errors += 1
+        logger.error(f"Chat stream failed for user {user_id}: {e}")
+        yield sse("error", {"detail": "Chat failed"})
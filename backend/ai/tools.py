@@ -0,0 +1,218 @@
+import asyncio
+import contextvars
+import inspect
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Dict, List, Optional
+
+from mcp.server.fastmcp.exceptions import ToolError
+from pydantic import ValidationError
+
+from backend.mcp.server import mcp
+
+logger = logging.getLogger(__name__)
+
+# Agent-side view of the MCP tools. Built once at import from FastMCP's
+# public API: the OpenAI schemas are generated from the input schemas
+# list_tools() reports, and calls are dispatched by name through call_tool(),
+# which validates the arguments against the same models. So a new
+# @mcp.tool() is offered to the model and dispatched without edits here.
+#
+# Tools registered with meta={"terminal": True} return text that already
+# answers the user. When every call of a turn is terminal and succeeded, the
+# agent replies with their results and skips the second completion.
+TERMINAL_REPLIES = os.environ.get("AGENT_TERMINAL_REPLIES", "true").lower() == "true"
+# Per-user cache of message -> tool calls, so a repeated exact request skips
+# the first completion too. Off by default: a request like "complete it"
+# depends on the conversation, not just its wording.
+INTENT_CACHE_SIZE = int(os.environ.get("AGENT_INTENT_CACHE_SIZE", "0"))
+
+def openai_schema(schema: Any) -> Any:
+    """
+    FastMCP's JSON schema trimmed for the prompt: no "title" annotations, and
+    Optional[X] ({"anyOf": [X, null]}) collapsed to X. Tool schemas are sent
+    with every completion, so they cost tokens on every turn.
+    """
+    if isinstance(schema, list):
+        return [openai_schema(s) for s in schema]
+    if not isinstance(schema, dict):
+        return schema
+    variants = schema.get("anyOf")
+    if variants and len(variants) == 2 and {"type": "null"} in variants:
+        rest = {k: v for k, v in schema.items() if k != "anyOf"}
+        schema = {**rest, **next(v for v in variants if v != {"type": "null"})}
+    trimmed = {}
+    for key, value in schema.items():
+        if key == "title":
+            continue
+        if key == "default" and value is None:
+            continue
+        if key == "properties":
+            trimmed[key] = {name: openai_schema(prop) for name, prop in value.items()}
+        else:
+            trimmed[key] = openai_schema(value)
+    return trimmed
+
+class ToolStats:
+    """Calls, failures and latency of one tool; keeps the last `window` samples."""
+
+    def __init__(self, window: int = 1000):
+        self.calls = 0
+        self.errors = 0
+        self._latency_ms = deque(maxlen=window)
+
+    def record(self, seconds: float, ok: bool):
+        self.calls += 1
+        if not ok:
+            self.errors += 1
+        self._latency_ms.append(seconds * 1000)
+
+    def metrics(self) -> dict:
+        ordered = sorted(self._latency_ms)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1) if ordered else None
+        return {"calls": self.calls, "errors": self.errors, "latency_ms": {"p50": pick(0.50), "p95": pick(0.95)}}
+
+_loops = threading.local()
+
+def run_coroutine(coroutine: Awaitable) -> Any:
+    """
+    Runs a coroutine to completion from sync code (the agent runs tools in
+    worker threads), on an event loop kept per thread. From a thread that is
+    already running a loop (e.g. imported during app startup), runs it on a
+    helper thread instead. Either way the caller's context variables, such
+    as the bound unit of work, are visible to the coroutine.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        loop = getattr(_loops, "loop", None)
+        if loop is None:
+            loop = _loops.loop = asyncio.new_event_loop()
+        return loop.run_until_complete(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(contextvars.copy_context().run, run_coroutine, coroutine).result()
+
+def result_text(result: Any) -> str:
+    """The text of FastMCP.call_tool's result: content blocks, or (content blocks, structured output)."""
+    if isinstance(result, tuple):
+        result = result[0]
+    return "\n".join(block.text for block in result if getattr(block, "type", None) == "text")
+
+class RegisteredTool:
+    def __init__(self, name: str, description: str, parameters: dict, terminal: bool = False):
+        self.name = name
+        self.terminal = terminal
+        self.schema = {
+            "type": "function",
+            "function": {"name": name, "description": description, "parameters": openai_schema(parameters)},
+        }
+        self.stats = ToolStats()
+
+class ToolRegistry:
+    def __init__(self, server):
+        self.server = server # dispatches the calls
+        self._tools: Dict[str, RegisteredTool] = {}
+        self.schemas: List[dict] = [] # the `tools` argument of every completion
+
+    @classmethod
+    def from_fastmcp(cls, server) -> "ToolRegistry":
+        registry = cls(server)
+        for tool in run_coroutine(server.list_tools()):
+            registry.register(RegisteredTool(
+                tool.name, inspect.cleandoc(tool.description or ""), tool.inputSchema,
+                terminal=bool((tool.meta or {}).get("terminal")),
+            ))
+        return registry
+
+    def register(self, tool: RegisteredTool):
+        self._tools[tool.name] = tool
+        self.schemas = [t.schema for t in self._tools.values()]
+
+    def get(self, name: str) -> Optional[RegisteredTool]:
+        return self._tools.get(name)
+
+    def execute(self, name: str, arguments: dict) -> str:
+        """Validates the arguments and runs one tool call. Failures come back as text for the model."""
+        tool = self._tools.get(name)
+        if tool is None:
+            return f"Error: Tool {name} not found."
+        started = time.perf_counter()
+        ok = False
+        try:
+            result = result_text(run_coroutine(self.server.call_tool(name, arguments)))
+            ok = True
+            return result
+        except ToolError as e:
+            # call_tool wraps both invalid arguments and failures of the tool itself.
+            cause = e.__cause__
+            if isinstance(cause, ValidationError):
+                problems = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in cause.errors())
+                return f"Error: invalid arguments for {name}: {problems}"
+            logger.exception(f"Tool {name} failed")
+            return f"Error: {name} failed: {cause or e}"
+        except Exception as e:
+            logger.exception(f"Tool {name} failed")
+            return f"Error: {name} failed: {e}"
+        finally:
+            tool.stats.record(time.perf_counter() - started, ok)
+
+    def terminal_reply(self, names: List[str], results: List[str]) -> Optional[str]:
+        """The reply for a turn whose tool calls were all terminal and succeeded, else None."""
+        if not TERMINAL_REPLIES or not names:
+            return None
+        for name, result in zip(names, results):
+            tool = self._tools.get(name)
+            if tool is None or not tool.terminal or result.startswith("Error"):
+                return None
+        return "\n".join(results)
+
+    def metrics(self) -> dict:
+        return {name: tool.stats.metrics() for name, tool in self._tools.items()}
+
+def normalize_intent(message: str) -> str:
+    """Case, surrounding whitespace and trailing punctuation don't change a request."""
+    return re.sub(r"\s+", " ", message.strip().lower()).rstrip(".!?")
+
+class IntentCache:
+    """Bounded LRU of (user_id, normalized message) -> the tool calls the model chose for it."""
+
+    def __init__(self, max_size: int = INTENT_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, List[dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, message: str) -> Optional[List[dict]]:
+        if self.max_size <= 0:
+            return None
+        key = (user_id, normalize_intent(message))
+        with self._lock:
+            calls = self._entries.get(key)
+            if calls is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return calls
+
+    def put(self, user_id: str, message: str, calls: List[dict]):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            key = (user_id, normalize_intent(message))
+            self._entries[key] = calls
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def metrics(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+tool_registry = ToolRegistry.from_fastmcp(mcp)
+intent_cache = IntentCache()
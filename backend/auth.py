@@ -1,8 +1,21 @@
 from fastapi import HTTPException, Security, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
+from collections import OrderedDict
+import hashlib
+import logging
 import os
-from typing import Optional
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import jwt as pyjwt
+    PYJWT_AVAILABLE = True
+except ImportError:
+    PYJWT_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
 
 # Security Scheme
 security = HTTPBearer(auto_error=False)
@@ -11,37 +24,138 @@ security = HTTPBearer(auto_error=False)
 BETTER_AUTH_SECRET = os.environ.get("BETTER_AUTH_SECRET", "dev_secret_key")
 ALGORITHM = "HS256"
 
+# JWT library used to verify tokens: "jose" (python-jose) or "pyjwt".
+JWT_BACKEND = os.environ.get("JWT_BACKEND", "jose")
+
+# Verified tokens are cached so repeat requests skip signature verification.
+# An entry lives until the token's exp or AUTH_CACHE_TTL_S, whichever is first
+# (so a rotated secret is honoured within the TTL). AUTH_CACHE_SIZE=0 disables it.
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL_S = int(os.environ.get("AUTH_CACHE_TTL_S", "300"))
+
+class InvalidToken(Exception):
+    """Raised by decoders for any token that does not verify."""
+
+def decode_jose(token: str) -> dict:
+    try:
+        return jwt.decode(token, BETTER_AUTH_SECRET, algorithms=[ALGORITHM])
+    except JWTError as e:
+        raise InvalidToken(str(e))
+
+def decode_pyjwt(token: str) -> dict:
+    # Same claim checks as decode_jose (exp, nbf, aud, sub/jti types), so
+    # switching JWT_BACKEND never changes which tokens are accepted. pyjwt
+    # also rejects an iat in the future, which python-jose does not: skip
+    # that and keep only the type check both libraries make.
+    try:
+        payload = pyjwt.decode(token, BETTER_AUTH_SECRET, algorithms=[ALGORITHM], options={"verify_iat": False})
+    except pyjwt.PyJWTError as e:
+        raise InvalidToken(str(e))
+    if "iat" in payload:
+        try:
+            int(payload["iat"])
+        except (TypeError, ValueError):
+            raise InvalidToken("Issued At claim (iat) must be an integer.")
+    return payload
+
+DECODERS: Dict[str, Callable[[str], dict]] = {"jose": decode_jose}
+if PYJWT_AVAILABLE:
+    DECODERS["pyjwt"] = decode_pyjwt
+
+if JWT_BACKEND not in DECODERS:
+    logger.warning("JWT backend %r unavailable, using jose", JWT_BACKEND)
+decoder: Callable[[str], dict] = DECODERS.get(JWT_BACKEND, decode_jose)
+
+class TokenCache:
+    """
+    Bounded LRU of verified tokens: sha256(token) -> (sub, expires_at).
+    Only the digest is kept, never the token itself.
+    """
+
+    def __init__(self, max_size: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL_S):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock() # sync dependencies run in the threadpool
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[str]:
+        if self.max_size <= 0:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            sub, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return sub
+
+    def put(self, token: str, sub: str, exp: Optional[float]):
+        if self.max_size <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (sub, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+token_cache = TokenCache()
+
 def get_current_user_id(credentials: Optional[HTTPAuthorizationCredentials] = Security(security)) -> str:
     """
     Decodes the JWT token and returns the user_id.
     """
     if not credentials:
-        print("DEBUG: No credentials provided in request header.")
+        logger.debug("auth rejected reason=missing_credentials")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Missing authentication credentials",
         )
 
     token = credentials.credentials
-    print(f"DEBUG: Received token: {token[:10]}...") # Log start of token
-    try:
-        # Debugging: Print secret (partial) to ensure it matches expectation (careful in prod)
-        # print(f"DEBUG: Secret using: {BETTER_AUTH_SECRET[:5]}...") 
-        
-        payload = jwt.decode(token, BETTER_AUTH_SECRET, algorithms=[ALGORITHM])
-        print(f"DEBUG: Decoded payload: {payload}")
-        
-        user_id: str = payload.get("sub") 
-        if user_id is None:
-             print("DEBUG: No 'sub' in payload")
-             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-            )
+    user_id = token_cache.get(token)
+    if user_id is not None:
         return user_id
-    except JWTError as e:
-        print(f"DEBUG: JWT Decode Error: {e}")
+
+    try:
+        payload = decoder(token)
+    except InvalidToken as e:
+        logger.info("auth rejected reason=invalid_token error=%s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Could not validate credentials: {e}",
         )
+
+    user_id = payload.get("sub")
+    if user_id is None:
+        logger.info("auth rejected reason=missing_sub")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+        )
+    logger.debug("auth verified sub=%s exp=%s backend=%s", user_id, payload.get("exp"), JWT_BACKEND)
+    token_cache.put(token, user_id, payload.get("exp"))
+    return user_id
@@ -1,19 +1,229 @@
 from sqlmodel import create_engine, SQLModel, Session
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 import os
-from typing import Generator
+import threading
+import time
+from typing import AsyncGenerator, Generator
 
 # Default to sqlite for local dev if not set, or fail? 
 # Spec says Neon Serverless, implies Postgres.
 # We'll use a placeholder or expect env var.
 DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./backend_dev.db")
 
-# Basic engine
-engine = create_engine(DATABASE_URL, echo=True)
+# Engine / pool settings (env overridable)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+# Neon closes idle connections; recycle before that and ping on checkout.
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "300"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+# SQLAlchemy's compiled-statement cache (entries per engine; 0 disables).
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", "500"))
+DB_ECHO = os.environ.get("DB_ECHO", "false").lower() == "true"
+# Behind PgBouncer / the Neon pooler (transaction mode) a server connection is
+# only ours for one transaction: don't hold a second pool on our side and
+# don't rely on server-side prepared statements.
+DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "false").lower() == "true"
+# SQLite has one writer at a time; seconds a connection waits for the write
+# lock before failing with "database is locked" (the driver default is 5).
+# Async write transactions hold it across several event-loop turns, so under
+# load 5s is not enough.
+DB_SQLITE_BUSY_TIMEOUT = float(os.environ.get("DB_SQLITE_BUSY_TIMEOUT", "30"))
+# Serve the REST task routes from AsyncSession handlers (asyncpg / aiosqlite)
+# instead of sync handlers in the threadpool. See routes/tasks_async.py.
+DB_ASYNC = os.environ.get("DB_ASYNC", "false").lower() == "true"
+
+class PoolMetrics:
+    """Checkout wait and usage of one engine's pool."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, waited: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += int(timed_out)
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+class TimedPoolMixin:
+    """Records how long each pool checkout waited for a connection."""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            self.metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - start)
+        return conn
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+def pgbouncer_connect_args(url: str) -> dict:
+    """Driver options that keep prepared statements off pooled server connections."""
+    if "+asyncpg" in url:
+        return {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+    if "+psycopg" in url and "+psycopg2" not in url:
+        return {"prepare_threshold": None}
+    return {} # psycopg2 never prepares server-side
+
+def engine_options(url: str, pool_class) -> dict:
+    options = {
+        "echo": DB_ECHO,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "query_cache_size": DB_STATEMENT_CACHE_SIZE,
+    }
+    if DB_PGBOUNCER:
+        options["poolclass"] = NullPool
+        options["connect_args"] = pgbouncer_connect_args(url)
+    elif url.startswith("sqlite") and ":memory:" in url:
+        pass # one shared in-memory DB; keep SQLAlchemy's default pool
+    else:
+        options.update(
+            poolclass=pool_class,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    if url.startswith("sqlite"):
+        # pysqlite and aiosqlite both pass this to sqlite3.connect.
+        options["connect_args"] = {"timeout": DB_SQLITE_BUSY_TIMEOUT}
+    return options
+
+def make_engine(url: str = DATABASE_URL, **overrides) -> Engine:
+    """
+    Builds an engine from the DB_* settings above. Every part of the backend
+    (REST, MCP tools, agent, events) uses the one engine built here.
+    """
+    options = engine_options(url, TimedQueuePool)
+    options.update(overrides)
+
+    new_engine = create_engine(url, **options)
+    if isinstance(new_engine.pool, TimedPoolMixin):
+        new_engine.pool.metrics = PoolMetrics()
+    return new_engine
+
+def async_database_url(url: str) -> str:
+    """Maps DATABASE_URL to its async driver (asyncpg / aiosqlite)."""
+    scheme, rest = url.split("://", 1)
+    if scheme in ("postgresql", "postgres", "postgresql+psycopg2", "postgresql+psycopg"):
+        # asyncpg spells libpq's sslmode as ssl and has no channel_binding.
+        rest = rest.replace("sslmode=", "ssl=").replace("&channel_binding=require", "").replace("channel_binding=require&", "")
+        return "postgresql+asyncpg://" + rest
+    if scheme == "sqlite":
+        return "sqlite+aiosqlite://" + rest
+    return url
+
+def make_async_engine(url: str = DATABASE_URL, **overrides):
+    """Async counterpart of make_engine, with the same pool settings."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = async_database_url(url)
+    options = engine_options(url, TimedAsyncQueuePool)
+    options.update(overrides)
+
+    new_engine = create_async_engine(url, **options)
+    if isinstance(new_engine.sync_engine.pool, TimedPoolMixin):
+        new_engine.sync_engine.pool.metrics = PoolMetrics()
+    return new_engine
+
+def pool_metrics(target: Engine = None) -> dict:
+    """Pool size, in-use/idle connections and checkout wait, for /metrics/db."""
+    target = target or engine
+    pool = getattr(target, "sync_engine", target).pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            in_use=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        stats.update(
+            checkouts=metrics.checkouts,
+            timeouts=metrics.timeouts,
+            wait_avg_ms=round(metrics.wait_total / metrics.checkouts * 1000, 3) if metrics.checkouts else 0.0,
+            wait_max_ms=round(metrics.wait_max * 1000, 3),
+        )
+    return stats
+
+engine = make_engine()
+# Only built when DB_ASYNC is on, so the async drivers stay optional.
+async_engine = make_async_engine() if DB_ASYNC else None
+
+# task.user_id had its own index before the composite (user_id, ...) indexes
+# in models.py, whose leading column serves the same lookups.
+# ix_task_recurring_next_occurrence had a predicate SQLite never matched to
+# the scheduler's queries; ix_task_recurring_due replaces it.
+SUPERSEDED_INDEXES = ("ix_task_user_id", "ix_task_recurring_next_occurrence")
 
 def init_db():
-    from models import Task, Conversation, Message, AuditLog
+    from models import Task, TaskCounter, Conversation, Message, OutboxEvent
     SQLModel.metadata.create_all(engine)
+    # create_all skips tables that already exist, so columns and indexes
+    # added after a table was first created would never be built.
+    add_missing_columns()
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    # Indexes of earlier schemas that newer ones replace; every write still
+    # maintains them while they exist.
+    with engine.begin() as conn:
+        for name in SUPERSEDED_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    # Full-text search structures live outside the models (see search.py).
+    from search import init_search
+    init_search(engine)
+    # Counters for tasks that predate the stats table (see stats.py).
+    from stats import init_stats
+    init_stats(engine)
+
+def add_missing_columns():
+    """Adds new nullable columns to existing tables (no migration tool in this project)."""
+    inspector = inspect(engine)
+    for table in SQLModel.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+def new_session() -> Session:
+    """A session on the shared engine, for code outside a request (MCP tools, agent, workers)."""
+    return Session(engine)
 
 def get_session() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+    with new_session() as session:
+        yield session
+
+def new_async_session():
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    return AsyncSession(async_engine, expire_on_commit=False)
+
+async def get_async_session() -> AsyncGenerator:
+    async with new_async_session() as session:
         yield session
@@ -0,0 +1,379 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from db import new_session
+from models import OutboxEvent
+
+# Dapr Import
+try:
+    from dapr.clients import DaprClient
+    DAPR_AVAILABLE = True
+except ImportError:
+    DAPR_AVAILABLE = False
+    print("Dapr SDK not installed/available. Skipping events.")
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_NAME = "kafka-pubsub"
+TOPIC_NAME = "task-events"
+REMINDERS_TOPIC = "reminders"
+
+# Tunables (env overridable)
+EVENT_QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", "10000"))
+EVENT_BATCH_SIZE = int(os.environ.get("EVENT_BATCH_SIZE", "100"))
+EVENT_FLUSH_INTERVAL_MS = int(os.environ.get("EVENT_FLUSH_INTERVAL_MS", "50"))
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_POLL_INTERVAL_MS = int(os.environ.get("OUTBOX_POLL_INTERVAL_MS", "1000"))
+# How long the relay leaves fresh rows to the publisher's fast path.
+OUTBOX_GRACE_MS = int(os.environ.get("OUTBOX_GRACE_MS", "5000"))
+
+# (outbox row id, topic, JSON payload)
+StagedEvent = Tuple[int, str, str]
+
+def build_task_event(event_type: str, task_id: int, user_id: str, data: dict) -> dict:
+    """
+    Builds a task-events payload.
+    event_id is stable across retries so consumers can drop redeliveries.
+    """
+    return {
+        "event_id": str(uuid.uuid4()),
+        "event_type": event_type,
+        "task_id": task_id,
+        "user_id": user_id,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "data": data
+    }
+
+def stage_events(session: Session, events: List[dict], topic: str = TOPIC_NAME) -> List[StagedEvent]:
+    """
+    Writes events to the outbox inside the caller's transaction.
+    They become visible (and deliverable) only if the caller commits, so a
+    task mutation and its events are stored atomically. Pass the result to
+    publisher.dispatch() after the commit.
+    """
+    if not DAPR_AVAILABLE or not events:
+        return []
+
+    rows = [OutboxEvent(topic=topic, payload=json.dumps(e)) for e in events]
+    session.add_all(rows)
+    # Flush now so ids are assigned while the rows are loaded; reading them
+    # after commit would trigger one refresh query per row.
+    session.flush()
+    return [(row.id, row.topic, row.payload) for row in rows]
+
+def delete_outbox_rows(ids: List[int]):
+    with new_session() as session:
+        session.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(ids)))
+        session.commit()
+
+class DaprBulkSender:
+    """Holds one long-lived DaprClient and sends bulk publishes through it."""
+
+    def __init__(self, pubsub_name: str = PUBSUB_NAME):
+        self.pubsub_name = pubsub_name
+        self._client = None
+
+    def send(self, topic: str, payloads: List[str]) -> bool:
+        """
+        Sends one bulk publish. Dapr does not tell us which of our payloads an
+        entry failure maps to, so any failure fails the whole call; the stable
+        event_id lets consumers drop the duplicates when it is retried.
+        """
+        try:
+            if self._client is None:
+                self._client = DaprClient()
+            resp = self._client.publish_events(
+                pubsub_name=self.pubsub_name,
+                topic_name=topic,
+                data=payloads,
+                data_content_type="application/json"
+            )
+            if resp.failed_entries:
+                logger.warning("Bulk publish: %d of %d entries failed", len(resp.failed_entries), len(payloads))
+                return False
+            return True
+        except Exception as e:
+            logger.error("Failed to publish %d events: %s", len(payloads), e)
+            # Drop the client so the next call reconnects.
+            self.close()
+            return False
+
+    def close(self):
+        if self._client is not None:
+            try:
+                self._client.close()
+            except Exception:
+                pass
+            self._client = None
+
+class EventPublisher:
+    """
+    Long-lived, batching fast path for outbox events.
+
+    Request handlers stage events in the outbox within their transaction and,
+    after committing, call dispatch(), which only enqueues onto a bounded
+    in-process queue and never waits on the sidecar. A single worker thread
+    drains the queue, coalescing events into one Dapr bulk publish per topic
+    per batch, flushing when `batch_size` events are waiting or
+    `flush_interval` has passed since the first one arrived. Delivered rows
+    are deleted from the outbox.
+
+    Nothing is lost when this path fails (queue full, sidecar down, process
+    crash): the rows stay in the outbox and OutboxRelay delivers them.
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int = EVENT_QUEUE_SIZE,
+        batch_size: int = EVENT_BATCH_SIZE,
+        flush_interval: float = EVENT_FLUSH_INTERVAL_MS / 1000,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[StagedEvent]" = queue.Queue(maxsize=max_queue_size)
+        self._sender = DaprBulkSender()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, float] = {
+            "enqueued": 0,
+            "published": 0,
+            "batches": 0,
+            "overflow_to_outbox": 0,
+            "failed_to_outbox": 0,
+            "last_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "max_queue_depth": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="event-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stops the worker after draining whatever is still queued."""
+        if not self._thread:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self._sender.close()
+
+    def dispatch(self, staged: List[StagedEvent]):
+        """Enqueues committed outbox events without blocking; overflow is left to the relay."""
+        if not staged:
+            return
+
+        overflow = 0
+        for item in staged:
+            if not self.running:
+                overflow += 1
+                continue
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                overflow += 1
+
+        with self._stats_lock:
+            self._stats["enqueued"] += len(staged) - overflow
+            self._stats["overflow_to_outbox"] += overflow
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+
+    def metrics(self) -> dict:
+        """Snapshot of queue depth and delivery counters (backpressure signals)."""
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot["queue_depth"] = self._queue.qsize()
+        snapshot["queue_capacity"] = self._queue.maxsize
+        snapshot["running"] = self.running
+        return snapshot
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+
+    def _next_batch(self) -> List[StagedEvent]:
+        """Blocks for the first event, then gathers more until size or time limit."""
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: List[StagedEvent]):
+        start = time.perf_counter()
+        by_topic: Dict[str, List[StagedEvent]] = defaultdict(list)
+        for item in batch:
+            by_topic[item[1]].append(item)
+
+        delivered_ids, failed = [], 0
+        for topic, items in by_topic.items():
+            if self._sender.send(topic, [payload for _, _, payload in items]):
+                delivered_ids.extend(outbox_id for outbox_id, _, _ in items)
+            else:
+                failed += len(items)
+
+        if delivered_ids:
+            try:
+                delete_outbox_rows(delivered_ids)
+            except Exception as e:
+                # Rows stay behind and get re-sent by the relay (at-least-once).
+                logger.error("Failed to clear %d delivered outbox rows: %s", len(delivered_ids), e)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["last_batch_size"] = len(batch)
+            self._stats["last_flush_ms"] = round(elapsed_ms, 3)
+            self._stats["published"] += len(delivered_ids)
+            self._stats["failed_to_outbox"] += failed
+
+class OutboxRelay:
+    """
+    Background worker that delivers outbox rows the publisher did not.
+
+    Each pass claims up to `batch_size` rows older than `grace` with
+    SELECT ... FOR UPDATE SKIP LOCKED, bulk publishes them and deletes them
+    in the same transaction. On Postgres several replicas can run this
+    concurrently without claiming the same rows. SQLite has no row locks (the
+    FOR UPDATE clause is dropped when compiling), but it only allows one
+    writer at a time, so the delete-in-transaction still holds; run a single
+    relay there.
+
+    Delivery is at-least-once: a crash between publish and commit re-sends
+    the batch.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL_MS / 1000,
+        grace: float = OUTBOX_GRACE_MS / 1000,
+        max_backoff: float = 30.0,
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.grace = grace
+        self.max_backoff = max_backoff
+        self._sender = DaprBulkSender()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, float] = {
+            "relayed": 0,
+            "failed_batches": 0,
+            "last_batch_size": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running or not DAPR_AVAILABLE:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-relay", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        if not self._thread:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self._sender.close()
+
+    def relay_once(self) -> Optional[int]:
+        """
+        Claims and delivers one batch.
+        Returns the number of rows relayed, or None if publishing failed.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.grace)
+        with new_session() as session:
+            rows = session.exec(
+                select(OutboxEvent)
+                .where(OutboxEvent.created_at < cutoff)
+                .order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not rows:
+                return 0
+
+            by_topic: Dict[str, List[OutboxEvent]] = defaultdict(list)
+            for row in rows:
+                by_topic[row.topic].append(row)
+            for topic, topic_rows in by_topic.items():
+                if not self._sender.send(topic, [row.payload for row in topic_rows]):
+                    # Releases the row locks; another pass (or replica) retries.
+                    session.rollback()
+                    with self._stats_lock:
+                        self._stats["failed_batches"] += 1
+                    return None
+
+            session.execute(delete(OutboxEvent).where(OutboxEvent.id.in_([row.id for row in rows])))
+            session.commit()
+
+        with self._stats_lock:
+            self._stats["relayed"] += len(rows)
+            self._stats["last_batch_size"] = len(rows)
+        return len(rows)
+
+    def metrics(self) -> dict:
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot["running"] = self.running
+        return snapshot
+
+    def _run(self):
+        backoff = self.poll_interval
+        while not self._stopping.is_set():
+            try:
+                relayed = self.relay_once()
+            except Exception as e:
+                logger.error("Outbox relay pass failed: %s", e)
+                relayed = None
+
+            if relayed is None:
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            backoff = self.poll_interval
+            # A full batch means there is likely more waiting; go again now.
+            if relayed < self.batch_size:
+                self._stopping.wait(self.poll_interval)
+
+publisher = EventPublisher()
+relay = OutboxRelay()
@@ -5,16 +5,32 @@ import os
 
 # Load .env from root (parent of backend)
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
-from db import init_db
+import db
+from db import DB_ASYNC, init_db, pool_metrics
+from events import publisher, relay
+from scheduler import SCHEDULER_ENABLED, scheduler
+from stats import stats_rebuilder
+from task_cache import task_cache
 from routes import tasks
 from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: create tables
+    # Startup: create tables, start the event publisher, outbox relay, recurring-task scheduler and stats rebuilder
     init_db()
+    publisher.start()
+    relay.start()
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+    stats_rebuilder.start()
     yield
-    # Shutdown
+    # Shutdown: drain queued events
+    stats_rebuilder.stop()
+    scheduler.stop()
+    relay.stop()
+    publisher.stop()
+    if db.async_engine is not None:
+        await db.async_engine.dispose()
 
 app = FastAPI(title="Evolution of Todo API", lifespan=lifespan)
 
@@ -30,18 +46,49 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Next-Offset", "ETag"],
 )
 
+if DB_ASYNC:
+    # Async handlers take precedence; routes they don't define (/batch) fall through.
+    from routes import tasks_async
+    app.include_router(tasks_async.router)
 app.include_router(tasks.router)
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Evolution of Todo API (Phase II)"}
 
+@app.get("/metrics/events")
+def event_metrics():
+    """Event publisher queue depth and delivery counters, plus outbox relay, scheduler and stats rebuilder stats."""
+    return {
+        "publisher": publisher.metrics(),
+        "relay": relay.metrics(),
+        "scheduler": scheduler.metrics(),
+        "stats": stats_rebuilder.metrics(),
+    }
+
+@app.get("/metrics/cache")
+def cache_metrics():
+    """Hit/miss counters of the task-list cache."""
+    return {"tasks": task_cache.metrics()}
+
+@app.get("/metrics/db")
+def db_metrics():
+    """Connection pool usage and checkout wait times."""
+    if db.async_engine is not None:
+        return {"sync": pool_metrics(), "async": pool_metrics(db.async_engine)}
+    return pool_metrics()
+
 # --- Phase III: Chat Endpoint ---
 from pydantic import BaseModel
 from typing import Optional, List
-from backend.ai.agent import run_agent
+from fastapi.responses import StreamingResponse
+from backend.ai.agent import run_agent_async, turn_metrics
+from backend.ai.prompt_cache import response_cache
+from backend.ai.streaming import stream_chat, stream_metrics
+from backend.ai.tools import tool_registry
 
 class ChatRequest(BaseModel):
     message: str
@@ -56,8 +103,29 @@ class ChatResponse(BaseModel):
 async def chat_endpoint(user_id: str, request: ChatRequest):
     """
     Stateless chat endpoint.
-    Persists state to DB via run_agent.
+    Persists state to DB via run_agent_async (non-blocking, see ai/agent.py).
     """
-    result = run_agent(user_id, request.message, request.conversation_id)
+    result = await run_agent_async(user_id, request.message, request.conversation_id)
     return ChatResponse(**result)
 
+@app.post("/api/{user_id}/chat/stream")
+async def chat_stream_endpoint(user_id: str, request: ChatRequest):
+    """
+    Streaming variant of the chat endpoint (server-sent events).
+    Tokens and tool progress are forwarded as they arrive; see ai/streaming.py for the events.
+    """
+    return StreamingResponse(
+        stream_chat(user_id, request.message, request.conversation_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/metrics/chat")
+def chat_metrics():
+    """Time-to-first-byte and total duration of streamed chats, LLM round trips per turn, response cache and tokens, calls and latency per tool."""
+    return {
+        "stream": stream_metrics.metrics(),
+        "turns": turn_metrics.metrics(),
+        "response_cache": response_cache.metrics(),
+        "tools": tool_registry.metrics(),
+    }
@@ -1,74 +1,273 @@
-from typing import List, Optional
+import logging
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Literal, Optional
 from mcp.server.fastmcp import FastMCP, Context
-from sqlmodel import select, Session
+from sqlmodel import func, select, Session
 from models import Task, TaskStatus
-from db import engine
+from db import new_session
+from task_cache import task_cache
+from search import build_search_query, search_terms
+from stats import StatsDelta, completed_at_after, status_counters
+from ai.context import text_tokens
 from datetime import datetime, timezone
 
+logger = logging.getLogger(__name__)
+
 # Initialize MCP Server
 mcp = FastMCP("todo-mcp-server")
 
-def get_session():
-    return Session(engine)
+# Tools whose result text is a complete answer to the user ("Task 3 marked as
+# completed."): the agent can reply with it instead of asking the model to
+# phrase it (see ai/tools.py).
+TERMINAL = {"terminal": True}
 
-@mcp.tool()
+class UnitOfWork:
+    """
+    One session shared by several tool calls. Writes are flushed, not
+    committed, so everything a chat turn changes commits once, in commit(),
+    together with the turn's stats counter changes. Task cache invalidations
+    wait for that commit.
+    """
+
+    def __init__(self):
+        self.session = new_session()
+        self.stats = StatsDelta()
+        self.failed = False
+        self._invalidations: Dict[str, set] = {}
+
+    def invalidate(self, user_id: str, statuses: Iterable[str]):
+        self._invalidations.setdefault(user_id, set()).update(statuses)
+
+    def commit(self) -> bool:
+        """Commits the pending writes; on failure (or after a failed tool call) rolls all of them back."""
+        try:
+            if self.failed:
+                raise RuntimeError("a tool call failed")
+            self.stats.apply(self.session)
+            self.session.commit()
+        except Exception as e:
+            logger.warning(f"Tool calls rolled back: {e}")
+            self.session.rollback()
+            self._invalidations.clear()
+            self.stats = StatsDelta()
+            return False
+        for user_id, statuses in self._invalidations.items():
+            task_cache.invalidate(user_id, statuses)
+        self._invalidations.clear()
+        self.stats = StatsDelta()
+        return True
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self) -> "UnitOfWork":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+_current_work: ContextVar[Optional[UnitOfWork]] = ContextVar("unit_of_work", default=None)
+
+@contextmanager
+def bind_unit_of_work(work: UnitOfWork):
+    """Tools called inside this block (same thread/context) use `work` instead of their own session."""
+    token = _current_work.set(work)
+    try:
+        yield work
+    finally:
+        _current_work.reset(token)
+
+@contextmanager
+def tool_work():
+    """
+    The bound unit of work, or (when a tool is called on its own, e.g. over
+    MCP) a fresh one that commits when the tool returns.
+    """
+    work = _current_work.get()
+    if work is not None:
+        try:
+            yield work
+        except Exception:
+            work.failed = True
+            raise
+        return
+    with UnitOfWork() as work:
+        yield work
+        work.commit()
+
+@mcp.tool(meta=TERMINAL)
 def add_task(user_id: str, title: str, description: Optional[str] = None) -> str:
     """Create a new task for the user."""
-    with get_session() as session:
+    with tool_work() as work:
         task = Task(user_id=user_id, title=title, description=description)
-        session.add(task)
-        session.commit()
-        session.refresh(task)
+        work.session.add(task)
+        work.session.flush()
+        work.stats.add(task)
+        work.invalidate(user_id, [task.status])
         return f"Task created: ID={task.id}, Title='{task.title}'"
 
+# list_tasks output goes straight into the model's prompt: rows are cut off
+# at LIST_TOKEN_BUDGET tokens (and `limit`), with a line telling the model
+# how to fetch the next page.
+LIST_DEFAULT_LIMIT = int(os.environ.get("LIST_DEFAULT_LIMIT", "50"))
+LIST_MAX_LIMIT = int(os.environ.get("LIST_MAX_LIMIT", "200"))
+LIST_TOKEN_BUDGET = int(os.environ.get("LIST_TOKEN_BUDGET", "800"))
+LIST_DESCRIPTION_CHARS = 80 # "full" format
+
+def parse_due(value: Optional[str]) -> Optional[datetime]:
+    """ISO date or datetime from a tool argument; naive values are UTC."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def format_task(task: dict, format: str) -> str:
+    """One list row. compact: "[3] Buy milk due:2026-10-20", "✓" when completed."""
+    line = f"[{task['id']}] {task['title']}"
+    if format == "full":
+        line += f" ({task['status']})"
+    elif task["status"] == TaskStatus.COMPLETED:
+        line += " ✓"
+    if task.get("due_date"):
+        line += f" due:{str(task['due_date'])[:10]}"
+    if format == "full" and task.get("description"):
+        description = task["description"]
+        if len(description) > LIST_DESCRIPTION_CHARS:
+            description = description[:LIST_DESCRIPTION_CHARS - 1] + "…"
+        line += f" - {description}"
+    return line
+
+def status_counts(session: Session, statement) -> dict:
+    """Matching tasks per status for a select(Task) statement, in one GROUP BY."""
+    matching = statement.order_by(None).subquery()
+    rows = session.exec(select(matching.c.status, func.count()).group_by(matching.c.status)).all()
+    return dict(rows)
+
 @mcp.tool()
-def list_tasks(user_id: str, status: Optional[str] = "all") -> str:
-    """List tasks for the user. Status can be 'all', 'pending', or 'completed'."""
-    with get_session() as session:
-        statement = select(Task).where(Task.user_id == user_id)
-        if status != "all":
+def list_tasks(
+    user_id: str,
+    status: Literal["all", "pending", "completed"] = "all",
+    query: Optional[str] = None,
+    due_after: Optional[str] = None,
+    due_before: Optional[str] = None,
+    limit: int = LIST_DEFAULT_LIMIT,
+    offset: int = 0,
+    format: Literal["compact", "full"] = "compact",
+) -> str:
+    """
+    List the user's tasks, oldest first (best match first with `query`). Status can be 'all', 'pending', or 'completed'.
+    Optional filters: `query` (words in title/description), `due_after`/`due_before` (ISO dates).
+    Starts with a count per status; `format` is 'compact' or 'full' (adds status and description).
+    """
+    status = None if status == "all" else status
+    limit = max(1, min(limit, LIST_MAX_LIMIT))
+    offset = max(0, offset)
+    try:
+        after, before = parse_due(due_after), parse_due(due_before)
+    except ValueError:
+        return "Invalid due date: use YYYY-MM-DD."
+    terms = search_terms(query) if query else []
+
+    statement = build_search_query(user_id, terms) if terms else select(Task).where(Task.user_id == user_id)
+    if after:
+        statement = statement.where(Task.due_date >= after)
+    if before:
+        statement = statement.where(Task.due_date < before)
+
+    with tool_work() as work:
+        session = work.session
+        if terms or after or before:
+            counts = status_counts(session, statement)
+        else:
+            # All of the user's tasks: their status counters (see stats.py)
+            # instead of a GROUP BY over every task, plus this turn's writes.
+            counts = status_counters(session, user_id, work.stats)
+        if status:
             statement = statement.where(Task.status == status)
-        
-        tasks = session.exec(statement).all()
-        if not tasks:
-            return "No tasks found."
-            
-        result = []
-        for t in tasks:
-            result.append(f"[{t.id}] {t.title} ({t.status})")
-        return "\n".join(result)
+        if not terms:
+            statement = statement.order_by(Task.created_at, Task.id)
+        # Only the requested page, walked in index order.
+        rows = session.exec(statement.offset(offset).limit(limit)).all()
+        tasks = [t.model_dump(mode="json") for t in rows]
+
+    total = counts.get(status, 0) if status else sum(counts.values())
+    summary = f"{total} tasks: " + ", ".join(f"{counts.get(s.value, 0)} {s.value}" for s in TaskStatus)
+    if not tasks:
+        return summary if total else "No tasks found."
+
+    result = [summary]
+    budget = LIST_TOKEN_BUDGET - text_tokens(summary)
+    for t in tasks:
+        line = format_task(t, format)
+        cost = text_tokens(line) + 1
+        if cost > budget and len(result) > 1:
+            break
+        budget -= cost
+        result.append(line)
+    shown = len(result) - 1
+    if offset + shown < total:
+        result.append(f"Showing {offset + 1}-{offset + shown} of {total}: call again with offset={offset + shown}.")
+    return "\n".join(result)
 
 @mcp.tool()
+def search_tasks(user_id: str, query: str, status: Literal["all", "pending", "completed"] = "all", limit: int = 10, offset: int = 0) -> str:
+    """Find tasks whose title or description contains the given words, best match first. Prefer this over list_tasks to locate a specific task."""
+    terms = search_terms(query)
+    if not terms:
+        return "No matching tasks."
+    limit = max(1, min(limit, 50))
+    statement = build_search_query(user_id, terms, None if status == "all" else status)
+    with tool_work() as work:
+        tasks = work.session.exec(statement.offset(offset).limit(limit + 1)).all()
+    if not tasks:
+        return "No matching tasks."
+
+    result = [f"[{t.id}] {t.title} ({t.status})" for t in tasks[:limit]]
+    if len(tasks) > limit:
+        result.append(f"More matches: call again with offset={offset + limit}.")
+    return "\n".join(result)
+
+@mcp.tool(meta=TERMINAL)
 def complete_task(user_id: str, task_id: int) -> str:
     """Mark a task as completed."""
-    with get_session() as session:
-        task = session.get(Task, task_id)
+    with tool_work() as work:
+        task = work.session.get(Task, task_id)
         if not task or task.user_id != user_id:
             return f"Task {task_id} not found."
             
+        old_status = task.status
+        work.stats.remove(task)
         task.status = TaskStatus.COMPLETED
         task.updated_at = datetime.now(timezone.utc)
-        session.add(task)
-        session.commit()
+        task.completed_at = completed_at_after(task.status, old_status, task.completed_at, task.updated_at)
+        work.session.add(task)
+        work.session.flush()
+        work.stats.add(task)
+        work.invalidate(user_id, [old_status, TaskStatus.COMPLETED])
         return f"Task {task_id} marked as completed."
 
-@mcp.tool()
+@mcp.tool(meta=TERMINAL)
 def delete_task(user_id: str, task_id: int) -> str:
     """Delete a task."""
-    with get_session() as session:
-        task = session.get(Task, task_id)
+    with tool_work() as work:
+        task = work.session.get(Task, task_id)
         if not task or task.user_id != user_id:
             return f"Task {task_id} not found."
             
-        session.delete(task)
-        session.commit()
+        deleted_status = task.status
+        work.stats.remove(task)
+        work.session.delete(task)
+        work.session.flush()
+        work.invalidate(user_id, [deleted_status])
         return f"Task {task_id} deleted."
 
-@mcp.tool()
+@mcp.tool(meta=TERMINAL)
 def update_task(user_id: str, task_id: int, title: Optional[str] = None, description: Optional[str] = None) -> str:
     """Update a task's title or description."""
-    with get_session() as session:
-        task = session.get(Task, task_id)
+    with tool_work() as work:
+        task = work.session.get(Task, task_id)
         if not task or task.user_id != user_id:
             return f"Task {task_id} not found."
             
@@ -78,6 +277,7 @@ def update_task(user_id: str, task_id: int, title: Optional[str] = None, descrip
             task.description = description
             
         task.updated_at = datetime.now(timezone.utc)
-        session.add(task)
-        session.commit()
+        work.session.add(task)
+        work.session.flush()
+        work.invalidate(user_id, [task.status])
         return f"Task {task_id} updated."
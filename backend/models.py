@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
-from typing import Optional
-from sqlmodel import Field, SQLModel
+from typing import Any, Dict, List, Optional
+from sqlmodel import Field, Index, SQLModel, text
 from enum import Enum
 
 class TaskStatus(str, Enum):
@@ -8,8 +8,28 @@ class TaskStatus(str, Enum):
     COMPLETED = "completed"
 
 class Task(SQLModel, table=True):
+    # Composite indexes follow the access paths of list_tasks: every query is
+    # scoped to one user, then filtered by status and/or walked in
+    # (created_at, id) or due_date order. The leading user_id column also
+    # serves plain "WHERE user_id = ?" lookups, so no standalone index is needed.
+    __table_args__ = (
+        Index("ix_task_user_created", "user_id", "created_at", "id"),
+        Index("ix_task_user_status_created", "user_id", "status", "created_at", "id"),
+        Index("ix_task_user_due", "user_id", "due_date", "id"),
+        # Partial index: only recurring tasks are ever scanned by next_occurrence.
+        # SQLite only uses it when the query repeats the predicate term for
+        # term, and SQLAlchemy compiles a boolean filter there as "= 1" (see
+        # scheduler.due_templates_query).
+        Index(
+            "ix_task_recurring_due",
+            "next_occurrence",
+            postgresql_where=text("is_recurring"),
+            sqlite_where=text("is_recurring = 1"),
+        ),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: str = Field(index=True) # Managed by Better Auth
+    user_id: str # Managed by Better Auth
     title: str
     description: Optional[str] = None
     status: str = Field(default=TaskStatus.PENDING)
@@ -21,6 +41,31 @@ class Task(SQLModel, table=True):
     recurrence_interval: Optional[str] = None # daily, weekly, monthly
     due_date: Optional[datetime] = None
     next_occurrence: Optional[datetime] = None
+    completed_at: Optional[datetime] = None # set while status is completed (see stats.completed_at_after)
+
+class OutboxEvent(SQLModel, table=True):
+    # Transactional outbox: events are written here in the same transaction
+    # as the change they describe, and deleted once delivered. See events.py.
+    id: Optional[int] = Field(default=None, primary_key=True)
+    topic: str
+    payload: str # JSON-encoded event
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
+
+class TaskCounter(SQLModel, table=True):
+    # Per-user task statistics, maintained by every task write path (stats.py)
+    # so GET /api/tasks/stats reads a handful of rows instead of every task.
+    # One row per counter: "status:pending", "due:2026-10-18" (pending tasks
+    # due that UTC day), "created:2026-W42", "completed:2026-W42" (by completed_at).
+    user_id: str = Field(primary_key=True)
+    key: str = Field(primary_key=True)
+    count: int = 0
+
+class TaskStats(SQLModel):
+    by_status: Dict[str, int]
+    total: int
+    overdue: int # pending, due before today (UTC)
+    due_today: int # pending, due today (UTC)
+    weeks: List[Dict[str, Any]] # oldest first: {"week", "created", "completed", "completion_rate"}
 
 class TaskCreate(SQLModel):
     title: str
@@ -37,14 +82,23 @@ class TaskUpdate(SQLModel):
     recurrence_interval: Optional[str] = None
     due_date: Optional[datetime] = None
 
-class AuditLog(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    entity_type: str # 'Task', 'User'
-    entity_id: str
-    action: str # 'CREATE', 'UPDATE', 'DELETE'
-    user_id: str
-    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    details: Optional[str] = None # JSON string
+class TaskBatchOperation(SQLModel):
+    op: str # create, update, complete, delete
+    task_id: Optional[int] = None # Required for everything except create
+    data: Optional[Dict[str, Any]] = None # TaskCreate / TaskUpdate fields
+
+class TaskBatchRequest(SQLModel):
+    operations: List[TaskBatchOperation]
+
+class TaskBatchResult(SQLModel):
+    index: int
+    op: str
+    ok: bool
+    task_id: Optional[int] = None
+    error: Optional[str] = None
+
+class TaskBatchResponse(SQLModel):
+    results: List[TaskBatchResult]
 
 class Conversation(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -52,9 +106,18 @@ class Conversation(SQLModel, table=True):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+    # Rolling summary of turns that have left the context window (see ai/context.py)
+    summary: Optional[str] = None
+    summarized_until_id: Optional[int] = None # Last Message.id folded into summary
+
 class Message(SQLModel, table=True):
+    # Context is always "latest N messages of a conversation".
+    __table_args__ = (
+        Index("ix_message_conversation_created", "conversation_id", "created_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    conversation_id: int = Field(foreign_key="conversation.id", index=True)
+    conversation_id: int = Field(foreign_key="conversation.id")
     user_id: str = Field(index=True)
     role: str # "user" or "assistant"
     content: str
@@ -0,0 +1,42 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+
+# Keyset (a.k.a. "seek") pagination helpers.
+# The cursor is an opaque, url-safe token that encodes the sort key of the
+# last row on the previous page, so the next page is a simple index range
+# scan instead of an OFFSET that re-reads every skipped row.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(sort_value: datetime, task_id: int) -> str:
+    """Encodes the (sort_value, id) keyset position as an opaque cursor."""
+    raw = json.dumps([sort_value.isoformat(), task_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decodes a cursor produced by encode_cursor. Raises 400 on garbage input."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, task_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(sort_value), int(task_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+def split_page(rows: list, limit: int, sort_key: str = "created_at") -> Tuple[list, Optional[str]]:
+    """
+    Splits a `limit + 1` row fetch into (page, next_cursor).
+    The extra row only tells us whether another page exists; it is not returned.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor(getattr(last, sort_key), last.id)
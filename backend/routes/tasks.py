@@ -1,80 +1,373 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, select, tuple_
+from sqlalchemy import delete, func, insert, update
+from pydantic import ValidationError
 from typing import List, Optional
 from datetime import datetime, timezone
 import json
 
-from db import get_session
-from models import Task, TaskCreate, TaskUpdate
+from db import get_session, new_session
+from models import (
+    Task, TaskCreate, TaskUpdate, TaskStatus, TaskStats,
+    TaskBatchRequest, TaskBatchResponse, TaskBatchResult,
+)
 from auth import get_current_user_id
-
-# Dapr Import
-try:
-    from dapr.clients import DaprClient
-    DAPR_AVAILABLE = True
-except ImportError:
-    DAPR_AVAILABLE = False
-    print("Dapr SDK not installed/available. Skipping events.")
+from events import build_task_event, publisher, stage_events
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, split_page
+from task_cache import STATUS_KEYS, task_cache
+from scheduler import scheduler
+from search import build_search_query, search_terms
+from stats import STATS_MAX_WEEKS, STATS_WEEKS, StatsDelta, build_stats, completed_at_after, stats_query
 
 router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 
-PUBSUB_NAME = "kafka-pubsub"
-TOPIC_NAME = "task-events"
-
-def publish_task_event(event_type: str, task: Task):
-    """Publish task event to Dapr PubSub."""
-    if not DAPR_AVAILABLE:
-        return
-
-    try:
-        with DaprClient() as d:
-             # Serialize task manually or use model_dump_json()
-             event_data = {
-                 "event_type": event_type,
-                 "task_id": task.id,
-                 "user_id": task.user_id,
-                 "timestamp": datetime.now(timezone.utc).isoformat(),
-                 "data": json.loads(task.model_dump_json())
-             }
-             d.publish_event(
-                 pubsub_name=PUBSUB_NAME,
-                 topic_name=TOPIC_NAME,
-                 data=json.dumps(event_data),
-                 data_content_type="application/json"
-             )
-             print(f"Published event: {event_type} for task {task.id}")
-    except Exception as e:
-        print(f"Failed to publish event: {e}")
+def task_event(event_type: str, task: Task) -> dict:
+    """Builds a task-events payload carrying the task's current state."""
+    return build_task_event(event_type, task.id, task.user_id, json.loads(task.model_dump_json()))
+
+# Fields the recurring scheduler plans from. After a committed change to one
+# of them the scheduler is woken, so the change is not left waiting for the
+# end of its current sleep (up to SCHEDULER_MAX_SLEEP_S).
+SCHEDULE_FIELDS = {"is_recurring", "recurrence_interval", "due_date"}
+
+def changes_schedule(changed_fields, *recurring: bool) -> bool:
+    """Whether a write changed what the scheduler plans: schedule fields of a task that is or was recurring."""
+    return any(recurring) and not SCHEDULE_FIELDS.isdisjoint(changed_fields)
+
+# Rows fetched per round trip when streaming NDJSON from a server-side cursor.
+STREAM_BATCH_SIZE = 500
+
+def stream_tasks_ndjson(query):
+    """
+    Yields one JSON document per task, reading through a server-side cursor.
+    Uses its own session because request dependencies are torn down before
+    a StreamingResponse body is sent.
+    """
+    with new_session() as session:
+        result = session.exec(
+            query.execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE)
+        )
+        for task in result:
+            yield task.model_dump_json() + "\n"
+
+# Sortable columns. Each one is the trailing column of a (user_id, ..., id)
+# composite index on Task, so ordered pages are index range scans.
+SORT_COLUMNS = {
+    "created_at": Task.created_at,
+    "due_date": Task.due_date,
+}
+
+def build_task_query(
+    user_id: str,
+    status: Optional[str] = None,
+    due_after: Optional[datetime] = None,
+    due_before: Optional[datetime] = None,
+    is_recurring: Optional[bool] = None,
+    sort: str = "created_at",
+):
+    """
+    Builds the filtered, ordered task query for a user.
+    Returns (query, sort_key, descending) so callers can apply a keyset cursor.
+    """
+    descending = sort.startswith("-")
+    sort_key = sort.lstrip("-")
+    sort_column = SORT_COLUMNS[sort_key]
+
+    query = select(Task).where(Task.user_id == user_id)
+    if status:
+        query = query.where(Task.status == status)
+    if due_after:
+        query = query.where(Task.due_date >= due_after)
+    if due_before:
+        query = query.where(Task.due_date < due_before)
+    if is_recurring is not None:
+        query = query.where(Task.is_recurring == is_recurring)
+    if sort_key == "due_date":
+        # Ordering by due date only makes sense for tasks that have one, and
+        # excluding NULLs keeps the keyset comparison well defined.
+        query = query.where(Task.due_date.is_not(None))
+
+    if descending:
+        query = query.order_by(sort_column.desc(), Task.id.desc())
+    else:
+        query = query.order_by(sort_column, Task.id)
+    return query, sort_key, descending
+
+def apply_cursor(query, cursor: str, sort_key: str, descending: bool):
+    """Restricts an ordered task query to the rows after a keyset cursor."""
+    sort_value, last_id = decode_cursor(cursor)
+    position = tuple_(SORT_COLUMNS[sort_key], Task.id)
+    after = tuple_(sort_value, last_id)
+    return query.where(position < after if descending else position > after)
+
+def is_cacheable(status, due_after, due_before, is_recurring, sort) -> bool:
+    """The plain (optionally status-filtered) list is what clients poll, so only it is cached."""
+    return status in STATUS_KEYS and not (due_after or due_before) and is_recurring is None and sort == "created_at"
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match names this ETag (or is '*')."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [c.strip().removeprefix("W/") for c in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+def cached_list_response(request: Request, cached) -> Response:
+    """Pre-serialized list with its ETag, or 304 if the client already has it."""
+    if etag_matches(request, cached.etag):
+        return Response(status_code=304, headers={"ETag": cached.etag})
+    return Response(content=cached.body, media_type="application/json", headers={"ETag": cached.etag})
 
 @router.get("", response_model=List[Task])
 def list_tasks(
+    request: Request,
+    response: Response,
     session: Session = Depends(get_session),
     user_id: str = Depends(get_current_user_id),
-    status: Optional[str] = Query(None, description="Filter by status")
+    status: Optional[str] = Query(None, description="Filter by status"),
+    due_after: Optional[datetime] = Query(None, description="Only tasks due at or after this time"),
+    due_before: Optional[datetime] = Query(None, description="Only tasks due before this time"),
+    is_recurring: Optional[bool] = Query(None, description="Filter by recurrence"),
+    sort: str = Query("created_at", pattern="^-?(created_at|due_date)$", description="Sort column, prefix with '-' for descending"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; enables keyset pagination"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's X-Next-Cursor header"),
+    stream: bool = Query(False, description="Stream all matching tasks as NDJSON"),
 ):
-    query = select(Task).where(Task.user_id == user_id)
-    if status:
-        query = query.where(Task.status == status)
-    tasks = session.exec(query).all()
+    query, sort_key, descending = build_task_query(
+        user_id, status, due_after, due_before, is_recurring, sort
+    )
+
+    if stream:
+        return StreamingResponse(stream_tasks_ndjson(query), media_type="application/x-ndjson")
+
+    # No paging params: keep returning the full list so existing clients work.
+    if limit is None and cursor is None:
+        if not is_cacheable(status, due_after, due_before, is_recurring, sort):
+            return session.exec(query).all()
+        cached = task_cache.get_or_load(user_id, status, lambda: session.exec(query).all())
+        return cached_list_response(request, cached)
+
+    if cursor:
+        query = apply_cursor(query, cursor, sort_key, descending)
+
+    page_size = limit or DEFAULT_PAGE_SIZE
+    rows = session.exec(query.limit(page_size + 1)).all()
+    tasks, next_cursor = split_page(rows, page_size, sort_key)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return tasks
 
+# Search results are ranked, so they page by offset rather than keyset.
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+def search_page(rows: List[Task], response: Response, limit: int, offset: int) -> List[Task]:
+    """Trims the extra row fetched to detect a next page and advertises its offset."""
+    if len(rows) > limit:
+        response.headers["X-Next-Offset"] = str(offset + limit)
+    return rows[:limit]
+
+@router.get("/search", response_model=List[Task])
+def search_tasks(
+    response: Response,
+    session: Session = Depends(get_session),
+    user_id: str = Depends(get_current_user_id),
+    q: str = Query(..., min_length=1, description="Words to find in title or description (all must match, as prefixes)"),
+    status: Optional[str] = Query(None, description="Filter by status"),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    offset: int = Query(0, ge=0, description="From the previous page's X-Next-Offset header"),
+):
+    """Full-text search over the user's tasks, best match first."""
+    terms = search_terms(q)
+    if not terms:
+        return []
+    query = build_search_query(user_id, terms, status)
+    rows = session.exec(query.offset(offset).limit(limit + 1)).all()
+    return search_page(rows, response, limit, offset)
+
+@router.get("/stats", response_model=TaskStats)
+def task_stats(
+    session: Session = Depends(get_session),
+    user_id: str = Depends(get_current_user_id),
+    weeks: int = Query(STATS_WEEKS, ge=1, le=STATS_MAX_WEEKS, description="Weeks of completion history, current week last"),
+):
+    """Counts by status, overdue and due today, and completions per week, from the user's counters (stats.py)."""
+    today = datetime.now(timezone.utc).date()
+    return build_stats(session.exec(stats_query(user_id, weeks, today)).all(), weeks, today)
+
 @router.post("", response_model=Task)
 def create_task(
     task: TaskCreate,
     session: Session = Depends(get_session),
     user_id: str = Depends(get_current_user_id)
 ):
-    db_task = Task.model_validate(task)
-    db_task.user_id = user_id
+    db_task = Task.model_validate(task, update={"user_id": user_id})
     session.add(db_task)
+    session.flush()
+    stats = StatsDelta()
+    stats.add(db_task)
+    stats.apply(session)
+
+    # Phase V: Event is written to the outbox in the same transaction
+    staged = stage_events(session, [task_event("created", db_task)])
     session.commit()
     session.refresh(db_task)
-    
-    # Phase V: Publish Event
-    publish_task_event("created", db_task)
+    publisher.dispatch(staged)
+    task_cache.invalidate(user_id, [db_task.status])
+    if changes_schedule(task.model_fields_set, db_task.is_recurring):
+        scheduler.wake()
     
     return db_task
 
+# Upper bound on operations per batch request, to keep a single
+# transaction (and its locks) reasonably short.
+MAX_BATCH_SIZE = 5000
+
+@router.post("/batch", response_model=TaskBatchResponse)
+def batch_tasks(
+    batch: TaskBatchRequest,
+    session: Session = Depends(get_session),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Applies many create/update/complete/delete operations in one transaction.
+    Operations are grouped by kind and each group is a single bulk statement,
+    applied in the order create, update, complete, delete. Invalid items are
+    reported in their result and do not abort the rest of the batch.
+    """
+    if len(batch.operations) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_SIZE} operations per batch")
+
+    results: List[Optional[TaskBatchResult]] = [None] * len(batch.operations)
+    creates, updates, completes, deletes = [], [], [], []
+
+    # 1. Validate every item up front; nothing touches the DB yet.
+    for index, item in enumerate(batch.operations):
+        try:
+            if item.op == "create":
+                db_task = Task.model_validate(
+                    TaskCreate.model_validate(item.data or {}), update={"user_id": user_id}
+                )
+                creates.append((index, db_task.model_dump(exclude={"id"})))
+            elif item.op in ("update", "complete", "delete"):
+                if item.task_id is None:
+                    raise ValueError("task_id is required")
+                if item.op == "update":
+                    changes = TaskUpdate.model_validate(item.data or {}).model_dump(exclude_unset=True)
+                    updates.append((index, item.task_id, changes))
+                elif item.op == "complete":
+                    completes.append((index, item.task_id))
+                else:
+                    deletes.append((index, item.task_id))
+            else:
+                raise ValueError(f"Unknown op '{item.op}'")
+        except (ValidationError, ValueError) as e:
+            results[index] = TaskBatchResult(index=index, op=item.op, ok=False, task_id=item.task_id, error=str(e))
+
+    # 2. Resolve which referenced tasks belong to this user, in one query.
+    # Their current rows come off the stats counters; the final ones go back on.
+    referenced = {task_id for _, task_id, *_ in updates + completes + deletes}
+    owned = {} # task_id -> (status, completed_at) as of the last operation applied to it
+    recurring = set()
+    stats = StatsDelta()
+    if referenced:
+        for db_task in session.exec(
+            select(Task).where(Task.user_id == user_id, Task.id.in_(referenced))
+        ).all():
+            owned[db_task.id] = (db_task.status, db_task.completed_at)
+            if db_task.is_recurring:
+                recurring.add(db_task.id)
+            stats.remove(db_task)
+
+    def not_found(index: int, op: str, task_id: int):
+        results[index] = TaskBatchResult(index=index, op=op, ok=False, task_id=task_id, error="Task not found")
+
+    now = datetime.now(timezone.utc)
+    events = []
+
+    # 3. Bulk statements, one per operation kind.
+    if creates:
+        created = session.scalars(
+            insert(Task).returning(Task, sort_by_parameter_order=True),
+            [row for _, row in creates],
+        ).all()
+        for (index, _), db_task in zip(creates, created):
+            results[index] = TaskBatchResult(index=index, op="create", ok=True, task_id=db_task.id)
+            events.append(task_event("created", db_task))
+            stats.add(db_task)
+
+    update_rows = []
+    for index, task_id, changes in updates:
+        if task_id not in owned:
+            not_found(index, "update", task_id)
+            continue
+        row = {"id": task_id, **changes, "updated_at": now}
+        if "status" in changes:
+            old_status, completed_at = owned[task_id]
+            row["completed_at"] = completed_at_after(changes["status"], old_status, completed_at, now)
+            owned[task_id] = (changes["status"], row["completed_at"])
+        update_rows.append(row)
+        results[index] = TaskBatchResult(index=index, op="update", ok=True, task_id=task_id)
+    if update_rows:
+        # ORM bulk UPDATE by primary key (executemany).
+        session.execute(update(Task), update_rows)
+
+    complete_ids = []
+    for index, task_id in completes:
+        if task_id not in owned:
+            not_found(index, "complete", task_id)
+            continue
+        complete_ids.append(task_id)
+        results[index] = TaskBatchResult(index=index, op="complete", ok=True, task_id=task_id)
+    if complete_ids:
+        session.execute(
+            update(Task)
+            .where(Task.user_id == user_id, Task.id.in_(complete_ids))
+            # completed_at is only set while completed: keep it for tasks that already were.
+            .values(status=TaskStatus.COMPLETED, updated_at=now, completed_at=func.coalesce(Task.completed_at, now))
+        )
+
+    # Snapshot updated rows for their events before the deletes run.
+    changed_ids = {row["id"] for row in update_rows} | set(complete_ids)
+    changed = []
+    if changed_ids:
+        changed = session.exec(
+            select(Task).where(Task.id.in_(changed_ids)).execution_options(populate_existing=True)
+        ).all()
+        for db_task in changed:
+            events.append(task_event("updated", db_task))
+
+    delete_ids = []
+    for index, task_id in deletes:
+        if task_id not in owned:
+            not_found(index, "delete", task_id)
+            continue
+        delete_ids.append(task_id)
+        results[index] = TaskBatchResult(index=index, op="delete", ok=True, task_id=task_id)
+    if delete_ids:
+        session.execute(delete(Task).where(Task.user_id == user_id, Task.id.in_(delete_ids)))
+        events.extend(build_task_event("deleted", task_id, user_id, {}) for task_id in dict.fromkeys(delete_ids))
+
+    # Every owned task was updated, completed or deleted: put back the survivors.
+    for db_task in changed:
+        if db_task.id not in delete_ids:
+            stats.add(db_task)
+    stats.apply(session)
+
+    # Phase V: Events are committed atomically with the batch via the outbox
+    staged = stage_events(session, events)
+    session.commit()
+    publisher.dispatch(staged)
+    if events:
+        task_cache.invalidate(user_id)
+    if any(row["is_recurring"] for _, row in creates) or any(
+        changes_schedule(row.keys(), row["id"] in recurring, bool(row.get("is_recurring"))) for row in update_rows
+    ):
+        scheduler.wake()
+
+    return TaskBatchResponse(results=results)
+
 @router.get("/{task_id}", response_model=Task)
 def get_task(
     task_id: int,
@@ -97,17 +390,29 @@ def update_task(
     if not db_task or db_task.user_id != user_id:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    old_status = db_task.status
+    was_recurring = db_task.is_recurring
+    stats = StatsDelta()
+    stats.remove(db_task)
     task_data = task_update.model_dump(exclude_unset=True)
     for key, value in task_data.items():
         setattr(db_task, key, value)
     
     db_task.updated_at = datetime.now(timezone.utc)
+    db_task.completed_at = completed_at_after(db_task.status, old_status, db_task.completed_at, db_task.updated_at)
     session.add(db_task)
+    session.flush()
+    stats.add(db_task)
+    stats.apply(session)
+
+    # Phase V: Event is written to the outbox in the same transaction
+    staged = stage_events(session, [task_event("updated", db_task)])
     session.commit()
     session.refresh(db_task)
-    
-    # Phase V: Publish Event
-    publish_task_event("updated", db_task)
+    publisher.dispatch(staged)
+    task_cache.invalidate(user_id, [old_status, db_task.status])
+    if changes_schedule(task_data, was_recurring, db_task.is_recurring):
+        scheduler.wake()
     
     return db_task
 
@@ -121,32 +426,17 @@ def delete_task(
     if not db_task or db_task.user_id != user_id:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    deleted_status = db_task.status
+    stats = StatsDelta()
+    stats.remove(db_task)
     session.delete(db_task)
+    stats.apply(session)
+
+    # Phase V: Event is written to the outbox in the same transaction
+    # (minimal payload, the row is gone)
+    staged = stage_events(session, [build_task_event("deleted", task_id, user_id, {})])
     session.commit()
-    
-    # Phase V: Publish Event (Must invoke before commit? No, after is safer but object is detached. 
-    # Actually, deleted object might not serialize well if lazy loaded.
-    # We should serialize before delete or just send ID.
-    # Let's send a minimal event for delete or re-construct data.)
-    # Ideally we'd do it before delete commit, but let's just send ID and user_id.
-    try:
-         # Minimal event for deletion
-         if DAPR_AVAILABLE:
-            with DaprClient() as d:
-                event_data = {
-                    "event_type": "deleted",
-                    "task_id": task_id,
-                    "user_id": user_id,
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
-                    "data": {} # No data for delete
-                }
-                d.publish_event(
-                    pubsub_name=PUBSUB_NAME,
-                    topic_name=TOPIC_NAME,
-                    data=json.dumps(event_data),
-                    data_content_type="application/json"
-                )
-    except Exception:
-        pass
+    publisher.dispatch(staged)
+    task_cache.invalidate(user_id, [deleted_status])
 
     return {"ok": True}
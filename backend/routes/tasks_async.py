@@ -0,0 +1,198 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
+from datetime import datetime, timezone
+
+from db import get_async_session, new_async_session
+from models import Task, TaskCreate, TaskStats, TaskUpdate
+from auth import get_current_user_id
+from events import build_task_event, publisher, stage_events
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, split_page
+from task_cache import task_cache
+from scheduler import scheduler
+from search import build_search_query, search_terms
+from stats import STATS_MAX_WEEKS, STATS_WEEKS, StatsDelta, build_stats, completed_at_after, stats_query
+from routes.tasks import (
+    DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, STREAM_BATCH_SIZE,
+    apply_cursor, build_task_query, cached_list_response, changes_schedule, is_cacheable, search_page, task_event,
+)
+
+# Async twin of routes/tasks.py for the single-task and list endpoints,
+# mounted in front of it when DB_ASYNC is on. Handlers run on the event loop
+# with an AsyncSession instead of a threadpool thread each; /batch stays on
+# the sync router. Query building, caching and events are shared.
+router = APIRouter(prefix="/api/tasks", tags=["tasks"])
+
+async def stream_tasks_ndjson(query):
+    """Async version of routes.tasks.stream_tasks_ndjson (own session, server-side cursor)."""
+    async with new_async_session() as session:
+        result = await session.stream_scalars(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for task in result:
+            yield task.model_dump_json() + "\n"
+
+@router.get("", response_model=List[Task])
+async def list_tasks(
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+    user_id: str = Depends(get_current_user_id),
+    status: Optional[str] = Query(None, description="Filter by status"),
+    due_after: Optional[datetime] = Query(None, description="Only tasks due at or after this time"),
+    due_before: Optional[datetime] = Query(None, description="Only tasks due before this time"),
+    is_recurring: Optional[bool] = Query(None, description="Filter by recurrence"),
+    sort: str = Query("created_at", pattern="^-?(created_at|due_date)$", description="Sort column, prefix with '-' for descending"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; enables keyset pagination"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's X-Next-Cursor header"),
+    stream: bool = Query(False, description="Stream all matching tasks as NDJSON"),
+):
+    query, sort_key, descending = build_task_query(
+        user_id, status, due_after, due_before, is_recurring, sort
+    )
+
+    if stream:
+        return StreamingResponse(stream_tasks_ndjson(query), media_type="application/x-ndjson")
+
+    async def load():
+        return (await session.exec(query)).all()
+
+    if limit is None and cursor is None:
+        if not is_cacheable(status, due_after, due_before, is_recurring, sort):
+            return await load()
+        cached = await task_cache.aget_or_load(user_id, status, load)
+        return cached_list_response(request, cached)
+
+    if cursor:
+        query = apply_cursor(query, cursor, sort_key, descending)
+
+    page_size = limit or DEFAULT_PAGE_SIZE
+    rows = (await session.exec(query.limit(page_size + 1))).all()
+    tasks, next_cursor = split_page(rows, page_size, sort_key)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return tasks
+
+# Must be registered before GET /{task_id}, which would otherwise claim the path.
+@router.get("/search", response_model=List[Task])
+async def search_tasks(
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+    user_id: str = Depends(get_current_user_id),
+    q: str = Query(..., min_length=1, description="Words to find in title or description (all must match, as prefixes)"),
+    status: Optional[str] = Query(None, description="Filter by status"),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    offset: int = Query(0, ge=0, description="From the previous page's X-Next-Offset header"),
+):
+    terms = search_terms(q)
+    if not terms:
+        return []
+    query = build_search_query(user_id, terms, status)
+    rows = (await session.exec(query.offset(offset).limit(limit + 1))).all()
+    return search_page(rows, response, limit, offset)
+
+# Also ahead of GET /{task_id}.
+@router.get("/stats", response_model=TaskStats)
+async def task_stats(
+    session: AsyncSession = Depends(get_async_session),
+    user_id: str = Depends(get_current_user_id),
+    weeks: int = Query(STATS_WEEKS, ge=1, le=STATS_MAX_WEEKS, description="Weeks of completion history, current week last"),
+):
+    today = datetime.now(timezone.utc).date()
+    return build_stats((await session.exec(stats_query(user_id, weeks, today))).all(), weeks, today)
+
+@router.post("", response_model=Task)
+async def create_task(
+    task: TaskCreate,
+    session: AsyncSession = Depends(get_async_session),
+    user_id: str = Depends(get_current_user_id)
+):
+    db_task = Task.model_validate(task, update={"user_id": user_id})
+    session.add(db_task)
+    await session.flush()
+    stats = StatsDelta()
+    stats.add(db_task)
+    await stats.aapply(session)
+
+    # Phase V: Event is written to the outbox in the same transaction
+    staged = await session.run_sync(stage_events, [task_event("created", db_task)])
+    await session.commit()
+    await session.refresh(db_task)
+    publisher.dispatch(staged)
+    task_cache.invalidate(user_id, [db_task.status])
+    if changes_schedule(task.model_fields_set, db_task.is_recurring):
+        scheduler.wake()
+
+    return db_task
+
+@router.get("/{task_id}", response_model=Task)
+async def get_task(
+    task_id: int,
+    session: AsyncSession = Depends(get_async_session),
+    user_id: str = Depends(get_current_user_id)
+):
+    task = await session.get(Task, task_id)
+    if not task or task.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
+
+@router.put("/{task_id}", response_model=Task)
+async def update_task(
+    task_id: int,
+    task_update: TaskUpdate,
+    session: AsyncSession = Depends(get_async_session),
+    user_id: str = Depends(get_current_user_id)
+):
+    db_task = await session.get(Task, task_id)
+    if not db_task or db_task.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    old_status = db_task.status
+    was_recurring = db_task.is_recurring
+    stats = StatsDelta()
+    stats.remove(db_task)
+    changes = task_update.model_dump(exclude_unset=True)
+    for key, value in changes.items():
+        setattr(db_task, key, value)
+
+    db_task.updated_at = datetime.now(timezone.utc)
+    db_task.completed_at = completed_at_after(db_task.status, old_status, db_task.completed_at, db_task.updated_at)
+    session.add(db_task)
+    await session.flush()
+    stats.add(db_task)
+    await stats.aapply(session)
+
+    # Phase V: Event is written to the outbox in the same transaction
+    staged = await session.run_sync(stage_events, [task_event("updated", db_task)])
+    await session.commit()
+    await session.refresh(db_task)
+    publisher.dispatch(staged)
+    task_cache.invalidate(user_id, [old_status, db_task.status])
+    if changes_schedule(changes, was_recurring, db_task.is_recurring):
+        scheduler.wake()
+
+    return db_task
+
+@router.delete("/{task_id}")
+async def delete_task(
+    task_id: int,
+    session: AsyncSession = Depends(get_async_session),
+    user_id: str = Depends(get_current_user_id)
+):
+    db_task = await session.get(Task, task_id)
+    if not db_task or db_task.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    deleted_status = db_task.status
+    stats = StatsDelta()
+    stats.remove(db_task)
+    await session.delete(db_task)
+    await stats.aapply(session)
+
+    # Phase V: Event is written to the outbox in the same transaction
+    # (minimal payload, the row is gone)
+    staged = await session.run_sync(stage_events, [build_task_event("deleted", task_id, user_id, {})])
+    await session.commit()
+    publisher.dispatch(staged)
+    task_cache.invalidate(user_id, [deleted_status])
+
+    return {"ok": True}
@@ -0,0 +1,281 @@
+import calendar
+import heapq
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, update
+from sqlmodel import select
+
+from db import new_session
+from events import REMINDERS_TOPIC, build_task_event, publisher, stage_events
+from models import Task, TaskStatus
+from stats import StatsDelta, as_utc
+from task_cache import task_cache
+
+logger = logging.getLogger(__name__)
+
+# Tunables (env overridable)
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "true").lower() == "true"
+SCHEDULER_BATCH_SIZE = int(os.environ.get("SCHEDULER_BATCH_SIZE", "200"))
+# Upcoming occurrences kept in the in-memory heap between DB reads.
+SCHEDULER_LOOKAHEAD = int(os.environ.get("SCHEDULER_LOOKAHEAD", "1000"))
+# Longest sleep without looking at the DB, so recurring tasks created by
+# other replicas (or with an earlier occurrence than the heap knows) are seen.
+SCHEDULER_MAX_SLEEP_S = float(os.environ.get("SCHEDULER_MAX_SLEEP_S", "30"))
+
+# Compiles to the predicate of the partial index ix_task_recurring_due
+# ("is_recurring = 1" on SQLite, "is_recurring" on Postgres), so every
+# scheduler query can use it.
+RECURRING = Task.is_recurring
+
+def due_templates_query(now: datetime, limit: int):
+    """Recurring templates whose next occurrence is due, earliest first (a range scan of the partial index)."""
+    return (
+        select(Task)
+        .where(RECURRING, Task.next_occurrence <= now)
+        .order_by(Task.next_occurrence)
+        .limit(limit)
+    )
+
+def add_interval(value: datetime, interval: Optional[str]) -> Optional[datetime]:
+    """The occurrence after `value`, or None for an unknown interval."""
+    if interval == "daily":
+        return value + timedelta(days=1)
+    if interval == "weekly":
+        return value + timedelta(weeks=1)
+    if interval == "monthly":
+        # Same day next month, clamped (Jan 31 -> Feb 28/29).
+        year, month = (value.year + 1, 1) if value.month == 12 else (value.year, value.month + 1)
+        day = min(value.day, calendar.monthrange(year, month)[1])
+        return value.replace(year=year, month=month, day=day)
+    return None
+
+def next_after(start: datetime, interval: Optional[str], now: datetime) -> Optional[datetime]:
+    """First occurrence strictly after `now`, stepping from `start` (skips missed ones)."""
+    value = start
+    while value is not None and value <= now:
+        value = add_interval(value, interval)
+    return value
+
+class RecurringScheduler:
+    """
+    Background worker that turns due recurring tasks into concrete tasks.
+
+    A recurring task is a template: when its next_occurrence is reached, a
+    plain (non-recurring) copy due at that time is inserted, a reminder is
+    published on the `reminders` topic, and next_occurrence moves to the
+    following interval. Templates with no next_occurrence yet are
+    initialised from their due_date (or one interval after creation).
+
+    Each pass claims up to `batch_size` due templates through the partial
+    next_occurrence index with SELECT ... FOR UPDATE SKIP LOCKED, inserts
+    all their instances with one bulk INSERT, advances them with one bulk
+    UPDATE and stages the events in the outbox, all in one transaction. So
+    several replicas can run this without materializing an occurrence twice
+    (on SQLite the single-writer lock gives the same guarantee).
+
+    Between passes the worker keeps a min-heap of upcoming occurrences and
+    sleeps until the earliest one (at most `max_sleep`) instead of polling.
+    If the scheduler was down, only the latest missed occurrence of each
+    template is materialized.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = SCHEDULER_BATCH_SIZE,
+        lookahead: int = SCHEDULER_LOOKAHEAD,
+        max_sleep: float = SCHEDULER_MAX_SLEEP_S,
+        max_backoff: float = 60.0,
+    ):
+        self.batch_size = batch_size
+        self.lookahead = lookahead
+        self.max_sleep = max_sleep
+        self.max_backoff = max_backoff
+        self._heap: List[datetime] = []
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, float] = {
+            "materialized": 0,
+            "initialized": 0,
+            "passes": 0,
+            "failed_passes": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="recurring-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        if not self._thread:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def wake(self):
+        """Makes the worker look at the DB now (e.g. after a recurring task was created here)."""
+        self._wake.set()
+
+    def initialize_once(self, now: Optional[datetime] = None) -> int:
+        """Sets next_occurrence on up to `batch_size` recurring tasks that have none."""
+        now = now or datetime.now(timezone.utc)
+        with new_session() as session:
+            rows = session.exec(
+                select(Task.id, Task.due_date, Task.created_at, Task.recurrence_interval)
+                .where(RECURRING, Task.next_occurrence.is_(None))
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not rows:
+                return 0
+            changes = []
+            for task_id, due_date, created_at, interval in rows:
+                # The template itself is the occurrence at its due date (or creation).
+                start = as_utc(due_date or created_at)
+                first = next_after(start, interval, max(start, now))
+                if first is None:
+                    # Unknown interval: stop treating it as recurring rather than rescanning it forever.
+                    changes.append({"id": task_id, "is_recurring": False})
+                else:
+                    changes.append({"id": task_id, "next_occurrence": first})
+            session.execute(update(Task), changes)
+            session.commit()
+        with self._stats_lock:
+            self._stats["initialized"] += len(rows)
+        return len(rows)
+
+    def materialize_once(self, now: Optional[datetime] = None) -> int:
+        """
+        Claims one batch of due templates and materializes their occurrences.
+        Returns the number of templates processed.
+        """
+        now = now or datetime.now(timezone.utc)
+        with new_session() as session:
+            templates = session.exec(due_templates_query(now, self.batch_size).with_for_update(skip_locked=True)).all()
+            if not templates:
+                return 0
+
+            instance_rows, advances = [], []
+            for template in templates:
+                occurrence = as_utc(template.next_occurrence)
+                # Catch-up: jump to the latest occurrence that is already due.
+                following = add_interval(occurrence, template.recurrence_interval)
+                while following is not None and following <= now:
+                    occurrence, following = following, add_interval(following, template.recurrence_interval)
+                instance_rows.append({
+                    "user_id": template.user_id,
+                    "title": template.title,
+                    "description": template.description,
+                    "status": TaskStatus.PENDING,
+                    "due_date": occurrence,
+                    "created_at": now,
+                    "updated_at": now,
+                })
+                if following is None:
+                    advances.append({"id": template.id, "is_recurring": False, "next_occurrence": None, "updated_at": now})
+                else:
+                    advances.append({"id": template.id, "next_occurrence": following, "updated_at": now})
+
+            instances = session.scalars(
+                insert(Task).returning(Task, sort_by_parameter_order=True), instance_rows
+            ).all()
+            # ORM bulk UPDATE by primary key (executemany).
+            session.execute(update(Task), advances)
+            # Advancing a template leaves its counters alone; each new occurrence adds its own.
+            stats = StatsDelta()
+            for instance in instances:
+                stats.add(instance)
+            stats.apply(session)
+
+            created_events, reminder_events = [], []
+            for template, instance in zip(templates, instances):
+                state = json.loads(instance.model_dump_json())
+                created_events.append(build_task_event("created", instance.id, instance.user_id, {**state, "recurring_task_id": template.id}))
+                reminder_events.append(build_task_event("reminder", instance.id, instance.user_id, {
+                    "title": instance.title,
+                    "due_date": as_utc(instance.due_date).isoformat(),
+                    "recurring_task_id": template.id,
+                }))
+            staged = stage_events(session, created_events) + stage_events(session, reminder_events, topic=REMINDERS_TOPIC)
+            users = {template.user_id for template in templates}
+            session.commit()
+
+        publisher.dispatch(staged)
+        for user_id in users:
+            task_cache.invalidate(user_id)
+        with self._stats_lock:
+            self._stats["materialized"] += len(templates)
+        return len(templates)
+
+    def refill(self, now: Optional[datetime] = None):
+        """Loads the next `lookahead` occurrences into the heap (one index range scan)."""
+        now = now or datetime.now(timezone.utc)
+        with new_session() as session:
+            upcoming = session.exec(
+                select(Task.next_occurrence)
+                .where(RECURRING, Task.next_occurrence > now)
+                .order_by(Task.next_occurrence)
+                .limit(self.lookahead)
+            ).all()
+        self._heap = [as_utc(value) for value in upcoming]
+        heapq.heapify(self._heap)
+
+    def run_once(self, now: Optional[datetime] = None) -> float:
+        """One scheduling pass. Returns how long to sleep before the next one."""
+        now = now or datetime.now(timezone.utc)
+        while self.initialize_once(now) == self.batch_size:
+            pass
+        while self.materialize_once(now) == self.batch_size:
+            pass
+
+        # Drop what was just handled; refill when the heap runs dry.
+        while self._heap and self._heap[0] <= now:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            self.refill(now)
+        with self._stats_lock:
+            self._stats["passes"] += 1
+
+        if not self._heap:
+            return self.max_sleep
+        return min(max((self._heap[0] - now).total_seconds(), 0.0), self.max_sleep)
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stopping.is_set():
+            try:
+                delay = self.run_once()
+                backoff = 1.0
+            except Exception as e:
+                logger.error("Recurring scheduler pass failed: %s", e)
+                with self._stats_lock:
+                    self._stats["failed_passes"] += 1
+                delay, backoff = backoff, min(backoff * 2, self.max_backoff)
+            if self._wake.wait(delay):
+                self._wake.clear()
+                # A wake-up may mean an earlier occurrence than the heap knows.
+                self._heap = []
+
+    def metrics(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["running"] = self.running
+        stats["heap_size"] = len(self._heap)
+        stats["next_due"] = self._heap[0].isoformat() if self._heap else None
+        return stats
+
+scheduler = RecurringScheduler()
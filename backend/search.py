@@ -0,0 +1,114 @@
+import logging
+import os
+import re
+from typing import List, Optional
+
+from sqlalchemy import column, func, literal_column, table
+from sqlalchemy.engine import Engine
+from sqlmodel import select
+
+from models import Task
+
+logger = logging.getLogger(__name__)
+
+# Full-text search over task title and description.
+#
+# Postgres: a stored generated tsvector column (title weighted above
+# description) with a GIN index, ranked by ts_rank_cd.
+# SQLite: an external-content FTS5 table kept in sync by triggers, ranked
+# by bm25. Both stay current for every write path (ORM, bulk statements,
+# the scheduler) without application code. Without FTS5, a LIKE scan.
+#
+# Queries match all terms, each as a prefix ("dent" finds "dentist").
+SEARCH_CONFIG = os.environ.get("SEARCH_CONFIG", "english") # Postgres text search configuration
+if not re.fullmatch(r"\w+", SEARCH_CONFIG):
+    raise ValueError(f"Invalid SEARCH_CONFIG '{SEARCH_CONFIG}'")
+# Rank weight of a title match relative to a description match (SQLite bm25).
+SEARCH_TITLE_WEIGHT = float(os.environ.get("SEARCH_TITLE_WEIGHT", "4.0"))
+
+POSTGRES_DDL = [
+    "ALTER TABLE task ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_task_search ON task USING GIN (search_vector)",
+]
+
+SQLITE_DDL = [
+    "CREATE TRIGGER IF NOT EXISTS task_fts_insert AFTER INSERT ON task BEGIN "
+    "INSERT INTO task_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_delete AFTER DELETE ON task BEGIN "
+    "INSERT INTO task_fts(task_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_update AFTER UPDATE OF title, description ON task BEGIN "
+    "INSERT INTO task_fts(task_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO task_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+]
+
+# "postgres", "fts5" or "like"; set by init_search()
+search_backend: Optional[str] = None
+
+def sqlite_has_fts5(conn) -> bool:
+    options = {row[0] for row in conn.exec_driver_sql("PRAGMA compile_options")}
+    return "ENABLE_FTS5" in options
+
+def init_search(engine: Engine):
+    """Creates the search column/index (Postgres) or FTS5 table and triggers (SQLite). Idempotent."""
+    global search_backend
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            for statement in POSTGRES_DDL:
+                conn.exec_driver_sql(statement)
+            search_backend = "postgres"
+        elif engine.dialect.name == "sqlite" and sqlite_has_fts5(conn):
+            exists = conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'task_fts'").first()
+            if not exists:
+                conn.exec_driver_sql(
+                    "CREATE VIRTUAL TABLE task_fts USING fts5("
+                    "title, description, content='task', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+                )
+                conn.exec_driver_sql(f"INSERT INTO task_fts(task_fts, rank) VALUES ('rank', 'bm25({SEARCH_TITLE_WEIGHT}, 1.0)')")
+                # Index the rows that predate the table.
+                conn.exec_driver_sql("INSERT INTO task_fts(task_fts) VALUES ('rebuild')")
+            for statement in SQLITE_DDL:
+                conn.exec_driver_sql(statement)
+            search_backend = "fts5"
+        else:
+            search_backend = "like"
+    logger.info(f"Task search backend: {search_backend}")
+
+def search_terms(query: str) -> List[str]:
+    """Word tokens of a user query; everything else (operators, quotes) is dropped."""
+    return re.findall(r"\w+", query.lower())
+
+task_fts = table("task_fts", column("rowid"), column("rank"))
+search_vector = literal_column("task.search_vector")
+
+def build_search_query(user_id: str, terms: List[str], status: Optional[str] = None):
+    """
+    Ranked search over the user's tasks, best match first; callers add
+    LIMIT/OFFSET. Works with sync and async sessions. `terms` must be non-empty.
+    """
+    if search_backend == "postgres":
+        config = literal_column(f"'{SEARCH_CONFIG}'::regconfig")
+        query_vector = func.to_tsquery(config, " & ".join(f"{term}:*" for term in terms))
+        query = (
+            select(Task)
+            .where(Task.user_id == user_id, search_vector.op("@@")(query_vector))
+            .order_by(func.ts_rank_cd(search_vector, query_vector).desc(), Task.id.desc())
+        )
+    elif search_backend == "fts5":
+        match = " ".join(f'"{term}"*' for term in terms)
+        query = (
+            select(Task)
+            .join(task_fts, task_fts.c.rowid == Task.id)
+            .where(Task.user_id == user_id, literal_column("task_fts").op("MATCH")(match))
+            .order_by(task_fts.c.rank, Task.id.desc())
+        )
+    else:
+        query = select(Task).where(Task.user_id == user_id)
+        for term in terms:
+            pattern = "%" + term.replace("_", "\\_") + "%"
+            query = query.where(Task.title.ilike(pattern, escape="\\") | Task.description.ilike(pattern, escape="\\"))
+        query = query.order_by(Task.created_at.desc(), Task.id.desc())
+    if status:
+        query = query.where(Task.status == status)
+    return query
@@ -0,0 +1,292 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, delete, insert, or_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from db import engine, new_session
+from models import Task, TaskCounter, TaskStats, TaskStatus
+
+logger = logging.getLogger(__name__)
+
+# Task statistics from incremental counters (TaskCounter rows, see models.py).
+#
+# Every task contributes a fixed set of counters, derived from its row alone:
+# its status, the ISO week it was created, the week it was completed (its
+# completed_at) and, while open and due, its due day. Write
+# paths subtract a task's contributions before a change and add them after it,
+# in the same transaction, so GET /api/tasks/stats reads a few counter rows.
+# Overdue / due today are sums over the due-day counters, so they stay correct
+# as days pass. A periodic rebuild recomputes each user's counters from their
+# tasks, repairing drift from writes that bypass the API.
+STATS_WEEKS = int(os.environ.get("STATS_WEEKS", "8")) # weeks of completion history returned
+STATS_MAX_WEEKS = 52
+STATS_REBUILD_INTERVAL_S = float(os.environ.get("STATS_REBUILD_INTERVAL_S", "86400")) # 0 disables
+STATS_REBUILD_BATCH_SIZE = int(os.environ.get("STATS_REBUILD_BATCH_SIZE", "500")) # users per scan
+
+def as_utc(value: datetime) -> datetime:
+    """SQLite hands datetimes back naive; they are stored as UTC."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def week_key(value) -> str:
+    """ISO week of a datetime (UTC) or date, e.g. "2026-W42"."""
+    day = as_utc(value).date() if isinstance(value, datetime) else value
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+def completed_at_after(status, old_status, completed_at: Optional[datetime], now: datetime) -> Optional[datetime]:
+    """A task's completed_at once its status goes from old_status to status: set on completion, kept while completed, cleared on reopening."""
+    if status != TaskStatus.COMPLETED:
+        return None
+    if old_status == TaskStatus.COMPLETED and completed_at is not None:
+        return completed_at
+    return now
+
+def contributions(status, due_date: Optional[datetime], created_at: datetime, completed_at: Optional[datetime]) -> Dict[str, int]:
+    """The counters one task adds to its user's statistics."""
+    status = getattr(status, "value", status)
+    counts = {f"status:{status}": 1, f"created:{week_key(created_at)}": 1}
+    if status == TaskStatus.COMPLETED:
+        if completed_at is not None:
+            counts[f"completed:{week_key(completed_at)}"] = 1
+    elif due_date is not None:
+        counts[f"due:{as_utc(due_date).date().isoformat()}"] = 1
+    return counts
+
+def upsert_counters(rows: List[dict]):
+    """INSERT ... ON CONFLICT adding each row's count to the stored one."""
+    dialect = postgresql if engine.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(TaskCounter).values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=["user_id", "key"],
+        set_={"count": TaskCounter.count + statement.excluded["count"]},
+    )
+
+class StatsDelta:
+    """
+    Counter changes of one transaction. remove() a task as it is before a
+    change (or before deleting it) and add() it as it is after (or when
+    created); apply() writes the net changes in one statement.
+    """
+
+    def __init__(self):
+        self._changes: Dict[str, Counter] = defaultdict(Counter)
+
+    def change(self, user_id: str, counts: Dict[str, int], sign: int = 1):
+        for key, count in counts.items():
+            self._changes[user_id][key] += sign * count
+
+    def add(self, task: Task):
+        self.change(task.user_id, contributions(task.status, task.due_date, task.created_at, task.completed_at))
+
+    def remove(self, task: Task):
+        self.change(task.user_id, contributions(task.status, task.due_date, task.created_at, task.completed_at), -1)
+
+    def statement(self):
+        # Sorted, so concurrent transactions lock counter rows in the same order.
+        rows = [
+            {"user_id": user_id, "key": key, "count": count}
+            for user_id, changes in sorted(self._changes.items())
+            for key, count in sorted(changes.items())
+            if count
+        ]
+        return upsert_counters(rows) if rows else None
+
+    def pending(self, user_id: str) -> Counter:
+        """Net changes to one user's counters not applied yet."""
+        return self._changes.get(user_id, Counter())
+
+    def apply(self, session: Session):
+        statement = self.statement()
+        if statement is not None:
+            session.execute(statement)
+
+    async def aapply(self, session):
+        """apply() for an AsyncSession."""
+        statement = self.statement()
+        if statement is not None:
+            await session.execute(statement)
+
+def stats_query(user_id: str, weeks: int, today: date):
+    """The counter rows build_stats needs: statuses, the last `weeks` weeks and due days up to today."""
+    week_keys = {week_key(today - timedelta(weeks=i)) for i in range(weeks)}
+    keys = [f"status:{s.value}" for s in TaskStatus]
+    keys += [f"{kind}:{week}" for week in week_keys for kind in ("created", "completed")]
+    return select(TaskCounter.key, TaskCounter.count).where(
+        TaskCounter.user_id == user_id,
+        or_(
+            TaskCounter.key.in_(keys),
+            and_(TaskCounter.key > "due:", TaskCounter.key <= f"due:{today.isoformat()}"),
+        ),
+    )
+
+def status_counters(session: Session, user_id: str, pending: Optional[StatsDelta] = None) -> Dict[str, int]:
+    """A user's tasks per status, read from their status counters, plus the `pending` changes of the current transaction."""
+    keys = [f"status:{s.value}" for s in TaskStatus]
+    counts = Counter(dict(session.exec(
+        select(TaskCounter.key, TaskCounter.count).where(TaskCounter.user_id == user_id, TaskCounter.key.in_(keys))
+    ).all()))
+    if pending is not None:
+        counts.update(pending.pending(user_id))
+    return {s.value: counts[f"status:{s.value}"] for s in TaskStatus}
+
+def build_stats(rows: Iterable, weeks: int, today: date) -> TaskStats:
+    counts = {key: count for key, count in rows if count}
+    by_status = {s.value: counts.get(f"status:{s.value}", 0) for s in TaskStatus}
+    today_key = f"due:{today.isoformat()}"
+    history = []
+    for i in range(weeks - 1, -1, -1):
+        week = week_key(today - timedelta(weeks=i))
+        created, completed = counts.get(f"created:{week}", 0), counts.get(f"completed:{week}", 0)
+        history.append({
+            "week": week,
+            "created": created,
+            "completed": completed,
+            # Tasks completed that week per task created that week.
+            "completion_rate": round(completed / created, 3) if created else None,
+        })
+    return TaskStats(
+        by_status=by_status,
+        total=sum(by_status.values()),
+        overdue=sum(count for key, count in counts.items() if key.startswith("due:") and key < today_key),
+        due_today=counts.get(today_key, 0),
+        weeks=history,
+    )
+
+def rebuild_user(session: Session, user_id: str) -> bool:
+    """Recomputes one user's counters from their tasks and commits. Returns True if they had drifted."""
+    # Lock the user's counters first: writes that touch them wait for this
+    # commit and then apply on top of the rebuilt values.
+    current = dict(session.exec(
+        select(TaskCounter.key, TaskCounter.count).where(TaskCounter.user_id == user_id).with_for_update()
+    ).all())
+    expected = Counter()
+    tasks = session.exec(
+        select(Task.status, Task.due_date, Task.created_at, Task.completed_at).where(Task.user_id == user_id)
+    )
+    for row in tasks:
+        expected.update(contributions(*row))
+
+    drifted = {k: v for k, v in current.items() if v} != dict(expected)
+    if drifted or len(current) != len(expected):
+        # Also drops zeroed rows (past due days whose tasks were completed).
+        session.execute(delete(TaskCounter).where(TaskCounter.user_id == user_id))
+        if expected:
+            session.execute(insert(TaskCounter), [
+                {"user_id": user_id, "key": key, "count": count} for key, count in sorted(expected.items())
+            ])
+    session.commit()
+    return drifted
+
+def user_ids_after(session: Session, after: str, limit: int) -> List[str]:
+    """One page of distinct task owners (walks the leading user_id of ix_task_user_created)."""
+    return session.exec(
+        select(Task.user_id).where(Task.user_id > after).group_by(Task.user_id).order_by(Task.user_id).limit(limit)
+    ).all()
+
+class StatsRebuilder:
+    """
+    Background worker that rebuilds every user's counters every `interval`
+    seconds, one transaction per user, and counts the users whose counters
+    had drifted. Also drops counters of users who no longer have tasks.
+    """
+
+    def __init__(self, interval: float = STATS_REBUILD_INTERVAL_S, batch_size: int = STATS_REBUILD_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, object] = {"runs": 0, "users": 0, "drifted_users": 0, "failed_users": 0, "last_run": None}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running or self.interval <= 0:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="stats-rebuilder", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        if not self._thread:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def rebuild_all(self) -> int:
+        """One full pass. Returns the number of users whose counters had drifted."""
+        users = drifted = failed = 0
+        after = ""
+        while not self._stopping.is_set():
+            with new_session() as session:
+                page = user_ids_after(session, after, self.batch_size)
+                for user_id in page:
+                    try:
+                        drifted += rebuild_user(session, user_id)
+                    except Exception as e:
+                        # Retried on the next pass.
+                        session.rollback()
+                        failed += 1
+                        logger.warning("Stats rebuild failed for user %s: %s", user_id, e)
+            users += len(page)
+            if len(page) < self.batch_size:
+                break
+            after = page[-1]
+        with new_session() as session:
+            session.execute(delete(TaskCounter).where(TaskCounter.user_id.not_in(select(Task.user_id).distinct())))
+            session.commit()
+        if drifted:
+            logger.warning("Stats rebuild corrected the counters of %d users", drifted)
+        with self._stats_lock:
+            self._stats["runs"] += 1
+            self._stats["users"] += users
+            self._stats["drifted_users"] += drifted
+            self._stats["failed_users"] += failed
+            self._stats["last_run"] = datetime.now(timezone.utc).isoformat()
+        return drifted
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.rebuild_all()
+            except Exception as e:
+                logger.error("Stats rebuild pass failed: %s", e)
+
+    def metrics(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["running"] = self.running
+        return stats
+
+stats_rebuilder = StatsRebuilder()
+
+def init_stats(engine: Engine):
+    """
+    Backfills completed_at for tasks completed before the column existed
+    (their last update is the best estimate left), then builds the counters
+    once for a database whose tasks predate the counters table.
+    """
+    with Session(engine) as session:
+        session.execute(
+            update(Task)
+            .where(Task.status == TaskStatus.COMPLETED, Task.completed_at.is_(None))
+            .values(completed_at=Task.updated_at)
+        )
+        session.commit()
+        has_counters = session.exec(select(TaskCounter.user_id).limit(1)).first() is not None
+        has_tasks = session.exec(select(Task.id).limit(1)).first() is not None
+    if has_tasks and not has_counters:
+        started = time.perf_counter()
+        stats_rebuilder.rebuild_all()
+        logger.info("Built task statistics counters in %.1fs", time.perf_counter() - started)
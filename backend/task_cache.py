@@ -0,0 +1,232 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from pydantic import TypeAdapter
+
+from models import Task, TaskStatus
+
+# Dapr Import
+try:
+    from dapr.clients import DaprClient
+    DAPR_AVAILABLE = True
+except ImportError:
+    DAPR_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Read-through cache of serialized task lists, keyed by (user_id, status).
+# GET /api/tasks (unfiltered) reads through it; every write path, including
+# the MCP tools, invalidates the user's entries after commit.
+#
+# TASK_CACHE_BACKEND: "memory" (per process, default), "dapr" (a Dapr state
+# store shared by all replicas) or "none".
+TASK_CACHE_BACKEND = os.environ.get("TASK_CACHE_BACKEND", "memory")
+TASK_CACHE_SIZE = int(os.environ.get("TASK_CACHE_SIZE", "10000"))
+# Safety net for writes that bypass the API (e.g. manual SQL).
+TASK_CACHE_TTL_S = int(os.environ.get("TASK_CACHE_TTL_S", "60"))
+TASK_CACHE_STATE_STORE = os.environ.get("TASK_CACHE_STATE_STORE", "statestore")
+
+task_list_adapter = TypeAdapter(List[Task])
+
+class CachedTaskList(NamedTuple):
+    etag: str
+    body: bytes # JSON array, exactly what GET /api/tasks returns
+
+    def encode(self) -> bytes:
+        return self.etag.encode() + b"\n" + self.body
+
+    @classmethod
+    def decode(cls, raw: bytes) -> "CachedTaskList":
+        etag, body = raw.split(b"\n", 1)
+        return cls(etag.decode(), body)
+
+    @classmethod
+    def from_tasks(cls, tasks: List[Task]) -> "CachedTaskList":
+        body = task_list_adapter.dump_json(tasks)
+        return cls('"' + hashlib.sha256(body).hexdigest()[:32] + '"', body)
+
+class MemoryBackend:
+    """Bounded LRU with per-entry expiry, local to this process."""
+
+    def __init__(self, max_size: int = TASK_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: int):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys: Iterable[str]):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+class DaprStateBackend:
+    """Dapr state store, so all backend replicas share entries and invalidations."""
+
+    def __init__(self, store_name: str = TASK_CACHE_STATE_STORE):
+        self.store_name = store_name
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = DaprClient()
+        return self._client
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._get_client().get_state(self.store_name, key).data or None
+
+    def set(self, key: str, value: bytes, ttl: int):
+        self._get_client().save_state(self.store_name, key, value, state_metadata={"ttlInSeconds": str(ttl)})
+
+    def delete(self, keys: Iterable[str]):
+        for key in keys:
+            self._get_client().delete_state(self.store_name, key)
+
+class NullBackend:
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes, ttl: int):
+        pass
+
+    def delete(self, keys: Iterable[str]):
+        pass
+
+# Every status filter a list can be cached under (None = all tasks).
+STATUS_KEYS = (None,) + tuple(s.value for s in TaskStatus)
+
+class TaskListCache:
+    def __init__(self, backend, ttl: int = TASK_CACHE_TTL_S):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        # Bumped on every invalidation. A load that started before a write
+        # finished must not store its (stale) result after the invalidation.
+        # Only users with a load in flight are tracked (with the number of
+        # their loads), so both maps stay as small as the concurrent loads.
+        self._generations: Dict[str, int] = {}
+        self._loads: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(user_id: str, status: Optional[str]) -> str:
+        return f"tasks:{user_id}:{status or 'all'}"
+
+    def get_or_load(self, user_id: str, status: Optional[str], loader: Callable[[], List[Task]]) -> CachedTaskList:
+        """Returns the cached list for (user_id, status), loading and storing it on a miss."""
+        key = self.key(user_id, status)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        generation = self._start_load(user_id)
+        try:
+            entry = CachedTaskList.from_tasks(loader())
+            self._store(user_id, key, generation, entry)
+        finally:
+            self._end_load(user_id)
+        return entry
+
+    async def aget_or_load(self, user_id: str, status: Optional[str], loader: Callable[[], Awaitable[List[Task]]]) -> CachedTaskList:
+        """get_or_load for the async routes: `loader` is awaited."""
+        key = self.key(user_id, status)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        generation = self._start_load(user_id)
+        try:
+            entry = CachedTaskList.from_tasks(await loader())
+            self._store(user_id, key, generation, entry)
+        finally:
+            self._end_load(user_id)
+        return entry
+
+    def _start_load(self, user_id: str) -> int:
+        with self._lock:
+            self._loads[user_id] = self._loads.get(user_id, 0) + 1
+            return self._generations.setdefault(user_id, 0)
+
+    def _end_load(self, user_id: str):
+        with self._lock:
+            self._loads[user_id] -= 1
+            if not self._loads[user_id]:
+                del self._loads[user_id]
+                del self._generations[user_id]
+
+    def _lookup(self, key: str) -> Optional[CachedTaskList]:
+        try:
+            raw = self.backend.get(key)
+        except Exception as e:
+            # The cache must never fail a read; fall through to the DB.
+            self.errors += 1
+            logger.warning(f"Task cache get failed for {key}: {e}")
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return CachedTaskList.decode(raw)
+
+    def _store(self, user_id: str, key: str, generation: int, entry: CachedTaskList):
+        with self._lock:
+            if self._generations[user_id] != generation:
+                return # invalidated while loading
+            try:
+                self.backend.set(key, entry.encode(), self.ttl)
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Task cache set failed for {key}: {e}")
+
+    def invalidate(self, user_id: str, statuses: Optional[Iterable[Optional[str]]] = None):
+        """
+        Drops the user's cached lists. Pass the statuses touched by the write
+        (old and new) to keep the other filters cached; the unfiltered list
+        is always dropped.
+        """
+        keys = STATUS_KEYS if statuses is None else {None, *(getattr(s, "value", s) for s in statuses)}
+        with self._lock:
+            if user_id in self._generations:
+                self._generations[user_id] += 1
+            try:
+                self.backend.delete([self.key(user_id, status) for status in keys])
+            except Exception as e:
+                # Entries still expire after TASK_CACHE_TTL_S.
+                self.errors += 1
+                logger.warning(f"Task cache invalidation failed for user {user_id}: {e}")
+
+    def metrics(self) -> dict:
+        return {"backend": type(self.backend).__name__, "hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+def create_backend(name: str = TASK_CACHE_BACKEND):
+    if name == "dapr" and DAPR_AVAILABLE:
+        return DaprStateBackend()
+    if name == "none":
+        return NullBackend()
+    if name != "memory":
+        logger.warning(f"Task cache backend '{name}' unavailable, using memory")
+    return MemoryBackend()
+
+task_cache = TaskListCache(create_backend())
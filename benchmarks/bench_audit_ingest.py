@@ -0,0 +1,89 @@
+"""
+Benchmark: audit-service ingestion throughput.
+
+A fake publisher posts task-events CloudEvents straight into the audit
+service's subscriber route (in-process ASGI, no Dapr sidecar) with a fixed
+number of concurrent deliveries, like a Kafka consumer with parallelism.
+Runs once with AUDIT_BATCH_SIZE=1 (one INSERT + commit per event, the old
+behaviour) and once batched, then replays the same events to check that
+redeliveries are deduplicated.
+
+    python benchmarks/bench_audit_ingest.py [num_events] [concurrency]
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_audit.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+sys.path.insert(0, os.path.join(ROOT, "audit-service"))
+spec = importlib.util.spec_from_file_location("audit_main", os.path.join(ROOT, "audit-service", "main.py"))
+audit = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(audit)
+audit.logger.setLevel("WARNING")
+logging.getLogger("httpx").setLevel("WARNING")
+
+ROUTE = "/events/kafka-pubsub/task-events"
+
+def fake_events(n: int):
+    for i in range(n):
+        yield {
+            "id": str(uuid.uuid4()),
+            "type": "com.dapr.event.sent",
+            "data": {
+                "event_id": str(uuid.uuid4()),
+                "event_type": "updated",
+                "task_id": i,
+                "user_id": f"user-{i % 50}",
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "data": {"id": i, "title": f"Task {i}", "status": "pending"},
+            },
+        }
+
+async def publish(events, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=audit.app)
+    sem = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://audit") as client:
+        async def deliver(event):
+            async with sem:
+                r = await client.post(ROUTE, json=event)
+                assert r.json()["status"] == "SUCCESS", r.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(deliver(e) for e in events))
+        return time.perf_counter() - start
+
+def count_rows() -> int:
+    with audit.engine.connect() as conn:
+        return sum(
+            conn.exec_driver_sql(f"SELECT COUNT(*) FROM {table}").scalar()
+            for table in audit.store.partitions().values()
+        )
+
+def main():
+    num_events = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    audit.store.ensure_schema()
+
+    for label, batch_size in (("before (1 row/commit)", 1), ("after (batched)", audit.AUDIT_BATCH_SIZE)):
+        audit.batcher.batch_size = batch_size
+        events = list(fake_events(num_events))
+        elapsed = asyncio.run(publish(events, concurrency))
+        print(f"{label:>22}: {num_events / elapsed:10.0f} events/s ({elapsed:.2f}s)")
+
+    rows_before = count_rows()
+    asyncio.run(publish(events, concurrency))
+    print(f"redelivered {num_events} events: {count_rows() - rows_before} duplicate rows")
+
+if __name__ == "__main__":
+    main()
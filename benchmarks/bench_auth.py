@@ -0,0 +1,74 @@
+"""
+Benchmark: requests/s on an authenticated endpoint.
+
+Sends NUM_REQUESTS requests (spread over NUM_TOKENS distinct users) to a
+minimal endpoint that only depends on get_current_user_id, in-process over
+ASGI, for each JWT backend with the verified-token cache off and on.
+Also times the dependency alone, without the HTTP stack.
+
+    python benchmarks/bench_auth.py [num_requests] [num_tokens]
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+import warnings
+
+import httpx
+from fastapi import Depends, FastAPI
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwt
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+import auth  # noqa: E402
+
+NUM_REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+NUM_TOKENS = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+logging.getLogger().setLevel(logging.WARNING)
+warnings.simplefilter("ignore") # PyJWT warns about the short dev secret on every decode
+
+app = FastAPI()
+
+@app.get("/me")
+def me(user_id: str = Depends(auth.get_current_user_id)):
+    return {"user_id": user_id}
+
+exp = int(time.time()) + 3600
+TOKENS = [jwt.encode({"sub": f"user-{i}", "exp": exp}, auth.BETTER_AUTH_SECRET, algorithm=auth.ALGORITHM) for i in range(NUM_TOKENS)]
+
+def configure(backend: str, cache_size: int):
+    auth.decoder = auth.DECODERS[backend]
+    auth.token_cache = auth.TokenCache(max_size=cache_size)
+
+async def http_rps() -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        t0 = time.perf_counter()
+        for i in range(NUM_REQUESTS):
+            r = await client.get("/me", headers={"Authorization": f"Bearer {TOKENS[i % NUM_TOKENS]}"})
+            assert r.status_code == 200
+        return NUM_REQUESTS / (time.perf_counter() - t0)
+
+def dependency_us() -> float:
+    creds = [HTTPAuthorizationCredentials(scheme="Bearer", credentials=t) for t in TOKENS]
+    t0 = time.perf_counter()
+    for i in range(NUM_REQUESTS):
+        auth.get_current_user_id(creds[i % NUM_TOKENS])
+    return (time.perf_counter() - t0) / NUM_REQUESTS * 1e6
+
+def main():
+    print(f"{NUM_REQUESTS} requests over {NUM_TOKENS} tokens")
+    for backend in auth.DECODERS:
+        for cache_size in (0, auth.AUTH_CACHE_SIZE):
+            configure(backend, cache_size)
+            rps = asyncio.run(http_rps())
+            configure(backend, cache_size)
+            per_call = dependency_us()
+            label = f"{backend}, cache {'on' if cache_size else 'off'}"
+            print(f"  {label:16s} {rps:8.0f} req/s   dependency {per_call:6.1f}us/call")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark: concurrent chat throughput, blocking vs async agent.
+
+Starts the local fake OpenAI-compatible server from fake_openai.py (fixed
+latency per completion; the first call of a turn asks for two tool calls,
+the second answers) and points the agent at it. The same load is sent to
+two in-process endpoints: one calling the blocking run_agent from an async
+handler (the old chat_endpoint) and one awaiting run_agent_async.
+
+    python benchmarks/bench_chat_concurrency.py [num_requests] [concurrency] [llm_latency_ms]
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+
+import fake_openai
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_chat.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+NUM_REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+CONCURRENCY = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+LLM_LATENCY = (int(sys.argv[3]) if len(sys.argv) > 3 else 200) / 1000
+
+os.environ["OPENAI_BASE_URL"] = fake_openai.start(fake_openai.create_app(latency=LLM_LATENCY, token_interval=0))
+os.environ["OPENAI_API_KEY"] = "fake"
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+import db  # noqa: E402
+from backend.ai.agent import run_agent, run_agent_async  # noqa: E402
+
+db.engine.echo = False
+logging.getLogger().setLevel(logging.WARNING)
+db.init_db()
+
+app = FastAPI()
+
+@app.post("/blocking")
+async def blocking_chat():
+    return run_agent("bench", "What's pending and what's done?")
+
+@app.post("/async")
+async def async_chat():
+    return await run_agent_async("bench", "What's pending and what's done?")
+
+async def ticker(stop: asyncio.Event, lags: list):
+    """Sleeps 10ms at a time and records how late it wakes up (event-loop stalls)."""
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - t0 - 0.01)
+
+async def load(path: str):
+    transport = httpx.ASGITransport(app=app)
+    sem = asyncio.Semaphore(CONCURRENCY)
+    stop, lags = asyncio.Event(), []
+    tick = asyncio.create_task(ticker(stop, lags))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one():
+            async with sem:
+                r = await client.post(path)
+                r.raise_for_status()
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(NUM_REQUESTS)))
+        elapsed = time.perf_counter() - t0
+    stop.set()
+    await tick
+    return elapsed, lags
+
+def main():
+    print(f"{NUM_REQUESTS} chats, concurrency {CONCURRENCY}, fake LLM latency {LLM_LATENCY * 1000:.0f}ms (2 completions + 2 tool calls per chat)")
+    for label, path in (("blocking run_agent", "/blocking"), ("run_agent_async", "/async")):
+        elapsed, lags = asyncio.run(load(path))
+        print(f"  {label:20s} {NUM_REQUESTS / elapsed:7.1f} chats/s   longest event loop stall {max(lags) * 1000:6.0f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark: local response cache for the chat agent.
+
+Starts the fake OpenAI-compatible server from fake_openai.py (which reports
+token usage) and sends NUM_TURNS questions, each opening a new conversation,
+from a few users picking from a handful of common questions. Runs them with
+the response cache off and on and reports completions sent to the LLM, mean
+turn time, and the cache's hit rate and tokens saved.
+
+    python benchmarks/bench_chat_prompt_cache.py [num_turns] [llm_latency_ms]
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+import fake_openai
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_prompt_cache.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+NUM_TURNS = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+LLM_LATENCY = (int(sys.argv[2]) if len(sys.argv) > 2 else 200) / 1000
+USERS = ["alice", "bob", "carol"]
+QUESTIONS = ["What's pending?", "What did I finish?", "What's pending? ", "Anything due today?", "Show my tasks"]
+
+fake = fake_openai.create_app(latency=LLM_LATENCY, token_interval=0, tool_statuses=("pending",))
+os.environ["OPENAI_BASE_URL"] = fake_openai.start(fake)
+os.environ["OPENAI_API_KEY"] = "fake"
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+import db  # noqa: E402
+from backend.ai.agent import run_agent_async  # noqa: E402
+from backend.ai.prompt_cache import ResponseCache  # noqa: E402
+import backend.ai.agent as agent  # noqa: E402
+
+db.engine.echo = False
+logging.getLogger().setLevel(logging.WARNING)
+db.init_db()
+
+async def run_modes():
+    rng = random.Random(1)
+    turns = [(rng.choice(USERS), rng.choice(QUESTIONS)) for _ in range(NUM_TURNS)]
+    for label, size in (("no response cache", 0), ("response cache", 1000)):
+        agent.response_cache = ResponseCache(max_size=size)
+        before = fake.state.completions
+        t0 = time.perf_counter()
+        for user_id, question in turns:
+            await run_agent_async(user_id, question)
+        elapsed = time.perf_counter() - t0
+        m = agent.response_cache.metrics()
+        print(f"  {label:18s} {fake.state.completions - before:4d} completions   {elapsed / NUM_TURNS * 1000:5.0f}ms/turn"
+              f"   hit rate {m['hit_rate'] or 0:.0%}   tokens sent {m['prompt_tokens']}   tokens saved {m['tokens_saved']}")
+
+def main():
+    print(f"{NUM_TURNS} turns (new conversation each), {len(USERS)} users, {len(QUESTIONS)} questions, fake LLM latency {LLM_LATENCY * 1000:.0f}ms")
+    asyncio.run(run_modes())
+
+if __name__ == "__main__":
+    main()
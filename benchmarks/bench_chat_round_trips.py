@@ -0,0 +1,84 @@
+"""
+Benchmark: LLM round trips per chat turn.
+
+Starts the fake OpenAI-compatible server from fake_openai.py with a plan
+that maps each message to one tool call (add_task, complete_task or
+list_tasks) and runs the same sequence of turns through run_agent_async in
+three modes:
+
+- every tool turn phrased by a second completion (before)
+- terminal tools (add/complete/delete/update) answered with their result
+- the same plus the intent cache, for a user who repeats their requests
+
+Reports completions per turn (counted by the fake server) and mean turn time.
+
+    python benchmarks/bench_chat_round_trips.py [num_turns] [llm_latency_ms]
+"""
+import asyncio
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+
+import fake_openai
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_round_trips.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+NUM_TURNS = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+LLM_LATENCY = (int(sys.argv[2]) if len(sys.argv) > 2 else 200) / 1000
+
+MESSAGES = ["Add a task: buy milk", "Complete task 1", "What's pending?", "Add a task: call the bank", "Complete task 2"]
+
+def plan(message: str) -> list:
+    if message.startswith("Add a task: "):
+        return [("add_task", {"title": message[len("Add a task: "):]})]
+    match = re.match(r"Complete task (\d+)", message)
+    if match:
+        return [("complete_task", {"task_id": int(match.group(1))})]
+    return [("list_tasks", {"status": "pending"})]
+
+fake = fake_openai.create_app(latency=LLM_LATENCY, token_interval=0, plan=plan)
+os.environ["OPENAI_BASE_URL"] = fake_openai.start(fake)
+os.environ["OPENAI_API_KEY"] = "fake"
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+import db  # noqa: E402
+from backend.ai import tools  # noqa: E402
+from backend.ai.agent import run_agent_async  # noqa: E402
+
+db.engine.echo = False
+logging.getLogger().setLevel(logging.WARNING)
+db.init_db()
+
+async def turns(user_id: str) -> float:
+    t0 = time.perf_counter()
+    for i in range(NUM_TURNS):
+        await run_agent_async(user_id, MESSAGES[i % len(MESSAGES)])
+    return time.perf_counter() - t0
+
+async def run_modes():
+    modes = (
+        ("second completion every turn", False, 0),
+        ("terminal replies", True, 0),
+        ("terminal replies + intent cache", True, 1000),
+    )
+    for i, (label, terminal, cache_size) in enumerate(modes):
+        tools.TERMINAL_REPLIES = terminal
+        tools.intent_cache.max_size = cache_size
+        before = fake.state.completions
+        elapsed = await turns(f"bench-{i}")
+        completions = fake.state.completions - before
+        print(f"  {label:32s} {completions / NUM_TURNS:5.2f} completions/turn   {elapsed / NUM_TURNS * 1000:6.0f}ms/turn")
+
+def main():
+    print(f"{NUM_TURNS} turns, fake LLM latency {LLM_LATENCY * 1000:.0f}ms, {len(MESSAGES)} distinct messages")
+    # One event loop: the agent's AsyncOpenAI client keeps its connections.
+    asyncio.run(run_modes())
+
+if __name__ == "__main__":
+    main()
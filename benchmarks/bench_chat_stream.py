@@ -0,0 +1,105 @@
+"""
+Benchmark: time-to-first-byte of the chat endpoint, buffered vs SSE stream.
+
+Both endpoints are served over real HTTP (uvicorn) against the local fake
+OpenAI-compatible server from fake_openai.py, which streams its answer one
+word at a time. The buffered endpoint's first byte is its whole response;
+the streaming endpoint sends tool progress and tokens as they arrive.
+Also checks that each streamed turn persisted its assistant Message.
+
+    python benchmarks/bench_chat_stream.py [num_requests] [llm_latency_ms] [token_interval_ms]
+"""
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, func, select
+
+import fake_openai
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_chat_stream.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+NUM_REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+LLM_LATENCY = (int(sys.argv[2]) if len(sys.argv) > 2 else 200) / 1000
+TOKEN_INTERVAL = (int(sys.argv[3]) if len(sys.argv) > 3 else 20) / 1000
+
+os.environ["OPENAI_BASE_URL"] = fake_openai.start(fake_openai.create_app(latency=LLM_LATENCY, token_interval=TOKEN_INTERVAL))
+os.environ["OPENAI_API_KEY"] = "fake"
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+import db  # noqa: E402
+from models import Message  # noqa: E402
+from backend.ai.agent import run_agent_async  # noqa: E402
+from backend.ai.streaming import stream_chat, stream_metrics  # noqa: E402
+
+db.engine.echo = False
+logging.getLogger().setLevel(logging.WARNING)
+db.init_db()
+
+# Same handlers as backend/main.py, without the Dapr lifespan.
+app = FastAPI()
+
+@app.post("/chat")
+async def chat():
+    return await run_agent_async("bench", "What's pending and what's done?")
+
+@app.post("/chat/stream")
+async def chat_stream():
+    return StreamingResponse(stream_chat("bench", "What's pending and what's done?"), media_type="text/event-stream")
+
+def buffered(client: httpx.Client) -> float:
+    t0 = time.perf_counter()
+    client.post("/chat").raise_for_status()
+    return time.perf_counter() - t0
+
+def streamed(client: httpx.Client):
+    t0 = time.perf_counter()
+    first_event = first_token = None
+    done = None
+    with client.stream("POST", "/chat/stream") as r:
+        event = None
+        for line in r.iter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                if event in ("token", "tool_call") and first_event is None:
+                    first_event = time.perf_counter() - t0
+                if event == "token" and first_token is None:
+                    first_token = time.perf_counter() - t0
+                if event == "done":
+                    done = json.loads(line[len("data: "):])
+    assert done and done["response"], "stream ended without a done event"
+    return first_event, first_token, time.perf_counter() - t0
+
+def ms(samples) -> str:
+    return f"p50 {statistics.median(samples) * 1000:6.0f}ms"
+
+def main():
+    base_url = fake_openai.start(app).rsplit("/v1", 1)[0]
+    print(f"{NUM_REQUESTS} chats each, fake LLM latency {LLM_LATENCY * 1000:.0f}ms, {TOKEN_INTERVAL * 1000:.0f}ms per streamed word")
+    with httpx.Client(base_url=base_url, timeout=None) as client:
+        buffered_times = [buffered(client) for _ in range(NUM_REQUESTS)]
+        streams = [streamed(client) for _ in range(NUM_REQUESTS)]
+
+    print(f"  buffered  first byte (= full response) {ms(buffered_times)}")
+    print(f"  stream    first tool_call/token event  {ms([s[0] for s in streams])}")
+    print(f"  stream    first answer token           {ms([s[1] for s in streams])}")
+    print(f"  stream    complete                     {ms([s[2] for s in streams])}")
+    print(f"  /metrics/chat: {stream_metrics.metrics()}")
+
+    with Session(db.engine) as session:
+        stored = session.exec(select(func.count()).select_from(Message).where(Message.role == "assistant")).one()
+    print(f"  assistant messages persisted: {stored} (expected {2 * NUM_REQUESTS})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark: memory per task in the Phase I storage engines.
+
+Fills a storage with N tasks (titles like "Task 123", every other one with
+a description, a quarter completed) and reports the bytes allocated per
+task, traced with tracemalloc, for:
+
+- InMemoryStorage with the previous Task dataclass (per-instance __dict__,
+  a datetime per task)
+- InMemoryStorage with the slotted Task in src/models.py (epoch seconds)
+- ColumnarStorage (one array or list per field)
+
+    python benchmarks/bench_cli_memory.py [num_tasks ...]
+"""
+import gc
+import os
+import sys
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import src.storage  # noqa: E402
+from src.models import Task, TaskStatus  # noqa: E402
+from src.storage import ColumnarStorage, InMemoryStorage  # noqa: E402
+
+SIZES = [int(n) for n in sys.argv[1:]] or [100_000, 1_000_000]
+
+@dataclass
+class DictTask:
+    """src/models.py Task before it was slotted."""
+    id: int
+    title: str
+    status: TaskStatus = TaskStatus.PENDING
+    created_at: datetime = field(default_factory=datetime.now)
+    description: Optional[str] = None
+
+def bytes_per_task(storage_class, task_class, n: int) -> float:
+    src.storage.Task = task_class
+    gc.collect()
+    tracemalloc.start()
+    storage = storage_class()
+    for i in range(n):
+        storage.add_task(f"Task {i}", "Some description" if i % 2 else None)
+    for task_id in range(1, n + 1, 4):
+        storage.mark_complete(task_id)
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del storage
+    src.storage.Task = Task
+    return used / n
+
+def main():
+    variants = {
+        "dataclass + datetime": (InMemoryStorage, DictTask),
+        "slotted Task": (InMemoryStorage, Task),
+        "ColumnarStorage": (ColumnarStorage, Task),
+    }
+    for n in SIZES:
+        print(f"{n} tasks")
+        baseline = None
+        for label, (storage_class, task_class) in variants.items():
+            used = bytes_per_task(storage_class, task_class, n)
+            baseline = baseline or used
+            print(f"  {label:22s} {used:6.1f} B/task   ({used / baseline:.0%})")
+
+if __name__ == "__main__":
+    main()
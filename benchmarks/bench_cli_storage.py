@@ -0,0 +1,83 @@
+"""
+Benchmark: Phase I CLI storage, InMemoryStorage vs PersistentStorage.
+
+Builds N tasks (a quarter completed) in memory, writes the same tasks as a
+PersistentStorage snapshot in a temp dir, then times what the CLI does:
+startup (open and first lookup), single-task reads, `list`, `list completed`
+appending new tasks to the log and compacting it.
+
+    python benchmarks/bench_cli_storage.py [num_tasks]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from src.models import TaskStatus  # noqa: E402
+from src.storage import (  # noqa: E402
+    STATUS_CODE, InMemoryStorage, PersistentStorage, TaskSnapshot, encode_line, task_record,
+)
+
+NUM_TASKS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+LOOKUPS = 10_000
+APPENDS = 10_000
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - t0, result
+
+def fill(storage: InMemoryStorage):
+    for i in range(NUM_TASKS):
+        storage.add_task(f"Task {i}", "Some description" if i % 2 else None)
+    for task_id in range(1, NUM_TASKS + 1, 4):
+        storage.mark_complete(task_id)
+
+def report(label: str, seconds: float, per: int = 0):
+    extra = f"   ({seconds / per * 1e6:.2f}µs each)" if per else ""
+    print(f"  {label:34s} {seconds * 1000:9.1f}ms{extra}")
+
+def main():
+    rng = random.Random(1)
+    ids = [rng.randint(1, NUM_TASKS) for _ in range(LOOKUPS)]
+    print(f"{NUM_TASKS} tasks")
+
+    memory = InMemoryStorage()
+    elapsed, _ = timed(lambda: fill(memory))
+    print("InMemoryStorage")
+    report("build (lost on exit)", elapsed)
+    report("list, sorted by ID (before)", timed(lambda: sorted(memory._tasks.values(), key=lambda t: t.id))[0])
+    report("list, insertion order", timed(memory.get_all_tasks)[0])
+    report("list completed (status index)", timed(lambda: memory.get_tasks_by_status(TaskStatus.COMPLETED))[0])
+
+    path = os.path.join(tempfile.mkdtemp(), "tasks.log")
+    # What compaction writes for these tasks.
+    entries = ((t.id, STATUS_CODE[t.status], encode_line(task_record(t))) for t in memory.get_all_tasks())
+    elapsed, _ = timed(lambda: TaskSnapshot.write(path + ".snap", entries, NUM_TASKS + 1))
+    del memory, entries
+    print("PersistentStorage")
+    report("write snapshot (encode every task)", elapsed)
+    print(f"  {'snapshot size':34s} {os.path.getsize(path + '.snap') / 1e6:9.1f}MB")
+
+    elapsed, storage = timed(lambda: PersistentStorage(path))
+    startup, _ = timed(lambda: storage.get_task(1))
+    report("startup (open + first lookup)", elapsed + startup)
+    report("get_task, random", timed(lambda: [storage.get_task(i) for i in ids])[0], LOOKUPS)
+    report("list completed, first", timed(lambda: storage.get_tasks_by_status(TaskStatus.COMPLETED))[0])
+    report("list, first", timed(storage.get_all_tasks)[0])
+    report("list, again", timed(storage.get_all_tasks)[0])
+    report("add_task (log append)", timed(lambda: [storage.add_task("new") for _ in range(APPENDS)])[0], APPENDS)
+    storage.close()
+
+    elapsed, storage = timed(lambda: PersistentStorage(path))
+    startup, _ = timed(lambda: storage.get_task(1))
+    report(f"startup with {APPENDS} log records", elapsed + startup)
+    # Unchanged snapshot lines are copied, not re-encoded.
+    report("compact", timed(storage.compact)[0])
+    storage.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark: notification-service reminder delivery.
+
+A fake publisher posts `reminders` CloudEvents (a burst for many users, a
+few each, like a recurring-task pass) into the notification service's
+subscriber route in-process, against a sender that takes SEND_MS per email
+like an SMTP relay and fails 5% of the time. Both variants respect the
+same provider rate limit (NOTIFY_RATE_PER_S). Compares sending inline in
+the subscriber (one email per reminder, the old behaviour) with the
+delivery pipeline: how fast Dapr gets its acks, how many emails go out,
+and the end-to-end delivery latency.
+
+    python benchmarks/bench_notifications.py [num_reminders] [num_users] [send_ms]
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+
+import httpx
+
+NUM_REMINDERS = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+NUM_USERS = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+SEND_MS = float(sys.argv[3]) if len(sys.argv) > 3 else 20
+CONCURRENCY = 32
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("NOTIFY_COALESCE_WINDOW_MS", "500")
+os.environ.setdefault("NOTIFY_RETRY_BASE_MS", "50")
+
+sys.path.insert(0, os.path.join(ROOT, "notification-service"))
+spec = importlib.util.spec_from_file_location("notification_main", os.path.join(ROOT, "notification-service", "main.py"))
+notification = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(notification)
+import delivery  # noqa: E402
+
+logging.getLogger().setLevel(logging.CRITICAL) # the sender's injected failures log errors
+ROUTE = "/events/kafka-pubsub/reminders"
+
+class SlowSender:
+    """Stand-in SMTP relay: SEND_MS per message, 5% transient failures."""
+
+    def __init__(self):
+        self.sent = 0
+        self.rng = random.Random(1)
+
+    async def send(self, digest):
+        await asyncio.sleep(SEND_MS / 1000)
+        if self.rng.random() < 0.05:
+            raise ConnectionError("relay unavailable")
+        self.sent += 1
+
+def fake_reminders(n: int):
+    for i in range(n):
+        yield {
+            "id": str(uuid.uuid4()),
+            "type": "com.dapr.event.sent",
+            "data": {
+                "event_id": str(uuid.uuid4()),
+                "event_type": "reminder",
+                "task_id": i,
+                "user_id": f"user-{i % NUM_USERS}",
+                "data": {"title": f"Task {i}", "due_date": "2026-01-01T09:00:00+00:00"},
+            },
+        }
+
+async def publish(app, events) -> float:
+    transport = httpx.ASGITransport(app=app)
+    sem = asyncio.Semaphore(CONCURRENCY)
+    async with httpx.AsyncClient(transport=transport, base_url="http://notify") as client:
+        async def deliver(event):
+            async with sem:
+                r = await client.post(ROUTE, json=event)
+                assert r.json()["status"] == "SUCCESS", r.text
+        t0 = time.perf_counter()
+        await asyncio.gather(*(deliver(e) for e in events))
+        return time.perf_counter() - t0
+
+async def inline():
+    """Old behaviour: the subscriber sends one email per reminder before acking."""
+    sender = SlowSender()
+    bucket = delivery.TokenBucket(delivery.NOTIFY_RATE_PER_S, delivery.NOTIFY_BURST)
+    latencies = []
+
+    from fastapi import Body, FastAPI
+    app = FastAPI()
+
+    @app.post(ROUTE)
+    async def subscriber(event=Body()):
+        reminder = delivery.parse_reminder(event)
+        digest = delivery.Digest(reminder.user_id)
+        digest.add(reminder)
+        while True:
+            await bucket.acquire()
+            try:
+                await sender.send(digest)
+                break
+            except ConnectionError:
+                pass
+        # The burst is published at once; later reminders wait in the broker backlog.
+        latencies.append(time.monotonic() - burst_start)
+        return {"status": "SUCCESS"}
+
+    burst_start = time.monotonic()
+    elapsed = await publish(app, list(fake_reminders(NUM_REMINDERS)))
+    latencies.sort()
+    return elapsed, elapsed, sender.sent, latencies[int(len(latencies) * 0.95)] * 1000
+
+async def pipelined():
+    sender = SlowSender()
+    notification.pipeline = pipeline = delivery.DeliveryPipeline(sender=sender)
+    pipeline.start()
+    t0 = time.perf_counter()
+    acked = await publish(notification.app, list(fake_reminders(NUM_REMINDERS)))
+    while pipeline.metrics()["queue_depth"]:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - t0
+    metrics = pipeline.metrics()
+    await pipeline.drain()
+    return acked, elapsed, sender.sent, metrics["latency_ms"]["p95"]
+
+async def main():
+    print(f"{NUM_REMINDERS} reminders for {NUM_USERS} users, {SEND_MS:.0f}ms per send, "
+          f"window {delivery.NOTIFY_COALESCE_WINDOW_MS}ms, {delivery.NOTIFY_RATE_PER_S:.0f} sends/s")
+    for label, run in (("inline send", inline), ("delivery pipeline", pipelined)):
+        acked, elapsed, sent, p95 = await run()
+        print(f"  {label:18s} acks {NUM_REMINDERS / acked:7.0f}/s   all delivered {elapsed:6.2f}s   "
+              f"emails {sent:5d}   p95 latency {p95:7.1f}ms")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""
+Benchmark: task list queries with and without the composite Task indexes.
+
+Seeds a throwaway SQLite database, prints the EXPLAIN QUERY PLAN for the
+queries built by GET /api/tasks and the recurring-task scheduler, and times
+them before and after the indexes exist.
+
+    python benchmarks/bench_task_indexes.py [num_tasks]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_indexes.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from sqlmodel import SQLModel, Session  # noqa: E402
+import db  # noqa: E402
+from models import Task  # noqa: E402
+from routes.tasks import build_task_query  # noqa: E402
+from scheduler import SCHEDULER_BATCH_SIZE, due_templates_query  # noqa: E402
+
+NUM_USERS = 20
+RUNS = 20
+
+def seed(num_tasks: int):
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(num_tasks):
+        rows.append({
+            "user_id": f"user-{i % NUM_USERS}",
+            "title": f"Task {i}",
+            "status": "completed" if i % 4 == 0 else "pending",
+            "created_at": now + timedelta(seconds=i),
+            "updated_at": now + timedelta(seconds=i),
+            "is_recurring": i % 10 == 0,
+            "due_date": now + timedelta(days=i % 365) if i % 3 else None,
+            "next_occurrence": now + timedelta(days=i % 7) if i % 10 == 0 else None,
+        })
+    with Session(db.engine) as session:
+        session.execute(Task.__table__.insert(), rows)
+        session.commit()
+
+def queries():
+    now = datetime.now(timezone.utc)
+    return {
+        "status filter": build_task_query("user-7", status="pending")[0].limit(50),
+        "due window": build_task_query(
+            "user-7", due_after=now, due_before=now + timedelta(days=30), sort="due_date"
+        )[0].limit(50),
+        "newest first": build_task_query("user-7", sort="-created_at")[0].limit(50),
+        "due occurrences": due_templates_query(now + timedelta(days=1), SCHEDULER_BATCH_SIZE),
+    }
+
+def explain(session: Session, query) -> str:
+    compiled = query.compile(db.engine, compile_kwargs={"literal_binds": True})
+    plan = session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").all()
+    return "; ".join(row[-1] for row in plan)
+
+def run(label: str):
+    print(f"\n== {label} ==")
+    with Session(db.engine) as session:
+        for name, query in queries().items():
+            start = time.perf_counter()
+            for _ in range(RUNS):
+                session.exec(query).all()
+            elapsed_ms = (time.perf_counter() - start) / RUNS * 1000
+            print(f"{name:>15}: {elapsed_ms:8.3f} ms  plan: {explain(session, query)}")
+
+def main():
+    num_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    db.engine.echo = False
+    SQLModel.metadata.create_all(db.engine)
+    for index in Task.__table__.indexes:
+        index.drop(db.engine)
+    print(f"Seeding {num_tasks} tasks across {NUM_USERS} users into {DB_PATH}")
+    seed(num_tasks)
+
+    run("without indexes")
+    for index in Task.__table__.indexes:
+        index.create(db.engine)
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    run("with indexes")
+
+if __name__ == "__main__":
+    main()
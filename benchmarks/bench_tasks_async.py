@@ -0,0 +1,106 @@
+"""
+Benchmark: sync (threadpool) vs async (AsyncSession) task routes.
+
+Seeds a temp SQLite DB, then runs the same mixed load against an app built
+from routes/tasks.py and one built from routes/tasks_async.py (what
+DB_ASYNC=true mounts): 70% keyset page reads, 20% single-task reads, 10%
+creates, with a fixed number of requests in flight, in-process over ASGI.
+
+    python benchmarks/bench_tasks_async.py [num_requests] [concurrency] [num_tasks]
+
+Point DATABASE_URL at Postgres to compare psycopg2 against asyncpg instead.
+"""
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_async.db')}"
+os.environ["DB_ASYNC"] = "true"
+# Sync handlers can hold a connection per threadpool thread (40 by default),
+# and session teardown needs a thread too: a smaller pool deadlocks until
+# DB_POOL_TIMEOUT under this load.
+os.environ.setdefault("DB_POOL_SIZE", "20")
+os.environ.setdefault("DB_MAX_OVERFLOW", "30")
+
+NUM_REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+CONCURRENCY = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+NUM_TASKS = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+import db  # noqa: E402
+import events  # noqa: E402
+from auth import get_current_user_id  # noqa: E402
+from models import Task  # noqa: E402
+from routes import tasks, tasks_async  # noqa: E402
+from sqlmodel import Session, select  # noqa: E402
+
+events.DAPR_AVAILABLE = False # no sidecar: measure the DB path only
+logging.getLogger().setLevel(logging.WARNING)
+
+def build_app(*routers) -> FastAPI:
+    app = FastAPI()
+    for router in routers:
+        app.include_router(router)
+    app.dependency_overrides[get_current_user_id] = lambda: "bench"
+    return app
+
+APPS = {
+    "sync (threadpool)": build_app(tasks.router),
+    "async (AsyncSession)": build_app(tasks_async.router, tasks.router),
+}
+
+def seed() -> list:
+    db.init_db()
+    if db.engine.dialect.name == "sqlite":
+        # Readers must not block the writers for either driver.
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    with Session(db.engine) as session:
+        session.add_all(Task(user_id="bench", title=f"task {i}") for i in range(NUM_TASKS))
+        session.commit()
+        return session.exec(select(Task.id)).all()
+
+async def load(app: FastAPI, task_ids: list):
+    rng = random.Random(1)
+    latencies = []
+    sem = asyncio.Semaphore(CONCURRENCY)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            roll = rng.random()
+            async with sem:
+                t0 = time.perf_counter()
+                if roll < 0.7:
+                    r = await client.get("/api/tasks", params={"limit": 20, "sort": "-created_at"})
+                elif roll < 0.9:
+                    r = await client.get(f"/api/tasks/{rng.choice(task_ids)}")
+                else:
+                    r = await client.post("/api/tasks", json={"title": "new"})
+                r.raise_for_status()
+                latencies.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(NUM_REQUESTS)))
+        return time.perf_counter() - t0, latencies
+
+async def main():
+    task_ids = seed()
+    print(f"{NUM_REQUESTS} requests, concurrency {CONCURRENCY}, {NUM_TASKS} tasks, {db.engine.url.get_backend_name()}")
+    for label, app in APPS.items():
+        await load(app, task_ids) # warm-up
+        elapsed, latencies = await load(app, task_ids)
+        latencies.sort()
+        print(f"  {label:22s} {NUM_REQUESTS / elapsed:7.0f} req/s   p50 {statistics.median(latencies) * 1000:6.1f}ms   p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.1f}ms")
+    await db.async_engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+"""
+Local fake OpenAI-compatible server for the chat benchmarks.
+
+POST /v1/chat/completions waits `latency` seconds, then answers. The first
+completion of a turn (last message from the user, tools offered) asks for
+one list_tasks tool call per entry in `tool_statuses` (or the calls
+`plan(user_message)` returns, as (name, arguments) pairs); any other call
+returns a short text reply. `app.state.completions` counts the requests;
+non-streaming replies report estimated token usage. With "stream": true the reply is sent as
+chat.completion.chunk SSE events, one word every `token_interval` seconds.
+"""
+import asyncio
+import json
+import socket
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+REPLY = "You have three pending tasks: buy milk, call the bank and renew the passport. Nothing is completed yet."
+
+def create_app(latency: float = 0.2, token_interval: float = 0.01, tool_statuses=("pending", "completed"), plan=None) -> FastAPI:
+    app = FastAPI()
+    app.state.completions = 0
+
+    def envelope(obj: str, choice: dict) -> dict:
+        return {"id": f"chatcmpl-{uuid.uuid4().hex}", "object": obj, "created": int(time.time()), "model": "fake", "choices": [choice]}
+
+    def tool_calls(user_id: str, message: str) -> list:
+        if plan is not None:
+            return [
+                {"id": f"call_{i}", "type": "function", "function": {"name": name, "arguments": json.dumps({"user_id": user_id, **args})}}
+                for i, (name, args) in enumerate(plan(message))
+            ]
+        return [
+            {"id": f"call_{status}", "type": "function",
+             "function": {"name": "list_tasks", "arguments": json.dumps({"user_id": user_id, "status": status})}}
+            for status in tool_statuses
+        ]
+
+    async def stream(calls: list):
+        if calls:
+            # Name first, arguments in a later delta, like the real API.
+            for i, call in enumerate(calls):
+                head = {"index": i, "id": call["id"], "type": "function", "function": {"name": call["function"]["name"], "arguments": ""}}
+                yield envelope("chat.completion.chunk", {"index": 0, "delta": {"role": "assistant", "tool_calls": [head]}, "finish_reason": None})
+                args = {"index": i, "function": {"arguments": call["function"]["arguments"]}}
+                yield envelope("chat.completion.chunk", {"index": 0, "delta": {"tool_calls": [args]}, "finish_reason": None})
+            yield envelope("chat.completion.chunk", {"index": 0, "delta": {}, "finish_reason": "tool_calls"})
+            return
+        for i, word in enumerate(REPLY.split(" ")):
+            if i:
+                await asyncio.sleep(token_interval)
+            yield envelope("chat.completion.chunk", {"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None})
+        yield envelope("chat.completion.chunk", {"index": 0, "delta": {}, "finish_reason": "stop"})
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.completions += 1
+        await asyncio.sleep(latency)
+        last = body["messages"][-1]
+        wants_tools = bool(body.get("tools")) and last["role"] == "user"
+        calls = tool_calls("bench", last["content"]) if wants_tools and (tool_statuses or plan) else []
+
+        if body.get("stream"):
+            async def sse():
+                async for chunk in stream(calls):
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(sse(), media_type="text/event-stream")
+
+        if calls:
+            message = {"role": "assistant", "content": None, "tool_calls": calls}
+        else:
+            # A non-streaming reply takes as long as streaming all of it would.
+            await asyncio.sleep(token_interval * (len(REPLY.split(" ")) - 1))
+            message = {"role": "assistant", "content": REPLY}
+        response = envelope("chat.completion", {"index": 0, "message": message, "finish_reason": "stop"})
+        # Rough token counts (~4 characters per token), like the real API reports.
+        prompt_tokens = len(json.dumps(body["messages"]) + json.dumps(body.get("tools") or [])) // 4
+        completion_tokens = len(json.dumps(message)) // 4
+        response["usage"] = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        return response
+
+    return app
+
+def start(app: FastAPI) -> str:
+    """Serves `app` on a free local port in a daemon thread; returns the base URL."""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1"
@@ -0,0 +1,289 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import smtplib
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.message import EmailMessage
+from typing import Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Delivery pipeline tuning (env overridable)
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "10000"))      # reminders waiting, all users
+NOTIFY_WORKERS = int(os.getenv("NOTIFY_WORKERS", "8"))
+NOTIFY_COALESCE_WINDOW_MS = int(os.getenv("NOTIFY_COALESCE_WINDOW_MS", "2000"))
+NOTIFY_RATE_PER_S = float(os.getenv("NOTIFY_RATE_PER_S", "50"))       # sends per second
+NOTIFY_BURST = int(os.getenv("NOTIFY_BURST", "100"))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "5"))
+NOTIFY_RETRY_BASE_MS = int(os.getenv("NOTIFY_RETRY_BASE_MS", "500"))
+# "log" (default), "file" (local stand-in: one JSON line per message) or "smtp".
+NOTIFY_SENDER = os.getenv("NOTIFY_SENDER", "log")
+NOTIFY_FILE_PATH = os.getenv("NOTIFY_FILE_PATH", "./outbox.jsonl")
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "25"))
+SMTP_FROM = os.getenv("SMTP_FROM", "todo@localhost")
+# Users are only known by id here; map them to an address.
+NOTIFY_EMAIL_TEMPLATE = os.getenv("NOTIFY_EMAIL_TEMPLATE", "{user_id}@localhost")
+
+class Reminder:
+    __slots__ = ("event_id", "user_id", "task_id", "title", "due_date", "received_at")
+
+    def __init__(self, event_id: Optional[str], user_id: str, task_id, title: str, due_date: Optional[str]):
+        self.event_id = event_id
+        self.user_id = user_id
+        self.task_id = task_id
+        self.title = title
+        self.due_date = due_date
+        self.received_at = time.monotonic()
+
+def parse_reminder(event: dict) -> Reminder:
+    """Maps a reminders CloudEvent (or raw event from backend/scheduler.py) to a Reminder."""
+    data = event.get("data", event)
+    if isinstance(data, str):
+        data = json.loads(data)
+    details = data.get("data") or {}
+    return Reminder(
+        event_id=data.get("event_id") or event.get("id"),
+        user_id=data["user_id"],
+        task_id=data.get("task_id"),
+        title=details.get("title", f"Task {data.get('task_id')}"),
+        due_date=details.get("due_date"),
+    )
+
+class Digest:
+    """All reminders for one recipient that arrived within one coalescing window."""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.reminders: List[Reminder] = []
+        self._event_ids = set()
+        self.attempts = 0
+
+    def add(self, reminder: Reminder) -> bool:
+        # Redelivered events carry the same event_id.
+        if reminder.event_id and reminder.event_id in self._event_ids:
+            return False
+        if reminder.event_id:
+            self._event_ids.add(reminder.event_id)
+        self.reminders.append(reminder)
+        return True
+
+    @property
+    def oldest(self) -> float:
+        return self.reminders[0].received_at
+
+    def subject(self) -> str:
+        if len(self.reminders) == 1:
+            return f"Reminder: {self.reminders[0].title}"
+        return f"{len(self.reminders)} task reminders"
+
+    def body(self) -> str:
+        lines = [f"- {r.title}" + (f" (due {r.due_date})" if r.due_date else "") for r in self.reminders]
+        return "\n".join(lines)
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited = 0.0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+                self.waited += wait
+                await asyncio.sleep(wait)
+
+# Senders: `async send(digest)` raises on failure so the pipeline retries.
+
+class LogSender:
+    async def send(self, digest: Digest):
+        logger.info(f"📧 SENDING EMAIL NOTIFICATION to {digest.user_id}: {digest.subject()}\n{digest.body()}")
+
+class FileSender:
+    """Local stand-in for an email provider: appends each message as a JSON line."""
+
+    def __init__(self, path: str = NOTIFY_FILE_PATH):
+        self.path = path
+
+    def _write(self, line: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    async def send(self, digest: Digest):
+        message = {
+            "to": NOTIFY_EMAIL_TEMPLATE.format(user_id=digest.user_id),
+            "subject": digest.subject(),
+            "body": digest.body(),
+            "reminders": len(digest.reminders),
+            "sent_at": datetime.now(timezone.utc).isoformat(),
+        }
+        await asyncio.to_thread(self._write, json.dumps(message))
+
+class SmtpSender:
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, from_addr: str = SMTP_FROM):
+        self.host = host
+        self.port = port
+        self.from_addr = from_addr
+
+    def _send(self, digest: Digest):
+        message = EmailMessage()
+        message["From"] = self.from_addr
+        message["To"] = NOTIFY_EMAIL_TEMPLATE.format(user_id=digest.user_id)
+        message["Subject"] = digest.subject()
+        message.set_content(digest.body())
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            smtp.send_message(message)
+
+    async def send(self, digest: Digest):
+        await asyncio.to_thread(self._send, digest)
+
+SENDERS = {"log": LogSender, "file": FileSender, "smtp": SmtpSender}
+
+def create_sender(name: str = NOTIFY_SENDER):
+    if name not in SENDERS:
+        logger.warning(f"Unknown sender '{name}', using log")
+    return SENDERS.get(name, LogSender)()
+
+class DeliveryPipeline:
+    """
+    Async reminder delivery.
+
+    submit() only queues: the first reminder for a user opens a digest that
+    collects that user's reminders for `window` seconds, then the digest
+    moves to the ready queue. `workers` tasks take ready digests, wait for
+    a token from the rate limiter and send them, retrying failures with
+    exponential backoff and jitter up to `max_attempts`.
+
+    At most `queue_size` reminders are held; submit() returns False when
+    full so the subscriber can ask Dapr to redeliver later. Held reminders
+    live in memory: drain() flushes them on shutdown, a crash loses them.
+    """
+
+    def __init__(
+        self,
+        sender=None,
+        queue_size: int = NOTIFY_QUEUE_SIZE,
+        workers: int = NOTIFY_WORKERS,
+        window: float = NOTIFY_COALESCE_WINDOW_MS / 1000,
+        rate: float = NOTIFY_RATE_PER_S,
+        burst: int = NOTIFY_BURST,
+        max_attempts: int = NOTIFY_MAX_ATTEMPTS,
+        retry_base: float = NOTIFY_RETRY_BASE_MS / 1000,
+    ):
+        self.sender = sender or create_sender()
+        self.queue_size = queue_size
+        self.workers = workers
+        self.window = window
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.bucket = TokenBucket(rate, burst)
+        self._open: Dict[str, Digest] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._held = 0 # reminders in open digests, ready or being sent
+        self._latencies: Deque[float] = deque(maxlen=1000)
+        self.stats = {
+            "received": 0,
+            "duplicates": 0,
+            "rejected": 0,
+            "digests_sent": 0,
+            "reminders_sent": 0,
+            "retries": 0,
+            "failed_digests": 0,
+        }
+
+    def start(self):
+        self._ready = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, reminder: Reminder) -> bool:
+        """Queues a reminder; False if the pipeline is full."""
+        if self._held >= self.queue_size:
+            self.stats["rejected"] += 1
+            return False
+        self.stats["received"] += 1
+        digest = self._open.get(reminder.user_id)
+        if digest is None:
+            digest = self._open[reminder.user_id] = Digest(reminder.user_id)
+            loop = asyncio.get_running_loop()
+            self._timers[reminder.user_id] = loop.call_later(self.window, self._close, reminder.user_id)
+        if digest.add(reminder):
+            self._held += 1
+        else:
+            self.stats["duplicates"] += 1
+        return True
+
+    def _close(self, user_id: str):
+        self._timers.pop(user_id, None)
+        digest = self._open.pop(user_id, None)
+        if digest is not None:
+            self._ready.put_nowait(digest)
+
+    async def _worker(self):
+        while True:
+            digest = await self._ready.get()
+            try:
+                await self._deliver(digest)
+            finally:
+                self._ready.task_done()
+
+    async def _deliver(self, digest: Digest):
+        while True:
+            await self.bucket.acquire()
+            digest.attempts += 1
+            try:
+                await self.sender.send(digest)
+                break
+            except Exception as e:
+                if digest.attempts >= self.max_attempts:
+                    logger.error(f"Giving up on digest for {digest.user_id} ({len(digest.reminders)} reminders) after {digest.attempts} attempts: {e}")
+                    self.stats["failed_digests"] += 1
+                    self._held -= len(digest.reminders)
+                    return
+                self.stats["retries"] += 1
+                delay = self.retry_base * 2 ** (digest.attempts - 1)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+        self._held -= len(digest.reminders)
+        self.stats["digests_sent"] += 1
+        self.stats["reminders_sent"] += len(digest.reminders)
+        self._latencies.append(time.monotonic() - digest.oldest)
+
+    async def drain(self):
+        """Closes every open digest now and waits until all are delivered (shutdown)."""
+        for user_id, timer in list(self._timers.items()):
+            timer.cancel()
+            self._close(user_id)
+        if self._ready is not None:
+            await self._ready.join()
+        for task in self._tasks:
+            task.cancel()
+
+    def metrics(self) -> dict:
+        ordered = sorted(self._latencies)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1) if ordered else None
+        return {
+            **self.stats,
+            "queue_depth": self._held,
+            "open_digests": len(self._open),
+            "ready_digests": self._ready.qsize() if self._ready else 0,
+            "rate_limit_wait_s": round(self.bucket.waited, 3),
+            "latency_ms": {"p50": pick(0.50), "p95": pick(0.95)},
+        }
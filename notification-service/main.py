@@ -3,12 +3,30 @@ from dapr.ext.fastapi import DaprApp
 from pydantic import BaseModel
 import logging
 
+from delivery import DeliveryPipeline, parse_reminder
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Reminders are coalesced per user, rate limited and sent by a worker pool
+# (see delivery.py); the subscriber only parses and enqueues.
+pipeline = DeliveryPipeline()
+
 app = FastAPI()
 dapr_app = DaprApp(app)
 
+@app.on_event("startup")
+async def on_startup():
+    pipeline.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await pipeline.drain()
+
+@app.get("/metrics/notifications")
+def notification_metrics():
+    return pipeline.metrics()
+
 # Subscribe to 'task-events'
 @dapr_app.subscribe(pubsub='kafka-pubsub', topic='task-events')
 def task_subscriber(event_data = Body()):
@@ -19,10 +37,17 @@ def task_subscriber(event_data = Body()):
 
 # Subscribe to 'reminders'
 @dapr_app.subscribe(pubsub='kafka-pubsub', topic='reminders')
-def reminder_subscriber(event_data = Body()):
-    logger.info(f"Received REMINDER: {event_data}")
-    # Mock sending email
-    print(f"📧 SENDING EMAIL NOTIFICATION: {event_data}")
+async def reminder_subscriber(event_data = Body()):
+    logger.debug(f"Received REMINDER: {event_data}")
+    try:
+        reminder = parse_reminder(event_data)
+    except Exception as e:
+        # Malformed events will never parse; don't ask for redelivery.
+        logger.error(f"Dropping malformed reminder: {e}")
+        return {"status": "DROP"}
+    if not pipeline.submit(reminder):
+        # Queue full: let Dapr redeliver later instead of buffering without bound.
+        return {"status": "RETRY"}
     return {"status": "SUCCESS"}
 
 if __name__ == "__main__":
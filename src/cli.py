@@ -2,12 +2,15 @@ import sys
 import shlex
 from rich.console import Console
 from rich.table import Table
+from typing import Optional
 from src.storage import InMemoryStorage
 from src.models import TaskStatus
 
+SEARCH_PAGE_SIZE = 20
+
 class TodoCLI:
-    def __init__(self):
-        self.storage = InMemoryStorage()
+    def __init__(self, storage: Optional[InMemoryStorage] = None):
+        self.storage = storage if storage is not None else InMemoryStorage()
         self.console = Console()
 
     def start(self):
@@ -28,6 +31,23 @@ class TodoCLI:
             except Exception as e:
                 self.console.print(f"[bold red]Error:[/bold red] {e}")
 
+    def print_tasks(self, tasks, title: str):
+        table = Table(title=title)
+        table.add_column("ID", style="cyan", no_wrap=True)
+        table.add_column("Title", style="magenta")
+        table.add_column("Status", style="green")
+        table.add_column("Description")
+
+        for task in tasks:
+            status_color = "green" if task.status == TaskStatus.COMPLETED else "yellow"
+            table.add_row(
+                str(task.id), 
+                task.title, 
+                f"[{status_color}]{task.status.value}[/{status_color}]", 
+                task.description or ""
+            )
+        self.console.print(table)
+
     def handle_command(self, user_input: str):
         parts = shlex.split(user_input)
         command = parts[0].lower()
@@ -47,26 +67,40 @@ class TodoCLI:
             self.console.print(f"[green]Added task #{task.id}: {task.title}[/green]")
 
         elif command == "list":
-            tasks = self.storage.get_all_tasks()
+            if args:
+                try:
+                    tasks = self.storage.get_tasks_by_status(TaskStatus(args[0].lower()))
+                except ValueError:
+                    self.console.print("[red]Usage: list [pending|completed][/red]")
+                    return
+            else:
+                tasks = self.storage.get_all_tasks()
             if not tasks:
                 self.console.print("[italic]No tasks found.[/italic]")
                 return
-            
-            table = Table(title="Todo List")
-            table.add_column("ID", style="cyan", no_wrap=True)
-            table.add_column("Title", style="magenta")
-            table.add_column("Status", style="green")
-            table.add_column("Description")
+            self.print_tasks(tasks, "Todo List")
 
-            for task in tasks:
-                status_color = "green" if task.status == TaskStatus.COMPLETED else "yellow"
-                table.add_row(
-                    str(task.id), 
-                    task.title, 
-                    f"[{status_color}]{task.status.value}[/{status_color}]", 
-                    task.description or ""
-                )
-            self.console.print(table)
+        elif command == "search":
+            page = 1
+            if len(args) >= 2 and args[-2] == "--page":
+                try:
+                    page = max(1, int(args[-1]))
+                except ValueError:
+                    self.console.print("[red]Invalid page number.[/red]")
+                    return
+                args = args[:-2]
+            if not args:
+                self.console.print("[red]Usage: search <words> [--page N][/red]")
+                return
+            # One extra result tells whether there is a next page.
+            offset = (page - 1) * SEARCH_PAGE_SIZE
+            tasks = self.storage.search(" ".join(args), limit=SEARCH_PAGE_SIZE + 1, offset=offset)
+            if not tasks:
+                self.console.print("[italic]No matching tasks.[/italic]")
+                return
+            self.print_tasks(tasks[:SEARCH_PAGE_SIZE], f"Search results (page {page})")
+            if len(tasks) > SEARCH_PAGE_SIZE:
+                self.console.print(f"More results: add --page {page + 1}")
 
         elif command == "update":
             if len(args) < 1:
@@ -132,7 +166,7 @@ class TodoCLI:
                 self.console.print("[red]Invalid ID format.[/red]")
         
         elif command == "help":
-            self.console.print("Commands: add, list, update, complete, delete, exit")
+            self.console.print("Commands: add, list, search, update, complete, delete, exit")
         
         else:
             self.console.print(f"[red]Unknown command: {command}[/red]")
@@ -5,9 +5,12 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.cli import TodoCLI
+from src.storage import PersistentStorage
 
 def main():
-    cli = TodoCLI()
+    # Keep tasks across runs by pointing TODO_STORAGE_PATH at a log file.
+    path = os.environ.get("TODO_STORAGE_PATH")
+    cli = TodoCLI(PersistentStorage(path) if path else None)
     cli.start()
 
 if __name__ == "__main__":
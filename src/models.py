@@ -1,4 +1,5 @@
-from dataclasses import dataclass, field
+import time
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
 from enum import Enum
@@ -7,10 +8,42 @@ class TaskStatus(str, Enum):
     PENDING = "pending"
     COMPLETED = "completed"
 
-@dataclass
+# Slotted (no per-instance __dict__) and with the creation time kept as epoch
+# seconds rather than a datetime object: a few hundred thousand tasks in
+# memory is a normal load for the storage engines in storage.py.
+@dataclass(slots=True, init=False)
 class Task:
     id: int
     title: str
     status: TaskStatus = TaskStatus.PENDING
-    created_at: datetime = field(default_factory=datetime.now)
+    created_ts: int = 0
     description: Optional[str] = None
+
+    def __init__(
+        self,
+        id: int,
+        title: str,
+        status: TaskStatus = TaskStatus.PENDING,
+        created_at: Optional[datetime] = None,
+        description: Optional[str] = None,
+        *,
+        created_ts: Optional[int] = None,
+    ):
+        # Takes created_at (default: now) like the unslotted Task did; the
+        # storage engines pass the stored epoch seconds as created_ts instead.
+        self.id = id
+        self.title = title
+        self.status = status
+        if created_ts is None:
+            created_ts = int(created_at.timestamp()) if created_at is not None else int(time.time())
+        self.created_ts = created_ts
+        self.description = description
+
+    @property
+    def created_at(self) -> datetime:
+        """Creation time as a naive local datetime."""
+        return datetime.fromtimestamp(self.created_ts)
+
+    @created_at.setter
+    def created_at(self, value: datetime):
+        self.created_ts = int(value.timestamp())
@@ -1,10 +1,102 @@
-from typing import List, Optional, Dict
+import bisect
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import time
+from array import array
+from datetime import datetime
+from typing import Iterable, List, Optional, Dict, Set, Tuple
 from src.models import Task, TaskStatus
 
+def tokenize(text: Optional[str]) -> List[str]:
+    return re.findall(r"\w+", text.lower()) if text else []
+
+class SearchIndex:
+    """
+    Inverted index over task titles and descriptions: token -> {task ID: weight}.
+
+    A title occurrence weighs TITLE_WEIGHT, a description occurrence 1.
+    Every query term must match, as a prefix of some token (found by
+    bisecting the sorted vocabulary); a task scores the sum over terms of
+    its best weight * idf, ties going to the lower ID.
+    """
+
+    TITLE_WEIGHT = 3
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._vocabulary: List[str] = [] # sorted keys of _postings
+        self._documents: Dict[int, Dict[str, int]] = {} # task ID -> its token weights, for remove()
+
+    def add(self, task_id: int, title: str, description: Optional[str]):
+        weights: Dict[str, int] = {}
+        for token in tokenize(title):
+            weights[token] = weights.get(token, 0) + self.TITLE_WEIGHT
+        for token in tokenize(description):
+            weights[token] = weights.get(token, 0) + 1
+        self._documents[task_id] = weights
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                bisect.insort(self._vocabulary, token)
+            postings[task_id] = weight
+
+    def remove(self, task_id: int):
+        for token in self._documents.pop(task_id, ()):
+            postings = self._postings[token]
+            del postings[task_id]
+            if not postings:
+                del self._postings[token]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+
+    def search(self, query: str, limit: Optional[int] = None, offset: int = 0) -> List[int]:
+        """IDs of the matching tasks, best first."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        vocabulary, total = self._vocabulary, len(self._documents)
+        scores: Optional[Dict[int, float]] = None
+        for term in terms:
+            matches: Dict[int, float] = {}
+            i = bisect.bisect_left(vocabulary, term)
+            while i < len(vocabulary) and vocabulary[i].startswith(term):
+                postings = self._postings[vocabulary[i]]
+                idf = math.log(1 + total / len(postings))
+                for task_id, weight in postings.items():
+                    score = weight * idf
+                    if score > matches.get(task_id, 0):
+                        matches[task_id] = score
+                i += 1
+            if scores is None:
+                scores = matches
+            else:
+                scores = {task_id: score + matches[task_id] for task_id, score in scores.items() if task_id in matches}
+            if not scores:
+                return []
+        key = lambda item: (-item[1], item[0])
+        if limit is None:
+            ranked = sorted(scores.items(), key=key)[offset:]
+        else:
+            ranked = heapq.nsmallest(offset + limit, scores.items(), key=key)[offset:]
+        return [task_id for task_id, _ in ranked]
+
 class InMemoryStorage:
     def __init__(self):
         self._tasks: Dict[int, Task] = {}
         self._next_id: int = 1
+        # Secondary index: status -> tasks with that status (dicts keep
+        # insertion order, so they double as ordered sets). A status change
+        # can append a task out of ID order; such an entry is re-sorted once,
+        # on its next read.
+        self._by_status: Dict[TaskStatus, Dict[int, Task]] = {status: {} for status in TaskStatus}
+        self._unsorted: Set[TaskStatus] = set()
+        # Built by the first search, then kept current.
+        self._search_index: Optional[SearchIndex] = None
 
     def add_task(self, title: str, description: Optional[str] = None) -> Task:
         """Creates and stores a new task."""
@@ -15,7 +107,9 @@ class InMemoryStorage:
             status=TaskStatus.PENDING
         )
         self._tasks[self._next_id] = task
+        self._by_status[task.status][task.id] = task
         self._next_id += 1
+        self._reindex(task)
         return task
 
     def get_task(self, task_id: int) -> Optional[Task]:
@@ -24,33 +118,582 @@ class InMemoryStorage:
 
     def get_all_tasks(self) -> List[Task]:
         """Retrieves all tasks, ordered by ID."""
-        return sorted(self._tasks.values(), key=lambda t: t.id)
+        # IDs are assigned in increasing order, so insertion order is ID order.
+        return list(self._tasks.values())
+
+    def get_tasks_by_status(self, status: TaskStatus) -> List[Task]:
+        """Retrieves the tasks with the given status, ordered by ID."""
+        if status in self._unsorted:
+            self._by_status[status] = dict(sorted(self._by_status[status].items()))
+            self._unsorted.discard(status)
+        return list(self._by_status[status].values())
 
     def update_task(self, task_id: int, title: Optional[str] = None, description: Optional[str] = None) -> Optional[Task]:
         """Updates an existing task's title and/or description."""
         task = self.get_task(task_id)
         if not task:
             return None
-        
+
         if title is not None:
             task.title = title
         if description is not None:
             task.description = description
-            
+
+        self._reindex(task)
         return task
 
+    def search(self, query: str, limit: Optional[int] = None, offset: int = 0) -> List[Task]:
+        """Tasks whose title or description contains every word of the query (as a prefix), best match first."""
+        if self._search_index is None:
+            self._search_index = SearchIndex()
+            for task in self.get_all_tasks():
+                self._search_index.add(task.id, task.title, task.description)
+        return [self.get_task(task_id) for task_id in self._search_index.search(query, limit, offset)]
+
+    def _reindex(self, task: Task):
+        if self._search_index is not None:
+            self._search_index.remove(task.id)
+            self._search_index.add(task.id, task.title, task.description)
+
+    def _unindex(self, task_id: int):
+        if self._search_index is not None:
+            self._search_index.remove(task_id)
+
     def mark_complete(self, task_id: int) -> Optional[Task]:
         """Marks a task as complete."""
         task = self.get_task(task_id)
         if not task:
             return None
-        
-        task.status = TaskStatus.COMPLETED
+
+        self._set_status(task, TaskStatus.COMPLETED)
         return task
 
     def delete_task(self, task_id: int) -> bool:
         """Deletes a task by ID. Returns True if deleted, False if not found."""
         if task_id in self._tasks:
-            del self._tasks[task_id]
+            task = self._tasks.pop(task_id)
+            del self._by_status[task.status][task_id]
+            self._unindex(task_id)
             return True
         return False
+
+    def _set_status(self, task: Task, status: TaskStatus):
+        if task.status == status:
+            return
+        del self._by_status[task.status][task.id]
+        task.status = status
+        index = self._by_status[status]
+        if index and next(reversed(index)) > task.id:
+            self._unsorted.add(status)
+        index[task.id] = task
+
+# Status <-> one-byte code, in snapshot files and ColumnarStorage.
+STATUS_CODES = list(TaskStatus)
+STATUS_CODE = {status: code for code, status in enumerate(STATUS_CODES)}
+
+# Status values map back to the TaskStatus members, so every task shares them.
+STATUSES = {status.value: status for status in TaskStatus}
+
+def task_record(task: Task) -> list:
+    return [task.id, task.title, task.description, task.status.value, task.created_ts]
+
+def task_from_record(record: list) -> Task:
+    task_id, title, description, status, created = record
+    if isinstance(created, str):
+        # Older files store creation times as ISO strings.
+        created = int(datetime.fromisoformat(created).timestamp())
+    return Task(task_id, title, STATUSES[status], description=description, created_ts=created)
+
+def encode_line(record: list) -> bytes:
+    # json.dumps escapes newlines inside strings, so one record is one line.
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+def _column(name: str, decode=None, encode=None) -> property:
+    def get(self):
+        value = getattr(self._storage, name)[self._storage._row(self.id)]
+        return decode(value) if decode else value
+
+    def set(self, value):
+        getattr(self._storage, name)[self._storage._row(self.id)] = encode(value) if encode else value
+
+    return property(get, set)
+
+class TaskRow:
+    """Live view of one ColumnarStorage row, with the attributes of Task."""
+
+    __slots__ = ("_storage", "id")
+
+    def __init__(self, storage: "ColumnarStorage", task_id: int):
+        self._storage = storage
+        self.id = task_id
+
+    title = _column("_titles")
+    description = _column("_descriptions")
+    status = _column("_statuses", STATUS_CODES.__getitem__, STATUS_CODE.__getitem__)
+    created_ts = _column("_created")
+
+    @property
+    def created_at(self) -> datetime:
+        return datetime.fromtimestamp(self.created_ts)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, TaskRow) and other._storage is self._storage and other.id == self.id
+
+    def __repr__(self) -> str:
+        return f"TaskRow(id={self.id!r}, title={self.title!r}, status={self.status!r})"
+
+class ColumnarStorage:
+    """
+    InMemoryStorage API over one array or list per field instead of a Task
+    object per task, for large task sets: under a third of the memory.
+
+    Rows are appended in ID order, so a row is found by bisecting the ID
+    column and listing needs no sort. Statuses are one-byte codes and
+    creation times epoch seconds in packed arrays. Deleted rows are
+    tombstoned (title None) and dropped once they are the majority.
+    Methods return TaskRow views that read and write the columns, so a task
+    returned earlier reflects later changes, as with InMemoryStorage.
+    """
+
+    def __init__(self):
+        self._ids = array("q")
+        self._titles: List[Optional[str]] = []
+        self._descriptions: List[Optional[str]] = []
+        self._statuses = bytearray()
+        self._created = array("q")
+        self._deleted = 0
+        self._next_id = 1
+        self._search_index: Optional[SearchIndex] = None
+
+    def _find(self, task_id: int) -> Optional[int]:
+        i = bisect.bisect_left(self._ids, task_id)
+        if i < len(self._ids) and self._ids[i] == task_id and self._titles[i] is not None:
+            return i
+        return None
+
+    def _row(self, task_id: int) -> int:
+        i = self._find(task_id)
+        if i is None:
+            raise LookupError(f"Task {task_id} was deleted")
+        return i
+
+    def add_task(self, title: str, description: Optional[str] = None) -> TaskRow:
+        """Creates and stores a new task."""
+        task_id = self._next_id
+        self._ids.append(task_id)
+        self._titles.append(title)
+        self._descriptions.append(description)
+        self._statuses.append(STATUS_CODE[TaskStatus.PENDING])
+        self._created.append(int(time.time()))
+        self._next_id += 1
+        if self._search_index is not None:
+            self._search_index.add(task_id, title, description)
+        return TaskRow(self, task_id)
+
+    def get_task(self, task_id: int) -> Optional[TaskRow]:
+        """Retrieves a task by ID."""
+        return TaskRow(self, task_id) if self._find(task_id) is not None else None
+
+    def get_all_tasks(self) -> List[TaskRow]:
+        """Retrieves all tasks, ordered by ID."""
+        return [TaskRow(self, task_id) for task_id, title in zip(self._ids, self._titles) if title is not None]
+
+    def get_tasks_by_status(self, status: TaskStatus) -> List[TaskRow]:
+        """Retrieves the tasks with the given status, ordered by ID."""
+        code = STATUS_CODE[status]
+        return [
+            TaskRow(self, task_id)
+            for task_id, title, status_code in zip(self._ids, self._titles, self._statuses)
+            if status_code == code and title is not None
+        ]
+
+    def update_task(self, task_id: int, title: Optional[str] = None, description: Optional[str] = None) -> Optional[TaskRow]:
+        """Updates an existing task's title and/or description."""
+        i = self._find(task_id)
+        if i is None:
+            return None
+        if title is not None:
+            self._titles[i] = title
+        if description is not None:
+            self._descriptions[i] = description
+        if self._search_index is not None:
+            self._search_index.remove(task_id)
+            self._search_index.add(task_id, self._titles[i], self._descriptions[i])
+        return TaskRow(self, task_id)
+
+    def search(self, query: str, limit: Optional[int] = None, offset: int = 0) -> List[TaskRow]:
+        """Tasks whose title or description contains every word of the query (as a prefix), best match first."""
+        if self._search_index is None:
+            self._search_index = SearchIndex()
+            for task_id, title, description in zip(self._ids, self._titles, self._descriptions):
+                if title is not None:
+                    self._search_index.add(task_id, title, description)
+        return [TaskRow(self, task_id) for task_id in self._search_index.search(query, limit, offset)]
+
+    def mark_complete(self, task_id: int) -> Optional[TaskRow]:
+        """Marks a task as complete."""
+        i = self._find(task_id)
+        if i is None:
+            return None
+        self._statuses[i] = STATUS_CODE[TaskStatus.COMPLETED]
+        return TaskRow(self, task_id)
+
+    def delete_task(self, task_id: int) -> bool:
+        """Deletes a task by ID. Returns True if deleted, False if not found."""
+        i = self._find(task_id)
+        if i is None:
+            return False
+        self._titles[i] = None
+        self._descriptions[i] = None
+        self._deleted += 1
+        if self._search_index is not None:
+            self._search_index.remove(task_id)
+        if self._deleted > 1024 and self._deleted * 2 > len(self._ids):
+            self._drop_deleted()
+        return True
+
+    def _drop_deleted(self):
+        keep = [i for i, title in enumerate(self._titles) if title is not None]
+        self._ids = array("q", (self._ids[i] for i in keep))
+        self._titles = [self._titles[i] for i in keep]
+        self._descriptions = [self._descriptions[i] for i in keep]
+        self._statuses = bytearray(self._statuses[i] for i in keep)
+        self._created = array("q", (self._created[i] for i in keep))
+        self._deleted = 0
+
+class TaskSnapshot:
+    """
+    Read-only, memory-mapped file of tasks in ID order, written by compaction.
+
+    Layout: one JSON line per task ([id, title, description, status,
+    created_ts]), then the index (IDs, line offsets and status codes as
+    packed arrays), the status index (the number of tasks per status code,
+    then the positions of each status's tasks) and a fixed-size trailer.
+    Opening reads only the index, and a status's positions are read the first
+    time that status is listed; a task's line is parsed when the task is
+    accessed.
+    """
+
+    TRAILER = struct.Struct("<8sqqq") # magic, task count, index offset, next ID
+    MAGIC = b"TODOSNP2"
+    MAGIC_V1 = b"TODOSNP1" # no status index; built from the status column when needed
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, index_offset, self.next_id = self.TRAILER.unpack_from(self._data, len(self._data) - self.TRAILER.size)
+        if magic not in (self.MAGIC, self.MAGIC_V1):
+            raise ValueError(f"{path} is not a task snapshot")
+        self.ids = array("q", self._data[index_offset:index_offset + 8 * count])
+        offsets_end = index_offset + 8 * (2 * count + 1)
+        self.offsets = array("q", self._data[index_offset + 8 * count:offsets_end])
+        self.statuses = self._data[offsets_end:offsets_end + count]
+        self._status_index = offsets_end + count if magic == self.MAGIC else None
+        self._positions: Dict[int, array] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def position(self, task_id: int) -> Optional[int]:
+        i = bisect.bisect_left(self.ids, task_id)
+        return i if i < len(self.ids) and self.ids[i] == task_id else None
+
+    def line(self, i: int) -> bytes:
+        return self._data[self.offsets[i]:self.offsets[i + 1]]
+
+    def task(self, i: int) -> Task:
+        return task_from_record(json.loads(self.line(i)))
+
+    def tasks(self, positions: Iterable[int]) -> List[Task]:
+        """The tasks at `positions`, parsed with a single json.loads."""
+        lines = [self.line(i) for i in positions]
+        if not lines:
+            return []
+        return [task_from_record(record) for record in json.loads(b"[" + b",".join(lines) + b"]")]
+
+    def positions(self, code: int) -> array:
+        """Positions of the tasks stored with status `code`, in ID order."""
+        if code not in self._positions:
+            if self._status_index is None:
+                self._positions[code] = array("q", (i for i, c in enumerate(self.statuses) if c == code))
+            else:
+                start = self._status_index
+                num_codes = len(STATUS_CODES)
+                counts = array("q", self._data[start:start + 8 * num_codes])
+                start += 8 * (num_codes + sum(counts[:code]))
+                self._positions[code] = array("q", self._data[start:start + 8 * counts[code]])
+        return self._positions[code]
+
+    def close(self):
+        self._data.close()
+        self._file.close()
+
+    @classmethod
+    def write(cls, path: str, entries: Iterable[Tuple[int, int, bytes]], next_id: int):
+        """Writes (task ID, status code, JSON line) entries, in ID order, to a new snapshot."""
+        ids, offsets, statuses = array("q"), array("q"), bytearray()
+        positions = [array("q") for _ in STATUS_CODES]
+        offset = 0
+        with open(path, "wb") as f:
+            for task_id, status_code, line in entries:
+                positions[status_code].append(len(ids))
+                ids.append(task_id)
+                offsets.append(offset)
+                statuses.append(status_code)
+                f.write(line)
+                offset += len(line)
+            offsets.append(offset)
+            f.write(ids.tobytes())
+            f.write(offsets.tobytes())
+            f.write(statuses)
+            f.write(array("q", (len(p) for p in positions)).tobytes())
+            for p in positions:
+                f.write(p.tobytes())
+            f.write(cls.TRAILER.pack(cls.MAGIC, len(ids), offset, next_id))
+            f.flush()
+            os.fsync(f.fileno())
+
+# Snapshot lines parsed per json.loads call when listing.
+SNAPSHOT_PARSE_CHUNK = 4096
+
+class PersistentStorage(InMemoryStorage):
+    """
+    InMemoryStorage that survives restarts: a snapshot plus an append-only log.
+
+    Every change is appended to the log at `path` as one JSON line (flushed;
+    fsynced only with `fsync=True`). `path + ".snap"` is a TaskSnapshot of
+    everything before the log. Nothing is read until the storage is first
+    used, and then only the snapshot index and the log are loaded; snapshot
+    tasks are parsed when accessed. Once the log has more records than
+    `compact_ratio` times the snapshot size (and at least
+    `compact_min_records`), compact() folds it into a new snapshot.
+
+    The inherited _tasks/_by_status hold the tasks created since the
+    snapshot. Snapshot tasks fetched with get_task (so every task that was
+    changed) are kept in _cache, deleted ones in _deleted, and those whose
+    status changed in _moved. Listing reads only the snapshot lines it
+    returns (a status's through the snapshot's status index), parses them
+    in bulk and does not cache them.
+
+    Log records: ["a", id, title, description, status, created_ts],
+    ["u", id, title, description] (null = unchanged), ["c", id], ["d", id].
+    """
+
+    def __init__(self, path: str, fsync: bool = False, compact_min_records: int = 1000, compact_ratio: float = 0.1):
+        super().__init__()
+        self.path = path
+        self.snapshot_path = path + ".snap"
+        self.fsync = fsync
+        self.compact_min_records = compact_min_records
+        self.compact_ratio = compact_ratio
+        self._snapshot: Optional[TaskSnapshot] = None
+        self._cache: Dict[int, Task] = {}
+        self._deleted: Set[int] = set()
+        self._moved: Set[int] = set()
+        self._records = 0
+        self._log = None
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if os.path.exists(self.snapshot_path):
+            self._snapshot = TaskSnapshot(self.snapshot_path)
+            self._next_id = self._snapshot.next_id
+        if os.path.exists(self.path):
+            self._replay()
+        self._log = open(self.path, "ab")
+        self._maybe_compact()
+
+    def _replay(self):
+        with open(self.path, "rb") as f:
+            data = f.read()
+        # A crash mid-append can leave a partial last line; drop it.
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+        if not end:
+            return
+        # The log is not open yet, so the calls below do not append to it.
+        records = json.loads(b"[" + data[:end - 1].replace(b"\n", b",") + b"]")
+        for record in records:
+            op = record[0]
+            if op == "a":
+                self._insert(task_from_record(record[1:]))
+            elif op == "u":
+                self.update_task(record[1], record[2], record[3])
+            elif op == "c":
+                self.mark_complete(record[1])
+            elif op == "d":
+                self.delete_task(record[1])
+        self._records = len(records)
+
+    def _insert(self, task: Task):
+        if self._snapshot is not None and self._snapshot.position(task.id) is not None:
+            # Re-adding a snapshot task: only when a crash cut compaction short.
+            self._cache[task.id] = task
+            self._deleted.discard(task.id)
+            return
+        self._tasks[task.id] = task
+        self._by_status[task.status][task.id] = task
+        self._next_id = max(self._next_id, task.id + 1)
+
+    def _append(self, record: list):
+        if self._log is None:
+            return
+        self._log.write(encode_line(record))
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+        self._records += 1
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        snapshot_size = len(self._snapshot) if self._snapshot is not None else 0
+        if self._records >= max(self.compact_min_records, self.compact_ratio * snapshot_size):
+            self.compact()
+
+    def _snapshot_entries(self) -> Iterable[Tuple[int, int, bytes]]:
+        """Every live task in ID order, copying unchanged snapshot lines as they are."""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            for i, task_id in enumerate(snapshot.ids):
+                task = self._cache.get(task_id)
+                if task is not None:
+                    yield task_id, STATUS_CODE[task.status], encode_line(task_record(task))
+                elif task_id not in self._deleted:
+                    yield task_id, snapshot.statuses[i], snapshot.line(i)
+        for task in self._tasks.values():
+            yield task.id, STATUS_CODE[task.status], encode_line(task_record(task))
+
+    def compact(self):
+        """Writes all live tasks to a new snapshot and empties the log."""
+        self._ensure_loaded()
+        tmp_path = self.snapshot_path + ".tmp"
+        TaskSnapshot.write(tmp_path, self._snapshot_entries(), self._next_id)
+        if self._snapshot is not None:
+            self._snapshot.close()
+        os.replace(tmp_path, self.snapshot_path)
+        # Crashing here replays the old log over the new snapshot, which
+        # already contains its effects; replaying them again is harmless.
+        self._log.close()
+        self._log = open(self.path, "wb")
+        self._snapshot = TaskSnapshot(self.snapshot_path)
+        # Keep handing out the same objects for tasks callers may hold.
+        self._cache.update(self._tasks)
+        self._tasks.clear()
+        for index in self._by_status.values():
+            index.clear()
+        self._unsorted.clear()
+        self._deleted.clear()
+        self._moved.clear()
+        self._records = 0
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+
+    def _snapshot_tasks(self, status: Optional[TaskStatus] = None) -> List[Task]:
+        """Live snapshot tasks (with `status`) in ID order: cached ones as they are, the rest parsed in chunks."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return []
+        if status is None:
+            positions = range(len(snapshot))
+        else:
+            # The snapshot's status index, plus tasks that have moved into this status since.
+            code = STATUS_CODE[status]
+            positions = snapshot.positions(code)
+            moved_in = sorted(
+                snapshot.position(task_id) for task_id in self._moved
+                if getattr(self._cache.get(task_id), "status", None) == status
+            )
+            moved_in = [i for i in moved_in if snapshot.statuses[i] != code]
+            if moved_in:
+                positions = list(heapq.merge(positions, moved_in))
+
+        ids, cache, deleted, tasks = snapshot.ids, self._cache, self._deleted, []
+        for start in range(0, len(positions), SNAPSHOT_PARSE_CHUNK):
+            slots, unparsed = [], []
+            for i in positions[start:start + SNAPSHOT_PARSE_CHUNK]:
+                task = cache.get(ids[i])
+                if task is None:
+                    if ids[i] not in deleted:
+                        slots.append(len(tasks))
+                        unparsed.append(i)
+                        tasks.append(None)
+                elif status is None or task.status == status:
+                    tasks.append(task)
+            for slot, task in zip(slots, snapshot.tasks(unparsed)):
+                tasks[slot] = task
+        return tasks
+
+    def _set_status(self, task: Task, status: TaskStatus):
+        if task.id in self._tasks:
+            super()._set_status(task, status)
+        else:
+            task.status = status
+            self._moved.add(task.id)
+
+    def add_task(self, title: str, description: Optional[str] = None) -> Task:
+        self._ensure_loaded()
+        task = super().add_task(title, description)
+        self._append(["a", *task_record(task)])
+        return task
+
+    def get_task(self, task_id: int) -> Optional[Task]:
+        self._ensure_loaded()
+        task = self._tasks.get(task_id) or self._cache.get(task_id)
+        if task is None and self._snapshot is not None and task_id not in self._deleted:
+            i = self._snapshot.position(task_id)
+            if i is not None:
+                task = self._cache[task_id] = self._snapshot.task(i)
+        return task
+
+    def get_all_tasks(self) -> List[Task]:
+        """
+        Every live task in ID order. Not cached: each call parses every
+        snapshot line it returns again (seconds per call at a million tasks),
+        because keeping the parsed list would hold all tasks in memory, which
+        the lazily read snapshot exists to avoid. get_tasks_by_status reads
+        only the lines of one status.
+        """
+        self._ensure_loaded()
+        # Snapshot IDs all precede the IDs of newer tasks.
+        return self._snapshot_tasks() + super().get_all_tasks()
+
+    def get_tasks_by_status(self, status: TaskStatus) -> List[Task]:
+        self._ensure_loaded()
+        return self._snapshot_tasks(status) + super().get_tasks_by_status(status)
+
+    def update_task(self, task_id: int, title: Optional[str] = None, description: Optional[str] = None) -> Optional[Task]:
+        task = super().update_task(task_id, title, description)
+        if task:
+            self._append(["u", task_id, title, description])
+        return task
+
+    def mark_complete(self, task_id: int) -> Optional[Task]:
+        task = super().mark_complete(task_id)
+        if task:
+            self._append(["c", task_id])
+        return task
+
+    def delete_task(self, task_id: int) -> bool:
+        self._ensure_loaded()
+        if task_id in self._tasks:
+            deleted = super().delete_task(task_id)
+        else:
+            deleted = self.get_task(task_id) is not None
+            if deleted:
+                del self._cache[task_id]
+                self._deleted.add(task_id)
+                self._unindex(task_id)
+        if deleted:
+            self._append(["d", task_id])
+        return deleted
@@ -0,0 +1,66 @@
+import time
+import unittest
+import warnings
+
+from backend import auth
+
+try:
+    import jwt as pyjwt
+except ImportError:
+    pyjwt = None
+
+def sign(claims: dict, secret: str = auth.BETTER_AUTH_SECRET, algorithm: str = auth.ALGORITHM) -> str:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore") # short dev secret
+        return pyjwt.encode(claims, secret, algorithm=algorithm)
+
+@unittest.skipUnless(auth.PYJWT_AVAILABLE, "pyjwt is not installed")
+class TestDecoderParity(unittest.TestCase):
+    """Switching JWT_BACKEND must not change which tokens are accepted."""
+
+    def decode(self, decoder, token: str):
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                return decoder(token)
+        except auth.InvalidToken:
+            return None
+
+    def assert_same(self, token: str, accepted: bool):
+        for name, decoder in auth.DECODERS.items():
+            with self.subTest(backend=name):
+                self.assertEqual(self.decode(decoder, token) is not None, accepted)
+
+    def test_accepted(self):
+        now = int(time.time())
+        for claims in (
+            {"sub": "u1"},
+            {"sub": "u1", "exp": now + 60},
+            {"sub": "u1", "iat": now, "nbf": now - 60},
+            {"sub": "u1", "iat": now + 600}, # clock skew between issuer and API
+            {"sub": "u1", "iss": "better-auth"},
+        ):
+            with self.subTest(claims=claims):
+                self.assert_same(sign(claims), True)
+
+    def test_rejected(self):
+        now = int(time.time())
+        for claims in (
+            {"sub": "u1", "exp": now - 60},
+            {"sub": "u1", "aud": "another-service"},
+            {"sub": "u1", "nbf": now + 600},
+            {"sub": "u1", "iat": "yesterday"},
+            {"sub": "u1", "exp": "tomorrow"},
+            {"sub": 1},
+            {"sub": "u1", "jti": 1},
+        ):
+            with self.subTest(claims=claims):
+                self.assert_same(sign(claims), False)
+
+    def test_rejected_signatures(self):
+        self.assert_same(sign({"sub": "u1"}, secret="another-secret"), False)
+        self.assert_same(sign({"sub": "u1"}, algorithm="HS512"), False)
+        self.assert_same("not.a.token", False)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,19 @@
+import os
+import tempfile
 import unittest
+from datetime import datetime
 from src.models import Task, TaskStatus
-from src.storage import InMemoryStorage
+from src.storage import ColumnarStorage, InMemoryStorage, PersistentStorage
 from src.cli import TodoCLI
 from unittest.mock import MagicMock 
 
+class TestTask(unittest.TestCase):
+    def test_created_at_argument(self):
+        created = datetime(2024, 1, 2, 3, 4, 5)
+        for task in (Task(1, "T", TaskStatus.PENDING, created), Task(1, "T", created_at=created)):
+            self.assertEqual(task.created_at, created)
+            self.assertIsNone(task.description)
+
 class TestInMemoryStorage(unittest.TestCase):
     def setUp(self):
         self.storage = InMemoryStorage()
@@ -39,6 +49,103 @@ class TestInMemoryStorage(unittest.TestCase):
         self.assertTrue(result)
         self.assertIsNone(self.storage.get_task(task.id))
 
+    def test_get_tasks_by_status(self):
+        t1 = self.storage.add_task("T1")
+        t2 = self.storage.add_task("T2")
+        t3 = self.storage.add_task("T3")
+        self.storage.mark_complete(t3.id)
+        self.storage.mark_complete(t1.id)
+        self.assertEqual([t.id for t in self.storage.get_tasks_by_status(TaskStatus.COMPLETED)], [t1.id, t3.id])
+        self.assertEqual([t.id for t in self.storage.get_tasks_by_status(TaskStatus.PENDING)], [t2.id])
+
+    def test_search(self):
+        dentist = self.storage.add_task("Dentist appointment", "Call Dr. Smith")
+        milk = self.storage.add_task("Buy milk", "From the dentist's shop")
+        self.storage.add_task("Walk dog")
+        self.assertEqual([t.id for t in self.storage.search("dent")], [dentist.id, milk.id])
+        self.assertEqual([t.id for t in self.storage.search("dent", limit=1, offset=1)], [milk.id])
+        self.assertEqual(self.storage.search("dentist dog"), [])
+        self.storage.update_task(milk.id, description="From the shop")
+        self.storage.delete_task(dentist.id)
+        self.assertEqual(self.storage.search("dent"), [])
+
+class TestColumnarStorage(TestInMemoryStorage):
+    def setUp(self):
+        self.storage = ColumnarStorage()
+
+    def test_deleted_rows_are_dropped(self):
+        for i in range(3000):
+            self.storage.add_task(f"T{i}")
+        kept = self.storage.get_task(2999)
+        for task_id in range(1, 2000):
+            self.storage.delete_task(task_id)
+        self.assertLess(len(self.storage._ids), 3000)
+        self.assertEqual(kept.title, "T2998")
+        tasks = self.storage.get_all_tasks()
+        self.assertEqual((len(tasks), tasks[0].id), (1001, 2000))
+
+class TestPersistentStorage(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "tasks.log")
+        self.storage = PersistentStorage(self.path, compact_min_records=5)
+
+    def reopen(self):
+        self.storage.close()
+        self.storage = PersistentStorage(self.path, compact_min_records=5)
+
+    def tearDown(self):
+        self.storage.close()
+
+    def test_survives_restart(self):
+        t1 = self.storage.add_task("T1", "Description")
+        t2 = self.storage.add_task("T2")
+        self.storage.update_task(t1.id, title="New Title")
+        self.storage.mark_complete(t2.id)
+        self.reopen()
+        tasks = self.storage.get_all_tasks()
+        self.assertEqual([(t.id, t.title, t.description, t.status) for t in tasks], [
+            (t1.id, "New Title", "Description", TaskStatus.PENDING),
+            (t2.id, "T2", None, TaskStatus.COMPLETED),
+        ])
+
+    def test_compaction(self):
+        for i in range(10):
+            self.storage.add_task(f"T{i}")
+        self.storage.delete_task(10)
+        self.storage.mark_complete(2)
+        self.assertTrue(os.path.exists(self.path + ".snap"))
+        self.reopen()
+        self.assertEqual(len(self.storage.get_all_tasks()), 9)
+        self.assertEqual([t.id for t in self.storage.get_tasks_by_status(TaskStatus.COMPLETED)], [2])
+        # IDs of deleted tasks are not reused.
+        self.assertEqual(self.storage.add_task("T11").id, 11)
+
+    def test_list_by_status_over_snapshot(self):
+        for i in range(10):
+            self.storage.add_task(f"T{i}")
+        for task_id in (2, 4, 6):
+            self.storage.mark_complete(task_id)
+        self.storage.compact()
+        self.reopen()
+        # Changes after the snapshot: a completion, a deletion, a new task.
+        self.storage.mark_complete(9)
+        self.storage.delete_task(4)
+        self.storage.add_task("T11")
+        self.assertEqual([t.id for t in self.storage.get_tasks_by_status(TaskStatus.COMPLETED)], [2, 6, 9])
+        self.assertEqual([t.id for t in self.storage.get_tasks_by_status(TaskStatus.PENDING)], [1, 3, 5, 7, 8, 10, 11])
+        self.assertEqual(len(self.storage.get_all_tasks()), 10)
+        # Listing does not keep the snapshot tasks it parsed.
+        self.assertEqual(set(self.storage._cache), {9})
+
+    def test_partial_last_record_is_dropped(self):
+        self.storage.add_task("T1")
+        self.storage.close()
+        with open(self.path, "ab") as f:
+            f.write(b'["a", 2, "T')
+        self.reopen()
+        self.assertEqual([t.title for t in self.storage.get_all_tasks()], ["T1"])
+        self.assertEqual(self.storage.add_task("T2").id, 2)
+
 class TestCLI(unittest.TestCase):
     def setUp(self):
         self.cli = TodoCLI()
@@ -55,5 +162,20 @@ class TestCLI(unittest.TestCase):
         self.cli.handle_command(f"delete {task.id}")
         self.assertEqual(len(self.cli.storage.get_all_tasks()), 0)
 
+    def test_handle_search(self):
+        self.cli.storage.add_task("Dentist appointment")
+        self.cli.storage.add_task("Walk dog")
+        self.cli.handle_command("search dent")
+        table = self.cli.console.print.call_args[0][0]
+        self.assertEqual(table.row_count, 1)
+
+    def test_handle_list_by_status(self):
+        self.cli.storage.add_task("Pending")
+        done = self.cli.storage.add_task("Done")
+        self.cli.storage.mark_complete(done.id)
+        self.cli.handle_command("list completed")
+        table = self.cli.console.print.call_args[0][0]
+        self.assertEqual(table.row_count, 1)
+
 if __name__ == "__main__":
     unittest.main()